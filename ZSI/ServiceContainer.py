@@ -3,7 +3,7 @@
    -- use with wsdl2py generated modules.
 '''
 
-import urllib.parse, types, os, sys, io as StringIO, _thread,re
+import urllib.parse, types, os, sys, io as StringIO, threading,re
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from .ZSI import ParseException, FaultFromException, FaultFromZSIException, Fault
 from .ZSI import _copyright, _seqtypes, _get_element_nsuri_name, resolvers
@@ -13,6 +13,9 @@ from .ZSI.parse import ParsedSoap
 from .ZSI.writer import SoapWriter
 from .ZSI.dispatch import _ModPythonSendXML, _ModPythonSendFault, _CGISendXML, _CGISendFault
 from .ZSI.dispatch import SOAPRequestHandler as BaseSOAPRequestHandler
+from .ZSI.workers import ThreadPoolMixIn, ServeForever
+from .ZSI.mtom import IsXOP, Package
+from .ZSI.compress import DecompressLimitError
 
 """
 Functions:
@@ -29,6 +32,7 @@ Classes:
     SimpleWSResource
     SOAPRequestHandler
     ServiceContainer
+    ThreadingServiceContainer
 """
 class NoSuchService(Exception): pass
 class UnknownRequestException(Exception): pass
@@ -51,18 +55,22 @@ class SOAPContext:
         self.httpheaders= httpheaders
         self.soapaction = soapaction
 
-_contexts = dict()
+_contexts = threading.local()
 def GetSOAPContext():
-    global _contexts
-    return _contexts[_thread.get_ident()]
+    '''Return the SOAPContext of the request the calling thread is
+    processing, or None.
+    '''
+    return getattr(_contexts, 'context', None)
 
-def _Dispatch(ps, server, SendResponse, SendFault, post, action, nsdict={}, **kw):
+def _Dispatch(ps, server, SendResponse, SendFault, post, action, nsdict={},
+mtom=None, **kw):
     '''Send ParsedSoap instance to ServiceContainer, which dispatches to
     appropriate service via post, and method via action.  Response is a
     self-describing pyobj, which is passed to a SoapWriter.
 
     Call SendResponse or SendFault to send the reply back, appropriately.
         server -- ServiceContainer instance
+        mtom -- reply with MTOM/XOP, see SoapWriter
 
     '''
     localURL = 'http://%s:%d%s' %(server.server_name,server.server_port,post)
@@ -115,14 +123,14 @@ def _Dispatch(ps, server, SendResponse, SendFault, post, action, nsdict={}, **kw
     if result is None:
         return
 
-    sw = SoapWriter(nsdict=nsdict)
+    sw = SoapWriter(nsdict=nsdict, mtom=mtom)
     try:
         sw.serialize(result)
     except Exception as e:
         return SendFault(FaultFromException(e, 0, sys.exc_info()[2]), **kw)
 
     if isWSResource is True:
-        action = service.getResponseAction(action)
+        action = service.getResponseAction(ps, action)
         addressRsp = Address(action=action)
         try:
             addressRsp.setResponseFromWSAddress(address, localURL)
@@ -134,22 +142,36 @@ def _Dispatch(ps, server, SendResponse, SendFault, post, action, nsdict={}, **kw
     service.sign(sw)
 
     try:
-        soapdata = str(sw)
+        soapdata = Package(sw)
         return SendResponse(soapdata, **kw)
     except Exception as e:
         return SendFault(FaultFromException(e, 0, sys.exc_info()[2]), **kw)
 
 
-def AsServer(port=80, services=()):
+def AsServer(port=80, services=(), threads=0, processes=0, max_requests=0):
     '''port --
        services -- list of service instances
+       threads -- size of a pool of threads handling requests, by default
+           requests are handled one at a time.
+       processes -- number of pre-forked worker processes sharing the
+           listening socket, by default requests are handled in this process.
+       max_requests -- requests a worker handles before it is replaced, a
+           thread when there are threads otherwise a process.
+
+       Serves until SIGTERM or SIGINT, finishing the requests accepted.
+       SIGHUP gracefully restarts the workers.
     '''
     address = ('', port)
-    sc = ServiceContainer(address, services)
+    if threads:
+        sc = ThreadingServiceContainer(address, services)
+        sc.threads, sc.max_requests = threads, max_requests
+        max_requests = 0
+    else:
+        sc = ServiceContainer(address, services)
     #for service in services:
     #    path = service.getPost()
     #    sc.setNode(service, path)
-    sc.serve_forever()
+    ServeForever(sc, processes, max_requests)
 
 
 class ServiceInterface:
@@ -268,9 +290,7 @@ class SimpleWSResource(ServiceSOAPBinding):
         '''The POST command.  This is called by HTTPServer, not twisted.
         action -- SOAPAction(HTTP header) or wsa:Action(SOAP:Header)
         '''
-        global _contexts
-
-        soapAction = self.headers.getheader('SOAPAction')
+        soapAction = self.headers.get('SOAPAction')
         post = self.path
         if not post:
             raise PostNotSpecified('HTTP POST not specified in request')
@@ -293,10 +313,9 @@ class SimpleWSResource(ServiceSOAPBinding):
             self.send_fault(FaultFromException(e, 1, sys.exc_info()[2]))
         else:
             # Keep track of calls
-            thread_id = _thread.get_ident()
-            _contexts[thread_id] = SOAPContext(self.server, xml, ps,
-                                               self.connection,
-                                               self.headers, soapAction)
+            _contexts.context = SOAPContext(self.server, xml, ps,
+                                            self.connection,
+                                            self.headers, soapAction)
 
             try:
                 _Dispatch(ps, self.server, self.send_xml, self.send_fault,
@@ -305,8 +324,7 @@ class SimpleWSResource(ServiceSOAPBinding):
                 self.send_fault(FaultFromException(e, 0, sys.exc_info()[2]))
 
             # Clean up after the call
-            if thread_id in _contexts:
-                del _contexts[thread_id]
+            _contexts.context = None
 
 
 class SOAPRequestHandler(BaseSOAPRequestHandler):
@@ -316,44 +334,49 @@ class SOAPRequestHandler(BaseSOAPRequestHandler):
         '''The POST command.
         action -- SOAPAction(HTTP header) or wsa:Action(SOAP:Header)
         '''
-        soapAction = self.headers.getheader('SOAPAction')
+        soapAction = self.headers.get('SOAPAction')
         post = self.path
         if not post:
             raise PostNotSpecified('HTTP POST not specified in request')
         if soapAction:
             soapAction = soapAction.strip('\'"')
         post = post.strip('\'"')
+        cid = None
         try:
-            ct = self.headers['content-type']
+            ct = self.headers.get('content-type', '')
             if ct.startswith('multipart/'):
-                cid = resolvers.MIMEResolver(ct, self.rfile)
+                cid = self.read_multipart(ct)
                 xml = cid.GetSOAPPart()
                 ps = ParsedSoap(xml, resolver=cid.Resolve)
             else:
-                length = int(self.headers['content-length'])
-                xml = self.rfile.read(length)
+                xml = self.read_body()
                 ps = ParsedSoap(xml)
+        except DecompressLimitError as e:
+            self.send_too_large(e)
         except ParseException as e:
+            if cid is not None: self.finish_multipart(cid)
             self.send_fault(FaultFromZSIException(e))
         except Exception as e:
+            if cid is not None: self.finish_multipart(cid)
             # Faulted while processing; assume it's in the header.
             self.send_fault(FaultFromException(e, 1, sys.exc_info()[2]))
         else:
             # Keep track of calls
-            thread_id = _thread.get_ident()
-            _contexts[thread_id] = SOAPContext(self.server, xml, ps,
-                                               self.connection,
-                                               self.headers, soapAction)
+            _contexts.context = SOAPContext(self.server, xml, ps,
+                                            self.connection,
+                                            self.headers, soapAction)
 
             try:
                 _Dispatch(ps, self.server, self.send_xml, self.send_fault, 
-                    post=post, action=soapAction)
+                    post=post, action=soapAction,
+                    mtom=self.mtom if IsXOP(ct) else None)
             except Exception as e:
                 self.send_fault(FaultFromException(e, 0, sys.exc_info()[2]))
 
             # Clean up after the call
-            if thread_id in _contexts:
-                del _contexts[thread_id]
+            _contexts.context = None
+            if cid is not None: self.finish_multipart(cid)
+            self.send_accepted()
 
     def do_GET(self):
         '''The GET command.
@@ -396,8 +419,8 @@ class ServiceContainer(HTTPServer):
         def __str__(self):
             return str(self.__dict)
 
-	def listNodes(self):
-	    print(list(self.__dict.keys()))
+        def listNodes(self):
+            print(list(self.__dict.keys()))
 
         def getNode(self, url):
             path = urllib.parse.urlsplit(url)[2]
@@ -467,20 +490,6 @@ class ServiceContainer(HTTPServer):
     def removeNode(self, url):
         self._nodes.removeNode(url)
 
-
-class SimpleWSResource(ServiceSOAPBinding):
-
-    def getNode(self, post):
-        '''post -- POST HTTP value
-        '''
-        return self._nodes.getNode(post)
-
-    def setNode(self, service, post):
-        '''service -- service instance
-           post -- POST HTTP value
-        '''
-        self._nodes.setNode(service, post)
-
     def getCallBack(self, ps, post, action):
         '''post -- POST HTTP value
            action -- SOAP Action value
@@ -494,4 +503,10 @@ class SimpleWSResource(ServiceSOAPBinding):
             raise NotAuthorized("Authorization failed for method %s" % action)
 
 
+class ThreadingServiceContainer(ThreadPoolMixIn, ServiceContainer):
+    '''ServiceContainer handling requests in a pool of threads, see
+    workers.ThreadPoolMixIn.
+    '''
+
+
 if __name__ == '__main__': print(_copyright)
@@ -16,15 +16,39 @@ from .ZSI.typeinterpreter import BaseTypeInterpreter
 from . import wstools
 from .wstools.Utility import DOM
 from urllib.parse import urlparse
-import weakref
+import http.client, threading, weakref
+
+class Operation:
+    """An operation of a ServiceProxy compiled for calling, made once
+       per WSDL operation and kept.
+
+       Instance data:
+           callinfo -- WSDLTools.SOAPCallInfo of the operation
+           request, response -- typecodes of the messages
+           soapAction -- SOAPAction header value
+           url -- endpoint
+           transport -- HTTPConnection class for the endpoint
+    """
+    def __init__(self, callinfo, request, response, transport):
+        self.callinfo = callinfo
+        self.request, self.response = request, response
+        self.soapAction = callinfo.soapAction
+        self.url = callinfo.location
+        self.transport = transport
+
 
 class ServiceProxy:
     """A ServiceProxy provides a convenient way to call a remote web
        service that is described with WSDL. The proxy exposes methods
-       that reflect the methods of the remote web service."""
+       that reflect the methods of the remote web service.
+
+       Each operation is compiled (see Operation) the first time it is
+       called, or by warmup.  Calls reuse a Binding per endpoint and
+       thread, whose connections are kept alive in the connection pool.
+    """
 
     def __init__(self, wsdl, service=None, port=None, tracefile=None,
-                 nsdict=None, transdict=None):
+                 nsdict=None, transdict=None, cache=None, resolver=None):
         """
         Parameters:
            wsdl -- WSDLTools.WSDL instance or URL of WSDL.
@@ -34,13 +58,18 @@ class ServiceProxy:
            nsdict -- key prefix to namespace mappings for serialization
               in SOAP Envelope.
            transdict -- arguments to pass into HTTPConnection constructor.
+           cache -- wstools.ModelCache.ModelCache the WSDL url is loaded
+              through, so it is not parsed again while unchanged.
+           resolver -- wstools.Catalog.Resolver opening the documents the
+              WSDL imports, from a catalog of local copies for instance.
         """
         self._tracefile = tracefile
         self._nsdict = nsdict or {}
         self._transdict = transdict 
         self._wsdl = wsdl
         if isinstance(wsdl, str) is True:
-            self._wsdl = wstools.WSDLTools.WSDLReader().loadFromURL(wsdl)
+            self._wsdl = wstools.WSDLTools.WSDLReader(cache=cache,
+                resolver=resolver).loadFromURL(wsdl)
 
         assert isinstance(self._wsdl, wstools.WSDLTools.WSDL), 'expecting a WSDL instance'
         self._service = self._wsdl.services[service or 0]
@@ -48,11 +77,14 @@ class ServiceProxy:
         self._port = self._service.ports[port or 0]
         self._name = self._service.name
         self._methods = {}
+        self._operations = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
         
         binding = self._port.getBinding()
         portType = binding.getPortType()
-        for port in self._service.ports:
-            for item in port.getPortType().operations:
+        for port in self._service.ports.values():
+            for item in port.getPortType().operations.values():
                 callinfo = wstools.WSDLTools.callInfoFromWSDL(port, item.name)
                 method = MethodProxy(self, callinfo)
                 setattr(self, item.name, method)
@@ -75,32 +107,68 @@ class ServiceProxy:
             if len(method.callinfo.inparams) == len(kwargs):
                 callinfo = method.callinfo
 
-        soapAction = callinfo.soapAction
-        url = callinfo.location
-        (protocol, host, uri, query, fragment, identifier) = urlparse(url)
-        port = None
-        if host.find(':') >= 0:
-            host, port = host.split(':')
+        op = self._getOperation(callinfo)
+        binding = self._getBinding(op)
+        if len(kwargs): args = kwargs
+        binding.Send(url=op.url, opname=None, obj=args,
+                     nsdict=self._nsdict, soapaction=op.soapAction, 
+                     requesttypecode=op.request)
+        return binding.Receive(replytype=op.response)
+
+    def warmup(self):
+        """Compile every operation of every port now, so that no call
+           waits for the schema to be interpreted.  Returns the number 
+           of operations.
+        """
+        n = 0
+        for methods in list(self._methods.values()):
+            for method in methods:
+                self._getOperation(method.callinfo)
+                n += 1
+        return n
+
+    def _getOperation(self, callinfo):
+        """Returns the Operation of callinfo, compiled on first use.
+        """
+        op = self._operations.get(callinfo)
+        if op is not None: 
+            return op
 
+        protocol = urlparse(callinfo.location)[0]
         if protocol == 'http':
-            transport = httplib.HTTPConnection
+            transport = http.client.HTTPConnection
         elif protocol == 'https':
-            transport = httplib.HTTPSConnection
+            transport = http.client.HTTPSConnection
         else:
             raise RuntimeError('Unknown protocol %s' %protocol)
 
-        binding = Binding(host=host, tracefile=self._tracefile,
-                          transport=transport,transdict=self._transdict,
-                          port=port, url=url, nsdict=self._nsdict, 
-                          soapaction=soapAction,)
-
-        request, response = self._getTypeCodes(callinfo)
-        if len(kwargs): args = kwargs
-        if request is None:
-            request = Any(oname=name)
-        binding.Send(url=url, opname=None, obj=args,
-                     nsdict=self._nsdict, soapaction=soapAction, requesttypecode=request)
-        return binding.Receive(replytype=response)
+        # the prefix dictionary is shared, compile one at a time.
+        self._lock.acquire()
+        try:
+            op = self._operations.get(callinfo)
+            if op is None:
+                request, response = self._getTypeCodes(callinfo)
+                if request is None:
+                    request = Any(oname=callinfo.methodName)
+                op = Operation(callinfo, request, response, transport)
+                self._operations[callinfo] = op
+        finally:
+            self._lock.release()
+        return op
+
+    def _getBinding(self, op):
+        """Returns the Binding of this thread for the endpoint of op.
+        """
+        bindings = getattr(self._local, 'bindings', None)
+        if bindings is None:
+            bindings = self._local.bindings = {}
+        key = (op.transport, op.url)
+        binding = bindings.get(key)
+        if binding is None:
+            binding = bindings[key] = Binding(tracefile=self._tracefile,
+                transport=op.transport, transdict=self._transdict,
+                url=op.url, nsdict=self._nsdict)
+        return binding
 
 
     def _getTypeCodes(self, callinfo):
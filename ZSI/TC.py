@@ -11,9 +11,8 @@ from .ZSI import _copyright, _children, _child_elements, \
     _Node, EvaluateException, \
     _valid_encoding, ParseException
     
-from .ZSI.wstools.Namespaces import SCHEMA, SOAP
-from .ZSI.wstools.Utility import SplitQName
-from .ZSI.wstools.c14n import Canonicalize
+from .ZSI.wstools.Namespaces import SCHEMA, SOAP, XOP
+from .ZSI.wstools.Utility import SplitQName, Canonicalize
 from .ZSI.wstools.logging import getLogger as _GetLogger
 
 import re, types, time, copy
@@ -21,6 +20,8 @@ import re, types, time, copy
 from base64 import decodestring as b64decode, encodestring as b64encode
 from urllib.parse import unquote as urldecode, quote as urlencode
 from binascii import unhexlify as hexdecode, hexlify as hexencode
+from .binary import Base64Decoder, HexDecoder, Base64Encode, HexEncode
+from .pullparse import START as _START, TEXT as _TEXT, END as _END
 
 
 _is_xsd_or_soap_ns = lambda ns: ns in [
@@ -111,10 +112,20 @@ class TypeCode:
         '''
         raise EvaluateException("Unimplemented evaluation", ps.Backtrace(elt))
 
+    def parse_stream(self, elt, ps):
+        '''Parse from a streaming ParsedSoap, the content of elt is still
+        in ps.stream.  By default the subtree is built and passed to parse,
+        containers override this to hand their children on unbuilt.
+        Parameters:
+            elt -- the element being parsed, start tag only
+            ps -- the ParsedSoap object.
+        '''
+        return self.parse(ps.stream.expand(elt), ps)
+
     def serialize(self, elt, sw, pyobj, name=None, orig=None, **kw):
         '''
         Parameters:
-           elt -- the current DOMWrapper element 
+           elt -- the current DOMWrapper element
            sw -- soapWriter object
            pyobj -- python object to serialize
 
@@ -209,7 +220,7 @@ class TypeCode:
 
         # Parse the QNAME.
         prefix,typeName = SplitQName(typeName)
-        uri = ps.GetElementNSdict(elt).get(prefix)
+        uri = ps.GetElementNSScope(elt).get(prefix)
         if uri is None:
             raise EvaluateException('Malformed type attribute (bad NS)',
                     ps.Backtrace(elt))
@@ -439,6 +450,19 @@ class SimpleType(TypeCode):
         
         return pyobj
 
+    def parse_text(self, text, elt, ps):
+        '''Parse an element without attributes from its character data,
+        same as parse.  Used by compiled typecodes (ZSI.compiler), a
+        subclass overriding parse must override this too.
+        Parameters:
+            text -- character data of elt, None if it has no content
+            elt -- the element being parsed
+            ps -- the ParsedSoap object.
+        '''
+        if text is None:
+            text = self.empty_content
+        return self.text_to_data(text, elt, ps)
+
     def get_formatted_content(self, pyobj):
         raise NotImplementedError('method get_formatted_content is not implemented')
 
@@ -481,7 +505,8 @@ class SimpleType(TypeCode):
         self.set_attributes(el, pyobj)
 
         # soap href attribute
-        unique = self.unique or kw.get('unique', False)
+        shared = sw.Shared(orig or pyobj)
+        unique = self.unique or kw.get('unique', False) or not shared
         if unique is False and sw.Known(orig or pyobj):
             self.set_attribute_href(el, objid)
             return None
@@ -491,7 +516,7 @@ class SimpleType(TypeCode):
             self.set_attribute_xsi_type(el, **kw)
 
         # soap id attribute
-        if self.unique is False:
+        if self.unique is False and shared:
             self.set_attribute_id(el, objid)
 
         #Content, <empty tag/>c
@@ -768,9 +793,9 @@ class QName(String):
         '''convert text into typecode specific data.
         '''
         prefix,localName = SplitQName(text)
-        nsdict = ps.GetElementNSdict(elt)
+        scope = ps.GetElementNSScope(elt)
         try:
-            namespaceURI = nsdict[prefix]
+            namespaceURI = scope[prefix]
         except KeyError as ex:
             raise EvaluateException('cannot resolve prefix(%s)'%prefix,
                 ps.Backtrace(elt))
@@ -795,12 +820,132 @@ class Token(String):
     logger = _GetLogger('ZSI.TC.Token')
 
 
-class Base64String(String):
+def _find_xop_include(elt):
+    '''Return the xop:Include child of elt, None if there is none.
+    '''
+    for node in _child_elements(elt):
+        if node.namespaceURI == XOP.INCLUDE and node.localName == 'Include':
+            return node
+    return None
+
+
+class _BinaryString(String):
+    '''Base of the binary string types.  bytes-like values and binary
+    files are serialized a chunk at a time, see ZSI.binary.
+
+    Class data:
+        sink -- callable returning the bytearray, memoryview or file-like
+            object to decode each value into, which is returned instead of
+            bytes (for a memoryview the part written, files are rewound).
+            For instance bytearray or tempfile.SpooledTemporaryFile.  The
+            text is decoded as it comes, from the event stream of a 
+            streaming ParsedSoap.  None for bytes.
+        decoder -- incremental decoder class, see ZSI.binary
+        encode -- generator of the text of a value, in chunks
+        xop -- the value may be an MTOM/XOP attachment: an xop:Include
+            is resolved through the resolver of the ParsedSoap (the value
+            is then what it returns, a read-only memoryview for a
+            MIMEResolver), and the SoapWriter may make one (see mtom).
+    '''
+    sink = None
+    xop = False
+
+    def parse(self, elt, ps):
+        include = self.xop and _find_xop_include(elt)
+        if include:
+            self.checkname(elt, ps)
+            data = self._include(include, ps)
+            if self.sink is not None:
+                decoder = self.decoder(self.sink())
+                decoder.put(data)
+                return decoder.close()
+            if self.pyclass is not None: return self.pyclass(data)
+            return data
+        if self.sink is None or _find_href(elt):
+            return String.parse(self, elt, ps)
+        self.checkname(elt, ps)
+        if self.nilled(elt, ps): return Nilled
+        if not _valid_encoding(elt):
+            raise EvaluateException('Invalid encoding', ps.Backtrace(elt))
+        decoder = self.decoder(self.sink())
+        for node in elt.childNodes:
+            if node.nodeType == _Node.ELEMENT_NODE:
+                raise EvaluateException('Sub-elements in value',
+                    ps.Backtrace(node))
+            if node.nodeType in (_Node.TEXT_NODE, _Node.CDATA_SECTION_NODE):
+                self._decode(decoder.write, node.nodeValue, elt, ps)
+        return self._decode(decoder.close, None, elt, ps)
+
+    def parse_stream(self, elt, ps):
+        if self.sink is None or _find_href(elt):
+            return String.parse_stream(self, elt, ps)
+        self.checkname(elt, ps)
+        if self.nilled(elt, ps):
+            ps.stream.skip(elt)
+            return Nilled
+        if not _valid_encoding(elt):
+            raise EvaluateException('Invalid encoding', ps.Backtrace(elt))
+        decoder = self.decoder(self.sink())
+        while True:
+            event, value = ps.stream.next()
+            if event is _TEXT:
+                self._decode(decoder.write, value, elt, ps)
+            elif event is _END:
+                return self._decode(decoder.close, None, elt, ps)
+            elif self.xop and value.namespaceURI == XOP.INCLUDE and \
+            value.localName == 'Include':
+                decoder.put(self._include(ps.stream.expand(value), ps))
+            else:
+                raise EvaluateException('Sub-elements in value',
+                    ps.Backtrace(value))
+
+    def _include(self, include, ps):
+        '''Resolve the xop:Include element include, return the part.
+        '''
+        href = include.getAttributeNS(None, 'href')
+        if not href.startswith('cid:'):
+            raise EvaluateException('xop:Include href must be a cid: URI',
+                ps.Backtrace(include))
+        data = ps.ResolveHREF(href, self)
+        if hasattr(data, 'read'): data = data.read()
+        return data
+
+    def _decode(self, method, text, elt, ps):
+        try:
+            if text is None: return method()
+            return method(text)
+        except (ValueError, TypeError) as ex:
+            raise EvaluateException('Bad %s content, %s' %(self.type[1], ex),
+                ps.Backtrace(elt))
+
+    def serialize_text_node(self, elt, sw, pyobj):
+        '''Serialize the text of bytes-like objects and files in chunks,
+        or as an xop:Include of an attachment when the SoapWriter does
+        MTOM and the value is a file or at least sw.mtom bytes long.
+        '''
+        if pyobj is None or type(pyobj) in _stringtypes and \
+        not isinstance(pyobj, bytes):
+            return String.serialize_text_node(self, elt, sw, pyobj)
+        if self.xop and getattr(sw, 'mtom', None) is not None and \
+        (hasattr(pyobj, 'read') or memoryview(pyobj).nbytes >= sw.mtom):
+            include = elt.createAppendElement(XOP.INCLUDE, 'Include')
+            include.setAttributeNS(None, 'href',
+                'cid:' + urlencode(sw.AddAttachment(pyobj)))
+            return include
+        textNode = None
+        for text in self.encode(pyobj):
+            textNode = elt.createAppendTextNode(text)
+        return textNode
+
+
+class Base64String(_BinaryString):
     '''A Base64 encoded string.
     '''
     parselist = [ (None,'base64Binary'), (SOAP.ENC, 'base64') ]
     type = (SOAP.ENC, 'base64')
     logger = _GetLogger('ZSI.TC.Base64String')
+    decoder = Base64Decoder
+    xop = True
 
     def text_to_data(self, text, elt, ps):
         '''convert text into typecode specific data.
@@ -814,11 +959,18 @@ class Base64String(String):
         pyobj = '\n' + b64encode(pyobj)
         return String.get_formatted_content(self, pyobj)
 
+    def encode(self, pyobj):
+        yield '\n'
+        for text in Base64Encode(pyobj):
+            yield text
+
 
-class Base64Binary(String):
+class Base64Binary(_BinaryString):
     parselist = [ (None,'base64Binary'), ]
     type = (SCHEMA.XSD3, 'base64Binary')
     logger = _GetLogger('ZSI.TC.Base64Binary')
+    decoder = Base64Decoder
+    xop = True
 
     def text_to_data(self, text, elt, ps):
         '''convert text into typecode specific data.
@@ -832,13 +984,22 @@ class Base64Binary(String):
         pyobj = b64encode(pyobj).strip()
         return pyobj
 
+    def encode(self, pyobj):
+        text = None
+        for next in Base64Encode(pyobj):
+            if text: yield text
+            text = next
+        if text: yield text.rstrip('\n')
+
 
-class HexBinaryString(String):
+class HexBinaryString(_BinaryString):
     '''Hex-encoded binary (yuk).
     '''
     parselist = [ (None,'hexBinary') ]
     type = (SCHEMA.XSD3, 'hexBinary')
     logger = _GetLogger('ZSI.TC.HexBinaryString')
+    decoder = HexDecoder
+    encode = staticmethod(HexEncode)
 
     def text_to_data(self, text, elt, ps):
         '''convert text into typecode specific data.
@@ -970,8 +1131,19 @@ class Integer(SimpleType):
                 'got %s wanted %s' % (type,self.type[1]), ps.Backtrace(elt))
         
         v = self.simple_value(elt, ps)
-        v = self.text_to_data(v, elt, ps)
+        return self.check_range(self.text_to_data(v, elt, ps), type, elt, ps)
 
+    def parse_text(self, text, elt, ps):
+        if text is None:
+            if self.minOccurs == 0: return None
+            raise EvaluateException('Requiredinteger missing',
+                    ps.Backtrace(elt))
+        return self.check_range(self.text_to_data(text, elt, ps),
+                                self.type[1], elt, ps)
+
+    def check_range(self, v, type, elt, ps):
+        '''Return v if it is in the range of the named integer type.
+        '''
         (rmin, rmax) = Integer.ranges.get(type, (_ignored, _ignored))
         if rmin != _ignored and v < rmin:
             raise EvaluateException('Underflow, less than ' + repr(rmin),
@@ -1102,7 +1274,19 @@ class Decimal(SimpleType):
                         'got (%s,%s) wanted %s' % (ns,type,tag), ps.Backtrace(elt))
         # Special value?
         if self.nilled(elt, ps): return Nilled
-        v = self.simple_value(elt, ps)
+        return self.check_value(self.simple_value(elt, ps), type, elt, ps)
+
+    def parse_text(self, text, elt, ps):
+        if text is None:
+            if self.minOccurs == 0: return None
+            raise EvaluateException('Requiredfloating-point missing',
+                    ps.Backtrace(elt))
+        return self.check_value(text, getattr(self.__class__, 'type'),
+                                elt, ps)
+
+    def check_value(self, v, type, elt, ps):
+        '''Convert the text v, checking the range of the type.
+        '''
         try:
             fp = self.text_to_data(v, elt, ps)
         except EvaluateException as ex:
@@ -1189,6 +1373,13 @@ class Boolean(SimpleType):
         v = self.simple_value(elt, ps).lower()
         return self.text_to_data(v, elt, ps)
 
+    def parse_text(self, text, elt, ps):
+        if text is None:
+            if self.minOccurs == 0: return None
+            raise EvaluateException('Requiredboolean missing',
+                    ps.Backtrace(elt))
+        return self.text_to_data(text.lower(), elt, ps)
+
     def get_formatted_content(self, pyobj):
         if pyobj: return 'true'
         return 'false'
@@ -1337,7 +1528,10 @@ class AnyType(TypeCode):
 
         #locate xsi:type
         prefix, typeName = SplitQName(_find_type(elt))
-        namespaceURI = _resolve_prefix(elt, prefix)
+        namespaceURI = ps.GetElementNSScope(elt).get(prefix or '')
+        if namespaceURI is None:
+            raise EvaluateException('cant resolve xmlns:%s' %prefix,
+                ps.Backtrace(elt))
         pyclass = GTD(namespaceURI, typeName)
         if not pyclass:
             if _is_xsd_or_soap_ns(namespaceURI):
@@ -1426,7 +1620,10 @@ class AnyElement(AnyType):
         # element declarations
         prefix, typeName = SplitQName(_find_type(elt))
         if not skip and typeName:
-            namespaceURI = _resolve_prefix(elt, prefix or 'xmlns')
+            namespaceURI = ps.GetElementNSScope(elt).get(prefix or '')
+            if namespaceURI is None:
+                raise EvaluateException('cant resolve xmlns:%s' %prefix,
+                    ps.Backtrace(elt))
             # First look thru user defined namespaces, if don't find
             # look for 'primitives'.
             pyclass = GTD(namespaceURI, typeName) or Any
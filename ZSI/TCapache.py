@@ -49,7 +49,8 @@ class _Map(TypeCode):
         self.set_attributes(el, pyobj)
 
         # soap href attribute
-        unique = self.unique or kw.get('unique', False)
+        shared = sw.Shared(orig or pyobj)
+        unique = self.unique or kw.get('unique', False) or not shared
         if unique is False and sw.Known(orig or pyobj):
             self.set_attribute_href(el, objid)
             return None
@@ -59,7 +60,7 @@ class _Map(TypeCode):
             self.set_attribute_xsi_type(el, **kw)
 
         # soap id attribute
-        if self.unique is False:
+        if self.unique is False and shared:
             self.set_attribute_id(el, objid)
 
         if self.aslist:
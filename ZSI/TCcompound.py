@@ -10,7 +10,7 @@ from .ZSI import _copyright, _children, _child_elements, \
     
 from .TC import _get_element_nsuri_name, \
      _get_xsitype, TypeCode, Any, AnyElement, AnyType, \
-     Nilled, UNBOUNDED
+     Integer, Decimal, Nilled, UNBOUNDED
     
 from .schema import ElementDeclaration, TypeDefinition, \
     _get_substitute_element, _get_type_definition
@@ -20,6 +20,9 @@ from .ZSI.wstools.Utility import SplitQName
 from .ZSI.wstools.logging import getLogger as _GetLogger
 import re, types
 import collections
+from array import array as _array
+from xml.dom import Node as _Node
+from math import isfinite as _isfinite
 
 _find_arrayoffset = lambda E: E.getAttributeNS(SOAP.ENC, "offset")
 _find_arrayposition = lambda E: E.getAttributeNS(SOAP.ENC, "position")
@@ -94,11 +97,170 @@ def _get_any_instances(ofwhat, d):
 
 
 
+_UNPARSED = object()
+_pending = {}
+_lazy_classes = {}
+
+
+class LazyObject:
+    '''Mix-in of the pyclass instances parsed by a lazy ComplexType: a
+    field is parsed from its elements when it is first read, errors in 
+    its content are raised then.  Copies are ordinary instances.
+    '''
+    def __getattr__(self, name):
+        fields = _pending.get(id(self))
+        if fields is None or name not in fields:
+            raise AttributeError(name)
+        value = fields[name]()
+        del fields[name]
+        if not fields: del _pending[id(self)]
+        setattr(self, name, value)
+        return value
+
+    def __del__(self):
+        _pending.pop(id(self), None)
+
+    def __reduce_ex__(self, protocol):
+        for name in list(_pending.get(id(self), ())):
+            getattr(self, name)
+        pyclass = self.__class__.__bases__[0]
+        return (_Rebuild, (pyclass, self.__dict__.copy()))
+
+    def validate(self):
+        '''Parse the fields not read yet, and those of the lazy values
+        in them.
+        '''
+        Validate(self)
+
+
+class LazyList(list):
+    '''The list parsed by a lazy Array: an item is parsed from its 
+    element when it is first read, errors in its content are raised 
+    then.  Methods other than indexing, iteration and len() parse the 
+    remaining items first, copies are lists.  Code reading the list 
+    storage directly (str.join for one) needs validate() first.
+    '''
+    __slots__ = ('_pending',)
+
+    def __init__(self, items, parse):
+        '''items -- values, _UNPARSED for the items not parsed yet
+        parse -- the callables parsing them, in order
+        '''
+        list.__init__(self, items)
+        parse = iter(parse)
+        self._pending = dict([ (i, next(parse)) for i,item in 
+            enumerate(items) if item is _UNPARSED ])
+
+    def _parse(self, i):
+        parse = self._pending.get(i)
+        if parse is not None:
+            list.__setitem__(self, i, parse())
+            del self._pending[i]
+
+    def _parse_all(self):
+        for i in sorted(self._pending):
+            self._parse(i)
+
+    def __getitem__(self, i):
+        if self._pending:
+            if isinstance(i, slice): self._parse_all()
+            elif -len(self) <= i < len(self): self._parse(i % len(self))
+        return list.__getitem__(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
+
+    def validate(self):
+        '''Parse the items not read yet, and those of the lazy values
+        in them.
+        '''
+        Validate(self)
+
+
+def _resolving(name):
+    method = getattr(list, name)
+    def wrapper(self, *args, **kw):
+        if self._pending: self._parse_all()
+        return method(self, *args, **kw)
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ('__contains__', '__eq__', '__ne__', '__lt__', '__le__', 
+    '__gt__', '__ge__', '__repr__', '__reversed__', '__add__', '__mul__',
+    '__rmul__', '__iadd__', '__imul__', '__setitem__', '__delitem__', 
+    'append', 'extend', 'insert', 'pop', 'remove', 'index', 'count', 'copy',
+    'sort', 'reverse', 'clear'):
+    setattr(LazyList, _name, _resolving(_name))
+del _name
+
+
+def _Rebuild(pyclass, d):
+    pyobj = pyclass.__new__(pyclass)
+    pyobj.__dict__.update(d)
+    return pyobj
+
+
+def Validate(pyobj):
+    '''Parse everything left in pyobj and the lazy values reachable from
+    it, raising the errors found.  Returns pyobj.
+    '''
+    todo, seen = [pyobj], set()
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen: continue
+        seen.add(id(obj))
+        if isinstance(obj, LazyObject):
+            for name in list(_pending.get(id(obj), ())):
+                getattr(obj, name)
+            todo.extend(list(obj.__dict__.values()))
+        elif isinstance(obj, LazyList):
+            obj._parse_all()
+            todo.extend(obj)
+        elif type(obj) in _seqtypes:
+            todo.extend(obj)
+        elif type(obj) is dict:
+            todo.extend(list(obj.values()))
+    return pyobj
+
+
+def _lazy_class(pyclass):
+    '''Return the LazyObject subclass of pyclass, None if pyclass cannot
+    have one.
+    '''
+    cls = _lazy_classes.get(pyclass, _UNPARSED)
+    if cls is not _UNPARSED: return cls
+    cls = None
+    if isinstance(pyclass, type) and not hasattr(pyclass, '__getattr__') \
+    and hasattr(pyclass, '__dict__') and '__slots__' not in vars(pyclass):
+        d = {}
+        if 'typecode' in dir(pyclass): d['typecode'] = pyclass.typecode
+        try:
+            cls = type(pyclass)(pyclass.__name__, (pyclass, LazyObject), d)
+        except Exception:
+            cls = None
+    _lazy_classes[pyclass] = cls
+    return cls
+
+
 class ComplexType(TypeCode):
     '''Represents an element of complexType, potentially containing other 
     elements.
+
+    Class data:
+        compiled -- parse and serialize the children with functions
+            generated for the fields on first use, see ZSI.compiler.
+        lazy -- parsing a DOM element returns a LazyObject, whose fields
+            are parsed when first read.  Used when the pyclass allows it.
     '''
     logger = _GetLogger('ZSI.TCcompound.ComplexType')
+    compiled = False
+    lazy = False
+    _dispatch = None
+    _compiled = None
     
     def __init__(self, pyclass, ofwhat, pname=None, inorder=False, inline=False,
     mutable=True, mixed=False, mixed_aname='_text', **kw):
@@ -157,9 +319,13 @@ class ComplexType(TypeCode):
             if _children(elt):
                 raise EvaluateException('Struct has content and HREF',
                         ps.Backtrace(elt))
-            elt = ps.FindLocalHREF(href, elt)
-        c = _child_elements(elt)
-        count = len(c)
+            return ps.ParseLocalHREF(href, elt, self, self._parse_content)
+        return self._parse_content(elt, ps)
+
+    def _parse_content(self, elt, ps):
+        '''Parse the attributes and children of elt, the element or
+        the multi-ref element it refers to.
+        '''
         if self.nilled(elt, ps): return Nilled
 
         # Create the object.
@@ -175,86 +341,237 @@ class ComplexType(TypeCode):
         if self.mixed is True:
             v[self.mixed_aname] = self.simple_value(elt,ps, mixed=True)
 
-        # Clone list of kids (we null it out as we process)
-        c, crange = c[:], list(range(len(c)))
-        # Loop over all items we're expecting
-        
-        if debug:
-            self.logger.debug("ofwhat: %s",str(self.ofwhat))
-            
-        any = None
-        for i,what in [ (i, self.ofwhat[i]) for i in range(len(self.ofwhat)) ]:
-            
+        if self.lazy is True and _lazy_class(self.pyclass) is not None:
+            return self._parse_children(elt, ps, v, _child_elements(elt),
+                                        lazy=True)
+        return self._parse_children(elt, ps, v, _child_elements(elt))
+
+    def parse_stream(self, elt, ps):
+        '''Parse the children from the event stream of a streaming 
+        ParsedSoap, each one is handed to its typecode as it arrives.
+        Mixed content and href are parsed from a built subtree.
+        '''
+        debug = self.logger.debugOn()
+        debug and self.logger.debug('parse_stream')
+
+        if self.mixed is True or _find_href(elt):
+            return TypeCode.parse_stream(self, elt, ps)
+
+        xtype = self.checkname(elt, ps)
+        if self.type and xtype not in [ self.type, (None,None) ]:
+            if not isinstance(self, TypeDefinition):
+                raise EvaluateException(\
+                    'ComplexType for %s has wrong type(%s), looking for %s' %
+                        (self.pname, self.checktype(elt,ps), self.type), 
+                                        ps.Backtrace(elt))
+            what = TypeDefinition.getSubstituteType(self, elt, ps)
+            return what.parse_stream(elt, ps)
+
+        if self.nilled(elt, ps):
+            ps.stream.skip(elt)
+            return Nilled
+
+        v = {}
+        attributes = self.parse_attributes(elt, ps)
+        if attributes:
+            v[self.attrs_aname] = attributes
+
+        return self._parse_children(elt, ps, v, ps.stream.children(elt), 
+                                    stream=True)
+
+    def _get_dispatch(self):
+        '''Return (ofwhat, index, multiple, any) for dispatching children, 
+        built on first use and again whenever self.ofwhat is replaced.  
+            ofwhat -- the fields, hidden typecodes revealed
+            index -- (namespace, name) to the slots in ofwhat of the fields
+                with that name, namespace is None for fields of any namespace.
+            multiple -- per slot, does the field take more than one element?
+            any -- the <any> wildcard or None
+        '''
+        table = self._dispatch
+        if table is not None and table[0] is self.ofwhat:
+            return table[1:]
+
+        ofwhat, index, multiple, any = [], {}, [], None
+        for i,what in enumerate(self.ofwhat):
             # retrieve typecode if it is hidden
             if isinstance(what, collections.Callable): what = what()
-            
-            # Loop over all available kids
-            if debug: 
-                self.logger.debug("what: (%s,%s)", what.nspname, what.pname)
-                
-            for j,c_elt in [ (j, c[j]) for j in crange if c[j] ]:
+            ofwhat.append(what)
+            multiple.append(what.maxOccurs == UNBOUNDED or what.maxOccurs > 1)
+            if isinstance(what, AnyElement):
+                # only supporting 1 <any> declaration in content.
+                any = what
+                continue
+            key = (what.nspname, what.pname)
+            index[key] = index.get(key, ()) + (i,)
+
+        self._dispatch = (self.ofwhat, tuple(ofwhat), index, tuple(multiple), any)
+        return self._dispatch[1:]
+
+    def _get_compiled(self):
+        '''Return the compiled functions of this typecode, None if it
+        cannot be compiled.  Compiled on first use and again whenever 
+        self.ofwhat is replaced.
+        '''
+        table = self._compiled
+        if table is not None and table[0] is self.ofwhat:
+            return table[1]
+
+        from .compiler import Compile
+        self._compiled = (self.ofwhat, Compile(self))
+        return self._compiled[1]
+
+    def _parse_children(self, elt, ps, v, children, stream=False, lazy=False):
+        '''Parse the child elements into the dictionary v in a single pass,
+        each child goes to the first field of its name that can still take 
+        it, the rest to the <any> wildcard.  Without a wildcard, another
+        element for a field that is already set is an error and elements
+        of other names are ignored.  Returns the pyobj.
+            children -- child elements of elt, in document order
+            stream -- children come from ps.stream, use parse_stream 
+            lazy -- only match the children, return a LazyObject
+        '''
+        debug = self.logger.debugOn()
+        pending = None
+        if lazy:
+            pending = {}
+        elif self.compiled is True and not debug:
+            code = self._get_compiled()
+            if code is not None:
+                if stream: return code.parse_stream(self, elt, ps, v, children)
+                return code.parse(self, elt, ps, v, children)
+
+        ofwhat, index, multiple, any = self._get_dispatch()
+        if debug:
+            self.logger.debug("ofwhat: %s",str(ofwhat))
+
+        matched, values = [False]*len(ofwhat), []
+        for j,c_elt in enumerate(children):
+            ns, name = c_elt.namespaceURI, c_elt.localName
+            slots = index.get((ns, name), ())
+            if ns is not None and (None, name) in index:
+                slots = sorted(slots + index[(None, name)])
+
+            for i in slots:
+                if not matched[i] or multiple[i]: break
+            else:
+                i = None
+
+            if i is None:
                 if debug:
-                    self.logger.debug("child node: (%s,%s)", c_elt.namespaceURI, 
-                                      c_elt.tagName)
-                if what.name_match(c_elt):
-                    # Parse value, and mark this one done. 
-                    try:
-                        value = what.parse(c_elt, ps)
-                    except EvaluateException as e:
-                        #what = _get_substitute_element(c_elt, what)
-                        #value = what.parse(c_elt, ps)
-                        raise
-                    if what.maxOccurs > 1:
-                        if what.aname in v:
-                            v[what.aname].append(value)
-                        else:
-                            v[what.aname] = [value]
-                        c[j] = None
-                        continue
-                    else:
-                        v[what.aname] = value
-                    c[j] = None
-                    break
+                    self.logger.debug("no field for child node: (%s,%s)",
+                                      ns, c_elt.tagName)
+                if any is None and slots:
+                    raise EvaluateException('Element "' + \
+                        ofwhat[slots[-1]].aname + \
+                        '" occurs more than once in complexType',
+                        ps.Backtrace(c_elt))
+                if any is not None:
+                    if stream: values.append(any.parse_stream(c_elt, ps))
+                    elif lazy: values.append(c_elt)
+                    else: values.append(any.parse(c_elt, ps))
+            elif lazy:
+                what = ofwhat[i]
+                if what.aname in pending:
+                    pending[what.aname][2].append(c_elt)
                 else:
-                    if debug:
-                        self.logger.debug("no element (%s,%s)",
-                                          what.nspname, what.pname)
-
-                # No match; if it was supposed to be here, that's an error.
-                if self.inorder is True and i == j:
-                    raise EvaluateException('Out of order complexType',
-                            ps.Backtrace(c_elt))
+                    pending[what.aname] = (what, multiple[i], [c_elt])
+                matched[i] = True
             else:
-                # only supporting 1 <any> declaration in content.
-                if isinstance(what,AnyElement):
-                    any = what
-                elif hasattr(what, 'default'):
-                    v[what.aname] = what.default
-                elif what.minOccurs > 0 and what.aname not in v:
-                    raise EvaluateException('Element "' + what.aname + \
-                        '" missing from complexType', ps.Backtrace(elt))
+                what = ofwhat[i]
+                if stream: value = what.parse_stream(c_elt, ps)
+                else: value = what.parse(c_elt, ps)
+                if multiple[i]:
+                    if what.aname in v:
+                        v[what.aname].append(value)
+                    else:
+                        v[what.aname] = [value]
+                else:
+                    v[what.aname] = value
+                matched[i] = True
+
+            # Child j must be the j-th field, or belong to an earlier one.
+            if self.inorder is True and j < len(ofwhat) and \
+            (i is None or i > j):
+                raise EvaluateException('Out of order complexType',
+                        ps.Backtrace(c_elt))
+
+        for i,what in enumerate(ofwhat):
+            if what is any or (matched[i] and not multiple[i]):
+                continue
+            if hasattr(what, 'default'):
+                v[what.aname] = what.default
+                if lazy: pending.pop(what.aname, None)
+            elif what.minOccurs > 0 and what.aname not in v and \
+            not (lazy and what.aname in pending):
+                raise EvaluateException('Element "' + what.aname + \
+                    '" missing from complexType', ps.Backtrace(elt))
+
+        if lazy:
+            return self._get_lazy_pyobj(v, pending, any, values, elt, ps)
 
         # Look for wildcards and unprocessed children
         # XXX Stick all this stuff in "any", hope for no collisions
         if any is not None:
-            occurs = 0
-            v[any.aname] = []
-            for j,c_elt in [ (j, c[j]) for j in crange if c[j] ]:
-                value = any.parse(c_elt, ps)
-                if any.maxOccurs == UNBOUNDED or any.maxOccurs > 1:
-                    v[any.aname].append(value)
-                else:
-                    v[any.aname] = value
+            self._set_any(any, values, v, elt, ps)
 
-                occurs += 1
+        return self._get_pyobj(v)
 
-            # No such thing as nillable <any>
-            if any.maxOccurs == 1 and occurs == 0:
-                v[any.aname] = None
-            elif occurs < any.minOccurs or (any.maxOccurs!=UNBOUNDED and any.maxOccurs<occurs):
-                raise EvaluateException('occurances of <any> elements(#%d) bound by (%d,%s)' %(
-                    occurs, any.minOccurs,str(any.maxOccurs)), ps.Backtrace(elt))
+    def _get_lazy_pyobj(self, v, pending, any, elts, elt, ps):
+        '''Return a LazyObject holding the values v, the fields in 
+        pending (aname to (typecode, multiple, elements)) and the <any>
+        elements elts are parsed on first use.
+        '''
+        fields = {}
+        for aname, (what, multiple, children) in list(pending.items()):
+            if multiple:
+                parse = lambda what=what, children=children: \
+                    [ what.parse(c, ps) for c in children ]
+            else:
+                parse = lambda what=what, c=children[0]: what.parse(c, ps)
+            fields[aname] = parse
+        if any is not None:
+            def parse_any():
+                d = {}
+                self._set_any(any, [ any.parse(c, ps) for c in elts ], d, elt, ps)
+                return d[any.aname]
+            fields[any.aname] = parse_any
+
+        cls = _lazy_class(self.pyclass)
+        try:
+            pyobj = cls()
+        except Exception as e:
+            raise TypeError("Constructing element (%s,%s) with pyclass(%s), %s" \
+                %(self.nspname, self.pname, self.pyclass.__name__, str(e)))
+        for key in list(v.keys()):
+            setattr(pyobj, key, v[key])
+        for key in fields:
+            pyobj.__dict__.pop(key, None)
+        if fields:
+            _pending[id(pyobj)] = fields
+        return pyobj
 
+    def _set_any(self, any, values, v, elt, ps):
+        '''Store the values parsed for the <any> wildcard in v.
+        '''
+        v[any.aname] = []
+        for value in values:
+            if any.maxOccurs == UNBOUNDED or any.maxOccurs > 1:
+                v[any.aname].append(value)
+            else:
+                v[any.aname] = value
+        occurs = len(values)
+
+        # No such thing as nillable <any>
+        if any.maxOccurs == 1 and occurs == 0:
+            v[any.aname] = None
+        elif occurs < any.minOccurs or (any.maxOccurs!=UNBOUNDED and any.maxOccurs<occurs):
+            raise EvaluateException('occurances of <any> elements(#%d) bound by (%d,%s)' %(
+                occurs, any.minOccurs,str(any.maxOccurs)), ps.Backtrace(elt))
+
+    def _get_pyobj(self, v):
+        '''Return the parsed values v as an instance of pyclass.
+        '''
         if not self.pyclass: 
             return v
 
@@ -270,7 +587,7 @@ class ComplexType(TypeCode):
         return pyobj
 
     def serialize(self, elt, sw, pyobj, inline=False, name=None, **kw):
-        if inline or self.inline:
+        if inline or self.inline or not sw.Shared(pyobj):
             self.cb(elt, sw, pyobj, name=name, **kw)
         else:
             objid = _get_idstr(pyobj)
@@ -294,7 +611,7 @@ class ComplexType(TypeCode):
             raise EvaluateException('element(%s,%s) is not nillable(%s)' %(
                 self.nspname,self.pname,self.nillable))
 
-        if self.mutable is False and sw.Known(pyobj): 
+        if self.mutable is False and sw.Shared(pyobj) and sw.Known(pyobj): 
             return
         
         if debug:
@@ -334,9 +651,14 @@ class ComplexType(TypeCode):
         elif not self.inline and self.unique:
             raise EvaluateException('Not inline, but unique makes no sense. No href/id.',
                 sw.Backtrace(elt))
-        elif n is not None:
+        elif n is not None and sw.Shared(pyobj):
             self.set_attribute_id(elem, objid)
 
+        if isinstance(pyobj, LazyObject):
+            # the fields not read yet are not in pyobj.__dict__
+            for name in list(_pending.get(id(pyobj), ())):
+                getattr(pyobj, name)
+
         if self.pyclass and type(self.pyclass) is type:
             f = lambda attr: getattr(pyobj, attr, None)
         elif self.pyclass:
@@ -348,6 +670,11 @@ class ComplexType(TypeCode):
             if TypeCode.typechecks and type(d) != dict:
                 raise TypeError("Classless struct didn't get dictionary")
 
+        if self.compiled is True and not debug:
+            code = self._get_compiled()
+            if code is not None:
+                return code.serialize(self, elt, elem, sw, pyobj, kw)
+
         indx, lenofwhat = 0, len(self.ofwhat)
         if debug:
             self.logger.debug('element declaration (%s,%s)', self.nspname, 
@@ -383,7 +710,8 @@ class ComplexType(TypeCode):
             # Default to typecode, if self-describing instance, and check 
             # to make sure it is derived from what.
             whatTC = what
-            if whatTC.maxOccurs > 1 and v is not None:
+            if (whatTC.maxOccurs == UNBOUNDED or whatTC.maxOccurs > 1) and \
+            v is not None:
                 if type(v) not in _seqtypes:
                     raise EvaluateException('pyobj (%s,%s), aname "%s": maxOccurs %s, expecting a %s' %(
                          self.nspname,self.pname,what.aname,whatTC.maxOccurs,_seqtypes), 
@@ -391,7 +719,8 @@ class ComplexType(TypeCode):
 
                 for v2 in v: 
                     occurs += 1
-                    if occurs > whatTC.maxOccurs:
+                    if whatTC.maxOccurs != UNBOUNDED and \
+                    occurs > whatTC.maxOccurs:
                         raise EvaluateException('occurances (%d) exceeded maxOccurs(%d) for <%s>' %(
                                 occurs, whatTC.maxOccurs, what.pname), 
                                 sw.Backtrace(elt))
@@ -452,6 +781,7 @@ class ComplexType(TypeCode):
                 ofwhat = (restrictions,)
         else:
             return
+        # the dispatch table is rebuilt for the new tuple
         self.ofwhat = tuple(ofwhat)
         self.lenofwhat = len(self.ofwhat)
 
@@ -492,19 +822,66 @@ class Struct(ComplexType):
         for idx in range(len(self.ofwhat)):
             what = self.ofwhat[idx]
             key = (what.nspname,what.pname)
-            if not isinstance(what, AnyElement) and what.maxOccurs > 1:
+            if not isinstance(what, AnyElement) and \
+            (what.maxOccurs == UNBOUNDED or what.maxOccurs > 1):
                 raise TypeError('Constraint: no element can have a maxOccurs>1')
             if key in whats[idx+1:]:
                 raise TypeError('Constraint: No element may have the same name as any other')
 
 
+_packcodes = {
+    'byte':'b', 'unsignedByte':'B', 'short':'h', 'unsignedShort':'H',
+    'int':'i', 'unsignedInt':'I', 'unsignedLong':'Q', 
+    'nonNegativeInteger':'Q', 'positiveInteger':'Q', 'float':'f', 
+}
+
+def _packable(what):
+    '''Can items of the typecode what go in an array.array?
+    '''
+    cls = what.__class__
+    if what.pyclass is not None or what.attribute_typecode_dict is not None:
+        return False
+    if isinstance(what, Integer):
+        return cls.parse is Integer.parse and \
+            cls.text_to_data is Integer.text_to_data
+    if isinstance(what, Decimal):
+        return cls.parse is Decimal.parse and \
+            cls.text_to_data is Decimal.text_to_data
+    return False
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def _is_buffer(pyobj):
+    '''Is pyobj an array.array or a NumPy array?
+    '''
+    return isinstance(pyobj, _array) or \
+        type(pyobj).__module__ == 'numpy' and hasattr(pyobj, 'tolist')
+
+
 class Array(TypeCode):
     '''An array.
         atype -- arrayType, (namespace,ncname) 
         mutable -- object could change between multiple serializations
         undeclared -- do not serialize/parse arrayType attribute.
+
+    Class data:
+        lazy -- parsing a DOM element returns a LazyList, whose items are
+            parsed when first read.  Not for sparse arrays.
+        packed -- for ofwhat Integer or Decimal (and their TCnumbers
+            subclasses), parsing a DOM element returns an array.array 
+            converted in bulk, "numpy" for a NumPy array when NumPy is 
+            installed.  Used before lazy.  Integers too large for a C
+            type are returned in a list.  array.array and NumPy values
+            are serialized without dispatching each item to ofwhat.
     '''
     logger = _GetLogger('ZSI.TCcompound.Array')
+    lazy = False
+    packed = False
     
     def __init__(self, atype, ofwhat, pname=None, dimensions=1, fill=None,
     sparse=False, mutable=False, size=None, nooffset=0, undeclared=False,
@@ -576,8 +953,132 @@ class Array(TypeCode):
             if _children(elt):
                 raise EvaluateException('Array has content and HREF',
                         ps.Backtrace(elt))
-            elt = ps.FindLocalHREF(href, elt)
+            return ps.ParseLocalHREF(href, elt, self, self._parse_content)
+        return self._parse_content(elt, ps)
+
+    def _parse_content(self, elt, ps):
         if self.nilled(elt, ps): return Nilled
+        if self.packed and not self.sparse and _packable(self.ofwhat):
+            v = self._parse_packed(elt, ps)
+            if self.packed == 'numpy' and isinstance(v, _array):
+                numpy = _numpy()
+                if numpy is not None:
+                    return numpy.frombuffer(v, dtype=v.typecode)
+            return v
+        if self.lazy is True and not self.sparse:
+            children, what = _child_elements(elt), self.ofwhat
+            v = self._parse_items(elt, ps, ( (c, _UNPARSED) for c in children ))
+            return LazyList(v, [ lambda c=c: what.parse(c, ps) 
+                                 for c in children ])
+        return self._parse_items(elt, ps, ( (c, self.ofwhat.parse(c, ps))
+                                    for c in _child_elements(elt) ))
+
+    def parse_stream(self, elt, ps):
+        '''Parse the items from the event stream of a streaming ParsedSoap.
+        '''
+        if _find_href(elt):
+            return TypeCode.parse_stream(self, elt, ps)
+        if self.nilled(elt, ps):
+            ps.stream.skip(elt)
+            return Nilled
+        return self._parse_items(elt, ps, ( (c, self.ofwhat.parse_stream(c, ps))
+                                    for c in ps.stream.children(elt) ))
+
+    def _parse_packed(self, elt, ps):
+        '''Return the items as an array.array, or a list of integers
+        too large for one.  Each kind of child 
+        (name and xsi:type) is parsed by ofwhat once, the text of the 
+        rest is converted in bulk and checked by ofwhat when the bulk 
+        checks fail.  Arrays with an offset or items with other 
+        attributes are parsed by ofwhat.
+        '''
+        what, children = self.ofwhat, _child_elements(elt)
+        if not _find_arraytype(elt) and self.undeclared is False:
+            raise EvaluateException('Array expected', ps.Backtrace(elt))
+        texts, kinds, types = [], {}, set()
+        if self.parse_offset(elt, ps): children = None
+        for c in children or ():
+            t = None
+            if c.hasAttributes():
+                t = _find_type(c)
+                if not t or len(c.attributes) != 1:
+                    children = None
+                    break
+            kind = (c.namespaceURI, c.localName, t)
+            if kind not in kinds:
+                what.parse(c, ps)
+                ns,name = what.checkname(c, ps)
+                if isinstance(what, Integer):
+                    types.add(name or what.type[1])
+                else:
+                    types.add((what.__class__.type or (ns, name))[1])
+                kinds[kind] = True
+            nodes = c.childNodes
+            if len(nodes) == 1 and nodes[0].nodeType == _Node.TEXT_NODE:
+                texts.append(nodes[0].nodeValue)
+            else:
+                texts.append(what.simple_value(c, ps))
+
+        if children is None or len(types) > 1:
+            v = self._parse_items(elt, ps, ( (c, what.parse(c, ps)) 
+                                    for c in _child_elements(elt) ))
+            if isinstance(what, Integer): types = set([ what.type[1] ])
+            else: types = set([ (what.__class__.type or (None, None))[1] ])
+            children, texts = None, v
+        t = (list(types) or [None])[0]
+
+        if isinstance(what, Integer):
+            code = _packcodes.get(t, 'q')
+            rmin, rmax = Integer.ranges.get(t, (None, None))
+            try:
+                v = _array(code, list(map(int, texts)))
+            except (TypeError, ValueError, OverflowError):
+                v = None
+            else:
+                if v and not ((rmin is None or min(v) >= rmin) and 
+                              (rmax is None or max(v) <= rmax)):
+                    v = None
+        else:
+            code = _packcodes.get(t, 'd')
+            rtiny, rmin, rmax = Decimal.ranges.get(t, (None, None, None))
+            try:
+                v = _array(code, list(map(float, texts)))
+            except (TypeError, ValueError):
+                v = None
+            if v and children is not None:
+                # INF, NaN, out of range, or underflow to zero
+                ok = all(map(_isfinite, v)) and \
+                    (rmin is None or min(v) >= rmin) and \
+                    (rmax is None or max(v) <= rmax)
+                if ok and 0.0 in v:
+                    ok = not [ x for x,text in zip(v, texts) 
+                               if x == 0 and Decimal.zeropat.search(text) ]
+                if not ok: v = None
+
+        if v is None:
+            # Let ofwhat report the first bad item.
+            if children is not None:
+                values = []
+                for c,text in zip(children, texts):
+                    if isinstance(what, Integer):
+                        values.append(what.text_to_data(text, c, ps))
+                        what.check_range(values[-1], t, c, ps)
+                    else:
+                        what.check_value(text, t, c, ps)
+                if not isinstance(what, Integer):
+                    return _array(code, list(map(float, texts)))
+                # valid for the schema type, too large for the C type
+                return values
+            if isinstance(what, Integer):
+                # parsed by ofwhat, too large for the C type
+                return texts
+            raise EvaluateException('Array items do not fit an array of "%s"'
+                                    %code, ps.Backtrace(elt))
+        return v
+
+    def _parse_items(self, elt, ps, items):
+        '''Collect the (element, value) pairs of items into a list.
+        '''
         if not _find_arraytype(elt) and self.undeclared is False:
             raise EvaluateException('Array expected', ps.Backtrace(elt))
         t = _find_type(elt)
@@ -589,8 +1090,7 @@ class Array(TypeCode):
             while vlen < offset:
                 vlen += 1
                 v.append(self.fill)
-        for c in _child_elements(elt):
-            item = self.ofwhat.parse(c, ps)
+        for c,item in items:
             position = self.parse_position(c, ps) or offset
             if self.sparse:
                 v.append((position, item))
@@ -607,7 +1107,8 @@ class Array(TypeCode):
         if debug:
             self.logger.debug("serialize: %r" %pyobj)
         
-        if self.mutable is False and sw.Known(pyobj): return
+        if self.mutable is False and sw.Shared(pyobj) and sw.Known(pyobj):
+            return
         objid = _get_idstr(pyobj)
         ns,n = self.get_name(name, objid)
         el = elt.createAppendElement(ns, n)
@@ -621,7 +1122,8 @@ class Array(TypeCode):
         self.set_attributes(el, pyobj)
 
         # soap href attribute
-        unique = self.unique or kw.get('unique', False)
+        shared = sw.Shared(pyobj)
+        unique = self.unique or kw.get('unique', False) or not shared
         if unique is False and sw.Known(pyobj):
             self.set_attribute_href(el, objid)
             return None
@@ -631,7 +1133,7 @@ class Array(TypeCode):
             self.set_attribute_xsi_type(el, **kw)
 
         # soap id attribute
-        if self.unique is False:
+        if self.unique is False and shared:
             self.set_attribute_id(el, objid)
 
         offset = 0
@@ -657,7 +1159,10 @@ class Array(TypeCode):
         elif not self.ofwhat.aname:
             d['name'] = 'element'
             
-        if self.sparse is False:
+        if self.sparse is False and _is_buffer(pyobj) and \
+        _packable(self.ofwhat):
+            self._serialize_packed(el, pyobj[offset:].tolist(), **d)
+        elif self.sparse is False:
             for e in pyobj[offset:]: self.ofwhat.serialize(el, sw, e, **d)
         else:
             position = 0
@@ -669,5 +1174,22 @@ class Array(TypeCode):
                 self.ofwhat.serialize(el, sw, v, **d)
                 position += 1
 
+    def _serialize_packed(self, el, values, name=None):
+        '''Serialize the numbers in values as items of el, formatted by
+        ofwhat but without calling its serialize.
+        '''
+        what = self.ofwhat
+        ns,n = what.get_name(name, '')
+        if isinstance(what, Integer):
+            texts = [ what.format %v for v in values ]
+        else:
+            texts = [ _isfinite(v) and what.format %v or 
+                      what.get_formatted_content(v) for v in values ]
+        typed = what.typed is True
+        for text in texts:
+            child = el.createAppendElement(ns, n)
+            if typed: what.set_attribute_xsi_type(child)
+            child.createAppendTextNode(text)
+
 
 if __name__ == '__main__': print(_copyright)
@@ -277,7 +277,7 @@ def _backtrace(elt, dom):
         if parent is None: break
         matches = [ c for c in _child_elements(parent) 
                         if c.nodeName == name ]
-        if len(matches) == 1:
+        if len(matches) == 1 or elt not in matches:
             s = '/' + name + s
         else:
             i = matches.index(elt) + 1
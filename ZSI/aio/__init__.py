@@ -0,0 +1,8 @@
+############################################################################
+# See LBNLCopyright for copyright notice!
+###########################################################################
+'''asyncio support: bindings whose calls are coroutines, on the stdlib
+asyncio streams, with no dependencies beyond ZSI itself.
+'''
+
+__all__=['client', 'server']
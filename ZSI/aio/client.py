@@ -0,0 +1,598 @@
+############################################################################
+# See LBNLCopyright for copyright notice!
+###########################################################################
+'''asyncio client binding.  Send, Receive, RPC and the operation callables
+are coroutines; calls are independent of each other so a single Binding
+can have any number of them in flight:
+
+    b = Binding(url='http://localhost/echo', timeout=30)
+    replies = await asyncio.gather(*[ b.echo(i) for i in range(1000) ])
+
+Requests go out over HTTP/1.1 connections kept in a ConnectionPool,
+optionally pipelined.
+'''
+import asyncio, collections, email.parser, http.client, time, urllib.parse
+import weakref
+
+from ZSI import _copyright, _get_postvalue_from_absoluteURI, ParsedSoap, \
+    FaultFromFaultMessage
+from ZSI import client, compress
+from ZSI.auth import AUTH
+from ZSI.wstools.logging import getLogger as _GetLogger
+
+
+class HTTPResponse:
+    '''A reply read by HTTPConnection, the body is read in full.
+    Instance data:
+        status, reason -- from the status line
+        msg -- headers, http.client.HTTPMessage
+        data -- body, bytes
+        will_close -- server closes the connection after this reply
+    '''
+
+    def __init__(self, status, reason, msg, data, will_close):
+        self.status, self.reason, self.msg = status, reason, msg
+        self.data, self.will_close = data, will_close
+
+    def getheader(self, name, default=None):
+        return self.msg.get(name, default)
+
+
+class HTTPConnection:
+    '''HTTP/1.1 client connection on asyncio streams.  Requests may be
+    pipelined, send writes a request and returns a future for its reply
+    while earlier replies are still outstanding.  A reader task reads the
+    replies in order and resolves the futures.
+
+    Instance data:
+        key -- (scheme, host, port, ssl) the connection was opened for
+        waiting -- futures of the requests written and not yet answered
+        reused -- a reply was already read on this connection
+        released -- time the connection last became idle
+        closed -- connection is closed
+    '''
+    logger = _GetLogger('ZSI.aio.client.HTTPConnection')
+    _parser = email.parser.BytesParser(_class=http.client.HTTPMessage)
+
+    def __init__(self, key, reader, writer, callback=None):
+        '''Parameters:
+            key -- (scheme, host, port, ssl)
+            reader, writer -- asyncio streams
+        Keyword arguments:
+            callback -- called with the connection whenever a reply was
+                read or the connection closed.
+        '''
+        self.key, self.reader, self.writer = key, reader, writer
+        self.callback = callback
+        self.waiting = collections.deque()
+        self.reused = False
+        self.released = time.time()
+        self.closed = False
+        self._task = None
+        self._drain = asyncio.Lock()
+
+    async def open(cls, key, timeout=None, callback=None):
+        '''Open a connection, a coroutine.
+        Parameters:
+            key -- (scheme, host, port, ssl), ssl is an ssl.SSLContext
+                or None for the default context of https.
+        '''
+        scheme, host, port, ssl = key
+        if scheme == 'https': ssl = ssl or True
+        else: ssl = None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl), timeout)
+        return cls(key, reader, writer, callback)
+    open = classmethod(open)
+
+    def is_stale(self):
+        '''Connection was closed, by us or the server.
+        '''
+        return self.closed or self.writer.is_closing() or self.reader.at_eof()
+
+    def send(self, method, path, headers, body):
+        '''Write a request, return a future for its HTTPResponse.  The
+        request is buffered in the transport, see drain.
+        Parameters:
+            method -- "POST", ...
+            path -- Request-URI
+            headers -- list of (header, value), Host and Content-Length
+                are added.
+            body -- bytes
+        '''
+        scheme, host, port, ssl = self.key
+        if port in (None, {'http':80, 'https':443}.get(scheme)):
+            hostheader = host
+        else:
+            hostheader = '%s:%d' %(host, port)
+        lines = [ '%s %s HTTP/1.1' %(method, path), 'Host: %s' %hostheader,
+                  'Content-Length: %d' %len(body) ]
+        for header,value in headers:
+            lines.append('%s: %s' %(header, value))
+        lines.extend(('', ''))
+
+        self.writer.write('\r\n'.join(lines).encode('latin-1') + body)
+        future = asyncio.get_event_loop().create_future()
+        self.waiting.append(future)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._read_replies())
+        return future
+
+    async def drain(self):
+        '''Wait until the transport buffer is flushed.
+        '''
+        async with self._drain:
+            await self.writer.drain()
+
+    def abandon(self):
+        '''Close the connection if every request waiting for a reply
+        was cancelled, nobody wants the replies.
+        '''
+        for future in self.waiting:
+            if not future.cancelled(): return
+        if self.waiting:
+            self.logger.debug('close %s, all requests cancelled', self.key[:3])
+            self.close()
+
+    def close(self, ex=None):
+        '''Close the connection, fail the requests waiting for a reply.
+        '''
+        if self.closed: return
+        self.closed = True
+        self.writer.close()
+        if self._task is not None and self._task is not _current_task():
+            self._task.cancel()
+        ex = ex or http.client.RemoteDisconnected(
+            'Connection closed with requests outstanding')
+        while self.waiting:
+            future = self.waiting.popleft()
+            if not future.done(): future.set_exception(ex)
+        if self.callback is not None: self.callback(self)
+
+    async def _read_replies(self):
+        try:
+            try:
+                while self.waiting:
+                    response = await self._read_response()
+                    self.reused = True
+                    future = self.waiting.popleft()
+                    if not future.done(): future.set_result(response)
+                    if response.will_close:
+                        self.close()
+                        break
+                    if not self.waiting:
+                        self.released = time.time()
+                    if self.callback is not None: self.callback(self)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                self.logger.debug('read failed on %s: %s', self.key[:3], ex)
+                if isinstance(ex, asyncio.IncompleteReadError):
+                    ex = http.client.IncompleteRead(ex.partial, ex.expected)
+                self.close(ex)
+        finally:
+            self._task = None
+
+    async def _read_response(self):
+        reader = self.reader
+        while 1:
+            line = await reader.readline()
+            if not line:
+                raise http.client.RemoteDisconnected(
+                    'Remote end closed connection without response')
+            try:
+                version, status, reason = \
+                    (line.decode('latin-1').rstrip('\r\n').split(None, 2) + [''])[:3]
+                status = int(status)
+            except ValueError:
+                raise http.client.BadStatusLine(repr(line))
+            if not version.startswith('HTTP/'):
+                raise http.client.BadStatusLine(repr(line))
+
+            lines = []
+            while 1:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''): break
+                lines.append(line)
+            msg = self._parser.parsebytes(b''.join(lines))
+            if 100 <= status < 200: continue
+            break
+
+        connection = (msg.get('connection') or '').lower()
+        if version == 'HTTP/1.0':
+            will_close = connection.find('keep-alive') < 0
+        else:
+            will_close = connection.find('close') >= 0
+
+        length = msg.get('content-length')
+        if status in (204, 304):
+            data = b''
+        elif (msg.get('transfer-encoding') or '').lower().find('chunked') >= 0:
+            chunks = []
+            while 1:
+                line = await reader.readline()
+                size = int(line.split(b';', 1)[0], 16)
+                if size == 0: break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            while await reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            data = b''.join(chunks)
+        elif length is not None:
+            data = await reader.readexactly(int(length))
+        else:
+            data = await reader.read()
+            will_close = True
+
+        return HTTPResponse(status, reason, msg, data, will_close)
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+class _LoopState:
+    '''Connections of a ConnectionPool in one event loop.
+    '''
+    def __init__(self):
+        self.connections = {}
+        self.connecting = {}
+        self.waiters = {}
+
+
+class ConnectionPool:
+    '''HTTP/1.1 connections of the asyncio bindings, kept open for
+    reuse.  Connections belong to an event loop, the pool keeps them per
+    running loop.
+
+    Instance data:
+        maxsize -- most connections open to one server, calls beyond
+            that wait for a connection.
+        pipeline -- requests written to a connection before the earlier
+            replies are read, 1 disables pipelining.
+        timeout -- seconds an idle connection is kept open.
+        hits -- calls sent on an open connection
+        misses -- calls that opened a new connection
+    '''
+    logger = _GetLogger('ZSI.aio.client.ConnectionPool')
+
+    def __init__(self, maxsize=100, pipeline=1, timeout=60):
+        self.maxsize = maxsize
+        self.pipeline = pipeline
+        self.timeout = timeout
+        self.hits = self.misses = 0
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_event_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState()
+        return state
+
+    def _wakeup(self, state, key):
+        waiters = state.waiters.get(key)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                break
+
+    def _changed(self, conn):
+        '''Callback of the connections.
+        '''
+        state = self._state()
+        if conn.closed:
+            l = state.connections.get(conn.key, [])
+            if conn in l: l.remove(conn)
+        self._wakeup(state, conn.key)
+
+    async def get(self, key, timeout=None):
+        '''Return a connection to send one more request on, a coroutine.
+        The request must be sent before the caller yields to the loop.
+        Parameters:
+            key -- (scheme, host, port, ssl)
+        Keyword arguments:
+            timeout -- seconds to wait for the connect
+        '''
+        state = self._state()
+        l = state.connections.setdefault(key, [])
+        while 1:
+            now = time.time()
+            best = None
+            for conn in l[:]:
+                if conn.is_stale() or (not conn.waiting and
+                now - conn.released > self.timeout):
+                    l.remove(conn)
+                    conn.close()
+                    continue
+                if len(conn.waiting) < self.pipeline and (best is None or
+                len(conn.waiting) < len(best.waiting)):
+                    best = conn
+            if best is not None:
+                self.hits += 1
+                return best
+            if len(l) + state.connecting.get(key, 0) < self.maxsize:
+                break
+
+            future = asyncio.get_event_loop().create_future()
+            state.waiters.setdefault(key, collections.deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._wakeup(state, key)
+                raise
+
+        self.misses += 1
+        state.connecting[key] = state.connecting.get(key, 0) + 1
+        try:
+            conn = await HTTPConnection.open(key, timeout, self._changed)
+        finally:
+            state.connecting[key] -= 1
+            self._wakeup(state, key)
+        l.append(conn)
+        return conn
+
+    async def request(self, key, method, path, headers, body,
+    timeout=None, idempotent=False):
+        '''Send a request, return the HTTPResponse, a coroutine.  A
+        request that failed on a reused connection before any reply was
+        read is resent once on another connection if idempotent.
+        '''
+        while 1:
+            conn = await self.get(key, timeout)
+            future = conn.send(method, path, headers, body)
+            reused = conn.reused or len(conn.waiting) > 1
+            try:
+                await conn.drain()
+                return await future
+            except asyncio.CancelledError:
+                future.cancel()
+                conn.abandon()
+                raise
+            except (ConnectionError, http.client.BadStatusLine) as ex:
+                if not (idempotent and reused): raise
+                self.logger.debug('resend request, %s', ex)
+                conn.close(ex)
+                idempotent = False
+
+    def clear(self):
+        '''Close the connections of the running loop.
+        '''
+        state = self._state()
+        for l in list(state.connections.values()):
+            for conn in l[:]: conn.close()
+        state.connections.clear()
+
+
+class _Call:
+    '''A request sent by Binding.Send, passed to Receive.
+    Instance data:
+        task -- asyncio Task resolving to the HTTPResponse
+        address -- WS-Address of the request or None
+        data -- reply body, once received
+        ps -- ParsedSoap of the reply, once received
+    '''
+
+    def __init__(self, address):
+        self.address = address
+        self.task = None
+        self.data = self.ps = None
+        self.reply_code = self.reply_msg = self.reply_headers = None
+
+    def cancel(self):
+        '''Cancel the call, its connection is closed if the reply is
+        still outstanding.
+        '''
+        return self.task.cancel()
+
+    def done(self):
+        return self.task.done()
+
+
+class Binding(client.Binding):
+    '''asyncio Binding, Send, Receive, RPC and the callables returned for
+    operation names are coroutines.  Every call carries its own state, so
+    the calls of one Binding may run concurrently.  The last call sent
+    is kept as self.call, the attributes of the last reply received
+    (data, ps, reply_code, ...) are set as in client.Binding.
+    '''
+    defaultConnectionPool = ConnectionPool()
+    logger = _GetLogger('ZSI.aio.client.Binding')
+
+    def __init__(self, typesmodule=None, timeout=None, ssl=None, **kw):
+        '''Keyword arguments, see client.Binding for the others:
+            timeout -- seconds a call may take, None for no limit
+            ssl -- ssl.SSLContext for https, default context by default
+            pool -- aio ConnectionPool, default is the pool shared by
+                all asyncio bindings.
+            transport, transdict -- not used
+        '''
+        client.Binding.__init__(self, typesmodule, **kw)
+        self.timeout = timeout
+        self.ssl = ssl
+        self.call = None
+        if self.pool is None:
+            self.pool = ConnectionPool(pipeline=1)
+
+    async def RPC(self, url, opname, obj, replytype=None, **kw):
+        '''Send a request, return the reply.  See Send() and Recieve()
+        docstrings for details.
+        '''
+        call = await self.Send(url, opname, obj, **kw)
+        return await self.Receive(replytype, call=call, **kw)
+
+    async def Send(self, url, opname, obj, nsdict={}, soapaction=None,
+    wsaction=None, endPointReference=None, timeout=None, **kw):
+        '''Send a message, return a _Call to pass to Receive.  The
+        request is written and its reply read in the background, the
+        call fails with asyncio.TimeoutError after timeout seconds.  See
+        client.Binding.Send for the other arguments.
+
+        Keyword arguments:
+            timeout -- seconds, default is self.timeout
+            idempotent -- may be resent if a pooled connection turns out
+                to be closed by the server.
+        '''
+        url = url or self.url
+        sw, address = self.SerializeRequest(url, opname, obj, nsdict,
+            soapaction, wsaction, endPointReference, **kw)
+        soapdata = str(sw).encode('utf-8')
+
+        u = urllib.parse.urlsplit(url)
+        if u.scheme not in ('http', 'https'):
+            raise RuntimeError('must specify transport or url startswith https/http')
+        key = (u.scheme, u.hostname, u.port or {'http':80, 'https':443}[u.scheme],
+            self.ssl)
+        headers = self.RequestHeaders(soapaction, kw.get('headers', {}))
+        if timeout is None: timeout = self.timeout
+
+        if self.trace:
+            print("_" * 33, time.ctime(time.time()), "REQUEST:", file=self.trace)
+            print(soapdata.decode('utf-8'), file=self.trace)
+
+        call = self.call = _Call(address)
+        exchange = self._exchange(call, key, url, headers, soapdata,
+            kw.get('idempotent', self.idempotent))
+        if timeout is not None:
+            exchange = asyncio.wait_for(exchange, timeout)
+        call.task = asyncio.ensure_future(exchange)
+        return call
+
+    async def _exchange(self, call, key, url, headers, soapdata, idempotent):
+        path = _get_postvalue_from_absoluteURI(url)
+        for attempt in (0, 1):
+            response = await self.pool.request(key, 'POST', path, headers,
+                soapdata, idempotent=idempotent)
+            for value in response.msg.get_all('set-cookie') or ():
+                self.cookies.load(value)
+            if response.status != 401 or attempt or \
+            self.auth_style != AUTH.httpdigest:
+                break
+            if self.trace:
+                print("------ Digest Auth Header", file=self.trace)
+            headers = headers + list(self.DigestAuthHeaders(
+                response.getheader('www-authenticate'), url).items())
+
+        if response.status == 401:
+            raise RuntimeError('HTTP Digest Authorization Failed')
+        return response
+
+    async def ReceiveRaw(self, call=None, **kw):
+        '''Read a server reply, decompressed if it has a Content-Encoding
+        but otherwise unconverted, and return it.
+        Keyword arguments:
+            call -- returned by Send, default is the last call sent
+        '''
+        call = call or self.call
+        if call.data is not None: return call.data
+        response = await call.task
+        call.reply_code, call.reply_msg, call.reply_headers = \
+            response.status, response.reason, response.msg
+        call.data = response.data
+        encoding = response.getheader('content-encoding', 'identity')
+        if encoding.strip().lower() != 'identity':
+            call.data = compress.Decompress(call.data, encoding,
+                self.decompresslimit)
+
+        self.reply_code, self.reply_msg, self.reply_headers = \
+            call.reply_code, call.reply_msg, call.reply_headers
+        self.data = call.data
+        trace = self.trace
+        if trace:
+            print("_" * 33, time.ctime(time.time()), "RESPONSE:", file=trace)
+            for i in (call.reply_code, call.reply_msg,):
+                print(str(i), file=trace)
+            print("-------", file=trace)
+            print(str(call.reply_headers), file=trace)
+            print(call.data, file=trace)
+        return call.data
+
+    async def IsSOAP(self, call=None):
+        call = call or self.call
+        if call.ps: return 1
+        await self.ReceiveRaw(call)
+        return call.reply_headers.get_content_type() == 'text/xml'
+
+    async def ReceiveSOAP(self, readerclass=None, streaming=False, call=None,
+    **kw):
+        '''Get back a SOAP message.
+        Keyword arguments:
+            streaming -- parse the reply with the pull parser instead of
+                building a DOM (see ParsedSoap); ignored when verifying
+                signatures.
+            call -- returned by Send, default is the last call sent
+        '''
+        call = call or self.call
+        if call.ps: return call.ps
+        if not await self.IsSOAP(call):
+            raise TypeError(
+                'Response is "%s", not "text/xml"' % call.reply_headers.get_content_type())
+        if len(call.data) == 0:
+            raise TypeError('Received empty response')
+
+        if streaming and self.sig_handler is None:
+            call.ps = ParsedSoap(call.data, streaming=True,
+                            encodingStyle=kw.get('encodingStyle'))
+        else:
+            call.ps = ParsedSoap(call.data,
+                            readerclass=readerclass or self.readerclass,
+                            encodingStyle=kw.get('encodingStyle'))
+            if self.sig_handler is not None:
+                self.sig_handler.verify(call.ps)
+
+        self.ps = call.ps
+        return call.ps
+
+    async def IsAFault(self, call=None):
+        '''Get a SOAP message, see if it has a fault.
+        '''
+        ps = await self.ReceiveSOAP(call=call)
+        return ps.IsAFault()
+
+    async def ReceiveFault(self, call=None, **kw):
+        '''Parse incoming message as a fault. Raise TypeError if no
+        fault found.
+        '''
+        ps = await self.ReceiveSOAP(call=call, **kw)
+        if not ps.IsAFault():
+            raise TypeError("Expected SOAP Fault not found")
+        return FaultFromFaultMessage(ps)
+
+    async def Receive(self, replytype, call=None, **kw):
+        '''Parse message, create Python object.
+
+        KeyWord data:
+            call -- returned by Send, default is the last call sent
+            faults   -- list of WSDL operation.fault typecodes
+            wsaction -- If using WS-Address, must specify Action value we expect to
+                receive.
+        '''
+        call = call or self.call
+        if self.typesmodule is not None:
+            kw['streaming'] = False
+        ps = await self.ReceiveSOAP(call=call, **kw)
+        return self.ParseReply(ps, replytype, call.address, **kw)
+
+
+class NamedParamBinding(Binding):
+    '''Like Binding, except the argument list for invocation is
+    named parameters.
+    '''
+    logger = _GetLogger('ZSI.aio.client.Binding')
+
+    def __getattr__(self, name):
+        '''Return a callable object that will invoke the RPC method
+        named by the attribute.
+        '''
+        if name[:2] == '__' and len(name) > 5 and name[-2:] == '__':
+            if hasattr(self, name): return getattr(self, name)
+            return getattr(self.__class__, name)
+        return client._NamedParamCaller(self, name)
+
+
+if __name__ == '__main__': print(_copyright)
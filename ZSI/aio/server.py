@@ -0,0 +1,553 @@
+############################################################################
+# See LBNLCopyright for copyright notice!
+###########################################################################
+'''asyncio service container.  Hosts the ServiceSOAPBinding and
+SimpleWSResource instances of ServiceContainer, either standalone:
+
+    AsServer(port=8080, services=[EchoService('/echo')])
+
+or as an ASGI application, served by any ASGI server:
+
+    app = ServiceContainer([EchoService('/echo')])
+
+Synchronous operations run in a bounded thread pool, operations that are
+coroutine functions are awaited on the loop.  Request bodies are parsed
+as they arrive and replies written out in chunks.  Requests beyond
+max_concurrency are turned away with a Server fault (HTTP 503).
+'''
+import asyncio, concurrent.futures, contextvars, email.parser, http.client
+import inspect, re, sys, urllib.parse
+
+from ZSI import _copyright, ParseException, Fault, FaultFromException, \
+    FaultFromZSIException, resolvers
+from ZSI.address import Address
+from ZSI.parse import ParsedSoap
+from ZSI.writer import SoapWriter
+from ZSI.streamwriter import StreamElementProxy
+from ZSI import ServiceContainer as _sc
+from ZSI.ServiceContainer import NoSuchService, WSActionException, \
+    SimpleWSResource, ServiceInterface, SOAPContext
+from ZSI.wstools.logging import getLogger as _GetLogger
+
+
+_context = contextvars.ContextVar('ZSI.aio.server.SOAPContext')
+
+def GetSOAPContext():
+    '''Return the SOAPContext of the request being processed, in the
+    worker thread of a synchronous operation or the task of an
+    asynchronous one.
+    '''
+    return _context.get()
+
+
+class _FaultReply(Exception):
+    '''Internal, carries the Fault to reply with.
+    '''
+    def __init__(self, fault, code=500):
+        Exception.__init__(self, fault, code)
+        self.fault, self.code = fault, code
+
+
+class _BodyReader:
+    '''File-like object a worker thread reads the request body from, the
+    chunks are pulled from ASGI receive on the loop as they are needed.
+    '''
+
+    def __init__(self, loop, receive):
+        self.loop, self.receive = loop, receive
+        self.buffer, self.more = b'', True
+
+    def _pull(self):
+        message = asyncio.run_coroutine_threadsafe(self.receive(),
+            self.loop).result()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionResetError('client disconnected')
+        self.buffer += message.get('body', b'')
+        self.more = message.get('more_body', False)
+
+    def read(self, size=-1):
+        while self.more and (size < 0 or not self.buffer):
+            self._pull()
+        if size < 0 or size >= len(self.buffer):
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class _BodyWriter:
+    '''File-like object a worker thread writes the reply body to, each
+    chunk is sent with ASGI send on the loop.
+    '''
+
+    def __init__(self, loop, send):
+        self.loop, self.send = loop, send
+
+    def write(self, data):
+        asyncio.run_coroutine_threadsafe(self.send({'type':'http.response.body',
+            'body':data, 'more_body':True}), self.loop).result()
+
+
+class ServiceContainer:
+    '''asyncio container of services, keyed by their POST path.  An
+    instance is an ASGI application, serve() runs it standalone.
+
+    Instance data:
+        max_concurrency -- requests processed at once, more are answered
+            with a Server fault and HTTP 503.
+        executor -- thread pool running the synchronous operations
+        outputclass -- SoapWriter outputclass of replies, None for a DOM
+            (needed by services that sign replies).
+        streaming -- parse requests without a DOM (see ParsedSoap)
+        nsdict -- namespaces declared in replies
+        server_name, server_port -- address of the container, used when
+            the ASGI server does not tell.
+    '''
+    NodeTree = _sc.ServiceContainer.NodeTree
+    logger = _GetLogger('ZSI.aio.server.ServiceContainer')
+    chunksize = 64 * 1024
+
+    def __init__(self, services=(), max_concurrency=100, max_workers=None,
+    outputclass=StreamElementProxy, streaming=True, nsdict={},
+    server_name='localhost', server_port=80):
+        '''Parameters:
+            services -- list of service instances
+        Keyword arguments:
+            max_workers -- size of the thread pool, see
+                concurrent.futures.ThreadPoolExecutor
+        '''
+        self._nodes = self.NodeTree()
+        self.max_concurrency = max_concurrency
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self.outputclass = outputclass
+        self.streaming = streaming
+        self.nsdict = nsdict
+        self.server_name, self.server_port = server_name, server_port
+        self.active = 0
+        for service in services: self.setNode(service)
+
+    def __str__(self):
+        return '%s(%s) nodes( %s )' %(self.__class__, id(self), str(self._nodes))
+
+    def setNode(self, service, url=None):
+        if url is None:
+            url = service.getPost()
+        self._nodes.setNode(service, url)
+
+    def getNode(self, url):
+        return self._nodes.getNode(url)
+
+    def removeNode(self, url):
+        self._nodes.removeNode(url)
+
+    async def __call__(self, scope, receive, send):
+        '''ASGI application.
+        '''
+        if scope['type'] == 'lifespan':
+            while 1:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type':'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    self.executor.shutdown(wait=False)
+                    await send({'type':'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            raise RuntimeError('Unsupported ASGI scope type "%s"' %scope['type'])
+
+        if scope['method'] == 'GET':
+            return await self.do_GET(scope, receive, send)
+        if scope['method'] != 'POST':
+            return await self.send_xml(send, Fault(Fault.Client,
+                'Must use POST').AsSOAP(), 405)
+        if self.active >= self.max_concurrency:
+            self.logger.debug('busy, %d requests in process', self.active)
+            return await self.send_fault(send, Fault(Fault.Server,
+                'Server busy, %d requests in process' %self.active), 503,
+                headers=[(b'retry-after', b'1')])
+
+        self.active += 1
+        try:
+            await self.do_POST(scope, receive, send)
+        finally:
+            self.active -= 1
+
+    async def do_POST(self, scope, receive, send):
+        '''Dispatch a request to the service at its POST path, the
+        operation is chosen by soapAction or the WS-Action.
+        '''
+        loop = asyncio.get_event_loop()
+        headers = http.client.HTTPMessage()
+        for name, value in scope.get('headers', ()):
+            headers[name.decode('latin-1')] = value.decode('latin-1')
+        post = scope.get('root_path', '') + scope['path']
+        soapAction = headers.get('SOAPAction')
+        if soapAction:
+            soapAction = soapAction.strip('\'"')
+        post = post.strip('\'"')
+        server_name, server_port = scope.get('server') or \
+            (self.server_name, self.server_port)
+        localURL = '%s://%s:%d%s' %(scope.get('scheme', 'http'), server_name,
+            server_port, post)
+
+        try:
+            service = self.getNode(post)
+            request = await loop.run_in_executor(self.executor,
+                self._parse, service, _BodyReader(loop, receive),
+                headers, post, soapAction, localURL)
+            ps, method, args, address, action = request
+            context = SOAPContext(self, None, ps, scope, headers, soapAction)
+            if inspect.iscoroutinefunction(method):
+                _context.set(context)
+                result = await self._invoke_async(method, args)
+            else:
+                result = await loop.run_in_executor(self.executor,
+                    contextvars.copy_context().run, self._invoke, method,
+                    args, context)
+                if inspect.isawaitable(result):
+                    _context.set(context)
+                    result = await self._invoke_async(lambda: result, ())
+
+            # If No response just return.
+            if result is None:
+                return await self.send_xml(send, b'', 202)
+
+            sw = await loop.run_in_executor(self.executor, self._serialize,
+                service, ps, result, address, action, localURL)
+        except _FaultReply as ex:
+            return await self.send_fault(send, ex.fault, ex.code)
+        except Exception as ex:
+            return await self.send_fault(send,
+                FaultFromException(ex, 0, sys.exc_info()[2]))
+
+        await send({'type':'http.response.start', 'status':200,
+            'headers':[(b'content-type', b'text/xml; charset="utf-8"')]})
+        await loop.run_in_executor(self.executor, sw.write_to,
+            _BodyWriter(loop, send))
+        await send({'type':'http.response.body', 'body':b'', 'more_body':False})
+
+    def _parse(self, service, reader, headers, post, action, localURL):
+        '''Parse the request and find its operation, in a worker thread.
+        Returns (ps, method, args, address, action).
+        '''
+        try:
+            ct = headers.get('content-type', '')
+            if ct.startswith('multipart/'):
+                cid = resolvers.MIMEResolver(ct, reader)
+                xml = cid.GetSOAPPart()
+                ps = ParsedSoap(xml, resolver=cid.Resolve)
+            else:
+                ps = ParsedSoap(reader, streaming=self.streaming)
+        except ParseException as e:
+            raise _FaultReply(FaultFromZSIException(e))
+        except Exception as e:
+            # Faulted while processing; assume it's in the header.
+            raise _FaultReply(FaultFromException(e, 1, sys.exc_info()[2]))
+
+        address = action
+        isWSResource = isinstance(service, SimpleWSResource)
+        if isWSResource:
+            service.setServiceURL(localURL)
+            address = Address()
+            try:
+                address.parse(ps)
+            except Exception as e:
+                raise _FaultReply(FaultFromException(e, 0, sys.exc_info()[2]))
+            if action and action != address.getAction():
+                e = WSActionException('SOAP Action("%s") must match WS-Action("%s") if specified.' \
+                    %(action,address.getAction()))
+                raise _FaultReply(FaultFromException(e, 0, None))
+            action = address.getAction()
+
+        if isinstance(service, ServiceInterface) is False:
+            e = NoSuchService('no service at POST(%s) in container: %s' %(post,self))
+            raise _FaultReply(FaultFromException(e, 0, None))
+
+        if not service.authorize(None, post, action):
+            raise _FaultReply(Fault(Fault.Server, "Not authorized"), 401)
+
+        try:
+            method = service.getOperation(ps, address)
+        except Exception as e:
+            raise _FaultReply(FaultFromException(e, 0, sys.exc_info()[2]))
+
+        if inspect.iscoroutinefunction(method) and ps.stream is not None:
+            # read the rest here, the loop must not block on the body
+            ps.data_elements
+
+        args = (ps,)
+        if isWSResource: args = (ps, address)
+        return ps, method, args, address, action
+
+    def _invoke(self, method, args, context):
+        '''Run a synchronous operation in a worker thread.
+        '''
+        _sc._contexts.context = context
+        _context.set(context)
+        try:
+            return method(*args)
+        except Exception as e:
+            raise _FaultReply(FaultFromException(e, 0, sys.exc_info()[2]))
+        finally:
+            _sc._contexts.context = None
+
+    async def _invoke_async(self, method, args):
+        try:
+            return await method(*args)
+        except Exception as e:
+            raise _FaultReply(FaultFromException(e, 0, sys.exc_info()[2]))
+
+    def _serialize(self, service, ps, result, address, action, localURL):
+        '''Serialize the reply in a worker thread, returns the SoapWriter.
+        '''
+        # Verify if Signed
+        service.verify(ps)
+
+        sw = SoapWriter(nsdict=self.nsdict, outputclass=self.outputclass)
+        try:
+            sw.serialize(result)
+        except Exception as e:
+            raise _FaultReply(FaultFromException(e, 0, sys.exc_info()[2]))
+
+        if isinstance(service, SimpleWSResource):
+            action = service.getResponseAction(ps, action)
+            addressRsp = Address(action=action)
+            try:
+                addressRsp.setResponseFromWSAddress(address, localURL)
+                addressRsp.serialize(sw)
+            except Exception as e:
+                raise _FaultReply(FaultFromException(e, 0, sys.exc_info()[2]))
+
+        # Create Signatures
+        service.sign(sw)
+        sw.close()
+        return sw
+
+    async def do_GET(self, scope, receive, send):
+        '''Return the WSDL of a service for "?wsdl".
+        '''
+        service_path = scope['path']
+        if scope.get('query_string', b'').lower() != b'wsdl':
+            return await self.send_error(send, 404,
+                "Service not found [%s]." % service_path)
+        try:
+            service = self.getNode(service_path)
+        except NoSuchService:
+            service = None
+        if not hasattr(service, "_wsdl"):
+            return await self.send_error(send, 404,
+                "WSDL not available for that service [%s]." % service_path)
+
+        server_name, server_port = scope.get('server') or \
+            (self.server_name, self.server_port)
+        serviceUrl = '%s://%s:%d%s' % (scope.get('scheme', 'http'),
+            server_name, server_port, service_path)
+        soapAddress = '<soap:address location="%s"/>' % serviceUrl
+        wsdlre = re.compile('\<soap:address[^\>]*>',re.IGNORECASE)
+        await self.send_xml(send, re.sub(wsdlre, soapAddress, service._wsdl))
+
+    async def send_xml(self, send, text, code=200, headers=()):
+        '''Send some XML.
+        '''
+        if type(text) is str: text = text.encode('utf-8')
+        headers = [ (b'content-type', b'text/xml; charset="utf-8"'),
+                    (b'content-length', str(len(text)).encode()) ] + list(headers)
+        await send({'type':'http.response.start', 'status':code,
+            'headers':headers})
+        await send({'type':'http.response.body', 'body':text})
+
+    async def send_fault(self, send, f, code=500, headers=()):
+        '''Send a fault.
+        '''
+        await self.send_xml(send, f.AsSOAP(), code, headers)
+
+    async def send_error(self, send, code, message):
+        text = message.encode('utf-8')
+        await send({'type':'http.response.start', 'status':code,
+            'headers':[ (b'content-type', b'text/plain; charset="utf-8"'),
+                        (b'content-length', str(len(text)).encode()) ]})
+        await send({'type':'http.response.body', 'body':text})
+
+    async def serve(self, host='', port=80, **kw):
+        '''Serve HTTP/1.1 on the address until cancelled, a coroutine.
+        Keyword arguments are passed to asyncio.start_server.
+        '''
+        server = await self.start(host, port, **kw)
+        async with server:
+            await server.serve_forever()
+
+    async def start(self, host='', port=80, **kw):
+        '''Start serving HTTP/1.1 on the address, return the
+        asyncio.Server, a coroutine.
+        '''
+        server = await asyncio.start_server(self._connection, host or None,
+            port, **kw)
+        sockname = server.sockets[0].getsockname()
+        self.server_name = host or self.server_name
+        self.server_port = sockname[1]
+        return server
+
+    async def _connection(self, reader, writer):
+        '''Serve the requests of one connection in turn.
+        '''
+        try:
+            while await _HTTPExchange(self, reader, writer).run():
+                pass
+        except asyncio.CancelledError:
+            # server shutting down
+            pass
+        except (ConnectionError, asyncio.IncompleteReadError) as ex:
+            self.logger.debug('connection lost: %s', ex)
+        except http.client.HTTPException as ex:
+            self.logger.debug('bad request: %s', ex)
+        except Exception as ex:
+            self.logger.error('request failed: %s', ex)
+        finally:
+            writer.close()
+
+
+class _HTTPExchange:
+    '''One HTTP/1.1 request and its reply, adapted to ASGI for the
+    standalone server.
+    '''
+    _parser = email.parser.BytesParser(_class=http.client.HTTPMessage)
+
+    def __init__(self, app, reader, writer):
+        self.app, self.reader, self.writer = app, reader, writer
+        self.remaining = 0
+        self.chunked = self.done = self.started = self.continued = False
+        self.response_chunked = False
+
+    async def run(self):
+        '''Serve one request, return whether the connection is kept.
+        '''
+        reader = self.reader
+        line = await reader.readline()
+        while line in (b'\r\n', b'\n'):
+            line = await reader.readline()
+        if not line: return False
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise http.client.BadStatusLine(repr(line))
+
+        lines = []
+        while 1:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''): break
+            lines.append(line)
+        msg = self._parser.parsebytes(b''.join(lines))
+
+        connection = (msg.get('connection') or '').lower()
+        if version == 'HTTP/1.0':
+            self.keep_alive = connection.find('keep-alive') >= 0
+        else:
+            self.keep_alive = connection.find('close') < 0
+        self.version = version
+        self.expect = (msg.get('expect') or '').lower() == '100-continue'
+        if (msg.get('transfer-encoding') or '').lower().find('chunked') >= 0:
+            self.chunked = True
+        else:
+            self.remaining = int(msg.get('content-length') or 0)
+            self.done = self.remaining == 0
+
+        path, _, query = target.partition('?')
+        scope = {
+            'type':'http', 'asgi':{'version':'3.0'},
+            'http_version':version[5:], 'method':method.upper(),
+            'scheme':'http', 'path':urllib.parse.unquote(path),
+            'raw_path':path.encode('latin-1'),
+            'query_string':query.encode('latin-1'), 'root_path':'',
+            'headers':[ (k.lower().encode('latin-1'), v.encode('latin-1'))
+                        for k,v in msg.items() ],
+            'server':self.writer.get_extra_info('sockname')[:2],
+            'client':(self.writer.get_extra_info('peername') or ('', 0))[:2],
+        }
+        scope['server'] = (self.app.server_name, scope['server'][1])
+        await self.app(scope, self.receive, self.send)
+        if not self.keep_alive: return False
+        # skip what the application left unread of the request body
+        while not self.done:
+            if self.expect and not self.continued: return False
+            await self.read()
+        return True
+
+    async def receive(self):
+        if self.done:
+            if self.started:
+                # nothing more to read, wait for the reply to go out
+                await asyncio.Event().wait()
+            return {'type':'http.request', 'body':b'', 'more_body':False}
+        if self.expect and not self.continued:
+            self.continued = True
+            self.writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        body = await self.read()
+        return {'type':'http.request', 'body':body, 'more_body':not self.done}
+
+    async def read(self):
+        '''Return the next chunk of the request body.
+        '''
+        reader, size = self.reader, self.app.chunksize
+        if self.chunked:
+            line = await reader.readline()
+            size = int(line.split(b';', 1)[0], 16)
+            if size == 0:
+                while await reader.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                self.done = True
+                return b''
+            body = await reader.readexactly(size)
+            await reader.readline()
+        else:
+            body = await reader.read(min(self.remaining, size))
+            if not body:
+                raise ConnectionResetError('client closed the connection')
+            self.remaining -= len(body)
+            self.done = self.remaining == 0
+        return body
+
+    async def send(self, message):
+        writer = self.writer
+        if message['type'] == 'http.response.start':
+            self.started = True
+            headers = list(message.get('headers', ()))
+            names = [ name.lower() for name,value in headers ]
+            if b'content-length' not in names:
+                if self.version == 'HTTP/1.1':
+                    self.response_chunked = True
+                    headers.append((b'transfer-encoding', b'chunked'))
+                else:
+                    self.keep_alive = False
+            if not self.keep_alive:
+                headers.append((b'connection', b'close'))
+            elif self.version == 'HTTP/1.0':
+                headers.append((b'connection', b'keep-alive'))
+            status = message['status']
+            lines = [ ('HTTP/1.1 %d %s' %(status,
+                http.client.responses.get(status, ''))).encode('latin-1') ]
+            for name, value in headers:
+                lines.append(name + b': ' + value)
+            lines.extend((b'', b''))
+            writer.write(b'\r\n'.join(lines))
+        elif message['type'] == 'http.response.body':
+            body = message.get('body', b'')
+            if self.response_chunked:
+                if body:
+                    writer.write(b'%x\r\n' %len(body) + body + b'\r\n')
+                if not message.get('more_body', False):
+                    writer.write(b'0\r\n\r\n')
+            elif body:
+                writer.write(body)
+            await writer.drain()
+
+
+def AsServer(port=80, services=(), **kw):
+    '''port --
+       services -- list of service instances
+       Keyword arguments are passed to ServiceContainer.
+    '''
+    sc = ServiceContainer(services, **kw)
+    asyncio.run(sc.serve('', port))
+
+
+if __name__ == '__main__': print(_copyright)
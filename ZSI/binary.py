@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# $Header$
+'''Incremental base64 and hex codecs for the binary typecodes.
+
+The decoders take the character data of an element a chunk at a time
+and write the bytes to a sink: a bytearray, a byte memoryview to fill,
+or a file-like object (a tempfile.SpooledTemporaryFile for instance).
+The encoders read a bytes-like object or a binary file a chunk at a
+time and generate the encoded text in chunks, with the same line
+breaks as base64.encodebytes.  Neither side holds the whole value as
+one string.
+'''
+
+from . import _copyright
+import binascii
+from base64 import encodebytes
+
+_WHITESPACE = b' \t\r\n'
+_NOT_BASE64 = bytes([ c for c in range(256) if c not in
+    b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=' ])
+
+
+class _Decoder:
+    '''Base of the decoders.
+        Instance data:
+            sink -- bytearray, memoryview or file-like object with write()
+            size -- number of bytes written to sink
+        Class data:
+            unit -- number of characters decoded together
+            delete -- characters ignored in the text
+            chunksize -- characters decoded at a time
+    '''
+    unit = 1
+    delete = _WHITESPACE
+    chunksize = 64 * 1024
+
+    def __init__(self, sink=None):
+        if sink is None: sink = bytearray()
+        self.sink, self.size, self._rest = sink, 0, b''
+
+    def write(self, text):
+        '''Decode the next chunk of text, str or ASCII bytes.
+        '''
+        for i in range(0, len(text), self.chunksize):
+            chunk = text[i:i+self.chunksize]
+            if type(chunk) is str: chunk = chunk.encode('ascii')
+            chunk = self._rest + chunk.translate(None, self.delete)
+            n = len(chunk) - len(chunk) % self.unit
+            self._rest = chunk[n:]
+            if n: self.put(self._decode(chunk[:n]))
+
+    def close(self):
+        '''Decode the rest of the text, and return the sink: for a
+        memoryview the part written, a file that can seek is rewound.
+        '''
+        if self._rest:
+            rest, self._rest = self._rest, b''
+            self.put(self._decode(rest))
+        sink = self.sink
+        if isinstance(sink, memoryview):
+            return sink[:self.size]
+        if not isinstance(sink, bytearray) and hasattr(sink, 'seek'):
+            sink.seek(0)
+        return sink
+
+    def put(self, data):
+        '''Write bytes that need no decoding, an XOP part for instance.
+        '''
+        sink, end = self.sink, self.size + len(data)
+        if isinstance(sink, bytearray):
+            sink.extend(data)
+        elif isinstance(sink, memoryview):
+            if end > len(sink):
+                raise ValueError('decoded data longer than the memoryview')
+            sink[self.size:end] = data
+        else:
+            sink.write(data)
+        self.size = end
+
+
+class Base64Decoder(_Decoder):
+    '''Decode base64 text, characters outside the base64 alphabet are
+    ignored like base64.decodebytes does.
+    '''
+    unit = 4
+    delete = _NOT_BASE64
+    _decode = staticmethod(binascii.a2b_base64)
+
+
+class HexDecoder(_Decoder):
+    '''Decode hex text, whitespace is ignored.
+    '''
+    unit = 2
+    _decode = staticmethod(binascii.unhexlify)
+
+
+def _read_chunks(source, size):
+    '''Generate the bytes of source in chunks of size bytes, the last
+    one may be shorter.  source is a bytes-like object or a binary file.
+    '''
+    if hasattr(source, 'read'):
+        rest = b''
+        while True:
+            data = source.read(size - len(rest))
+            if not data: break
+            rest += data
+            if len(rest) >= size:
+                yield rest
+                rest = b''
+        if rest: yield rest
+        return
+    view = memoryview(source)
+    if view.format != 'B' or view.ndim != 1: view = view.cast('B')
+    for i in range(0, len(view), size):
+        yield view[i:i+size]
+
+def Base64Encode(source, chunksize=57*1024):
+    '''Generate the base64 text of source in chunks, lines of 76
+    characters each ended by a newline.
+        source -- bytes-like object or binary file
+        chunksize -- bytes encoded at a time, a multiple of 57
+    '''
+    for data in _read_chunks(source, chunksize):
+        yield encodebytes(data).decode('ascii')
+
+def HexEncode(source, chunksize=32*1024):
+    '''Generate the upper case hex text of source in chunks.
+        source -- bytes-like object or binary file
+        chunksize -- bytes encoded at a time
+    '''
+    for data in _read_chunks(source, chunksize):
+        yield binascii.hexlify(data).upper().decode('ascii')
+
+
+if __name__ == '__main__': print(_copyright)
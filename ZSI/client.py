@@ -12,8 +12,13 @@ from .ZSI.TC import AnyElement, AnyType, String, TypeCode, _get_global_element_d
 from .ZSI.TCcompound import Struct
 import base64, http.client, http.cookies, types, time, urllib.parse
 from .ZSI.address import Address
+from .ZSI import resolvers
 from .ZSI.wstools.logging import getLogger as _GetLogger
-import collections
+from .pool import ConnectionPool
+from .mtom import Package
+from . import compress
+import collections, socket
+from io import BytesIO
 _b64_encode = base64.encodestring
 
 class _AuthHeader:
@@ -72,6 +77,7 @@ class _Binding:
     '''
     defaultHttpTransport = http.client.HTTPConnection
     defaultHttpsTransport = http.client.HTTPSConnection
+    defaultConnectionPool = ConnectionPool()
     logger = _GetLogger('ZSI.client.Binding')
 
     def __init__(self, nsdict=None, transport=None, url=None, tracefile=None,
@@ -93,9 +99,25 @@ class _Binding:
             it's not used.
             sig_handler -- XML Signature handler, must sign and verify.
             endPointReference -- optional Endpoint Reference.
+            pool -- ConnectionPool for keep-alive connections, None for a
+            new connection per request.  Default is the pool shared by all
+            bindings.
+            idempotent -- operations may be resent if a pooled connection 
+            turns out to be closed by the server, see Send.
+            mtom -- send binary values of at least this many bytes as
+            MTOM/XOP attachments, see SoapWriter.  None for no MTOM.
+            compression -- Content-Encoding of requests, gzip or deflate.
+            Default is None, requests are not compressed.
+            compresslevel -- zlib compression level, default 6.
+            compressthreshold -- smallest request compressed, default 1024.
+            acceptencoding -- Accept-Encoding header, by default gzip and
+            deflate replies are accepted; None to not send one.
+            decompresslimit -- most bytes a compressed reply may
+            decompress to, default 64 MB; None for no limit.
         '''
         self.data = None
         self.ps = None
+        self.h = None
         self.user_headers = []
         self.nsdict = nsdict or {}
         self.transport = transport
@@ -111,6 +133,15 @@ class _Binding:
         self.endPointReference = kw.get('endPointReference', None)
         self.cookies = http.cookies.SimpleCookie()
         self.http_callbacks = {}
+        self.pool = kw.get('pool', self.defaultConnectionPool)
+        self.idempotent = kw.get('idempotent', False)
+        self.mtom = kw.get('mtom')
+        self.compression = kw.get('compression')
+        self.compresslevel = kw.get('compresslevel', 6)
+        self.compressthreshold = kw.get('compressthreshold', 1024)
+        self.acceptencoding = kw.get('acceptencoding', compress.ACCEPT_ENCODING)
+        self.decompresslimit = kw.get('decompresslimit',
+            compress.DECOMPRESS_LIMIT)
 
         if 'auth' in kw:
             self.SetAuth(*kw['auth'])
@@ -147,9 +178,10 @@ class _Binding:
         self.user_headers.append((header, value))
         return self
 
-    def __addcookies(self):
-        '''Add cookies from self.cookies to request in self.h
+    def CookieHeaders(self):
+        '''Return the Cookie header values for the cookies in self.cookies.
         '''
+        cookies = []
         for cname, morsel in list(self.cookies.items()):
             attrs = []
             value = morsel.get('version', '')
@@ -162,7 +194,35 @@ class _Binding:
             value = morsel.get('domain')
             if value:
                 attrs.append('$Domain=%s' % value)
-            self.h.putheader('Cookie', "; ".join(attrs))
+            cookies.append("; ".join(attrs))
+        return cookies
+
+    def RequestHeaders(self, soapaction=None, headers={}, contenttype=None):
+        '''Return the HTTP headers of a request as a list of (header, value),
+        all but Content-length.
+        Keyword arguments:
+            soapaction -- SOAPAction, default is self.soapaction
+            headers -- dict of additional headers
+            contenttype -- Content-type, default is text/xml
+        '''
+        l = [ ("Content-type", contenttype or 'text/xml; charset=utf-8') ]
+        if self.acceptencoding:
+            l.append(("Accept-Encoding", self.acceptencoding))
+        for value in self.CookieHeaders():
+            l.append(('Cookie', value))
+
+        for header,value in list(headers.items()):
+            l.append((header, value))
+
+        SOAPActionValue = '"%s"' % (soapaction or self.soapaction)
+        l.append(("SOAPAction", SOAPActionValue))
+        if self.auth_style & AUTH.httpbasic:
+            val = _b64_encode(self.auth_user + ':' + self.auth_pass) \
+                        .replace("\012", "")
+            l.append(('Authorization', 'Basic ' + val))
+
+        l.extend(self.user_headers)
+        return l
 
     def RPC(self, url, opname, obj, replytype=None, **kw):
         '''Send a request, return the reply.  See Send() and Recieve()
@@ -194,10 +254,45 @@ class _Binding:
             endPointReference --  set by calling party, must be an 
                 EndPointReference type instance.
             requesttypecode -- 
+            idempotent -- the operation is safe to repeat, so it is sent
+                again on a new connection if the server has closed the 
+                pooled one.
+            mtom -- overrides the mtom of the binding for this request.
 
         '''
         url = url or self.url
+        sw, self.address = self.SerializeRequest(url, opname, obj, nsdict,
+            soapaction, wsaction, endPointReference, **kw)
+
+        scheme,netloc,path,nil,nil,nil = urllib.parse.urlparse(url)
+        transport = self.transport
+        if transport is None and url is not None:
+            if scheme == 'https':
+                transport = self.defaultHttpsTransport
+            elif scheme == 'http':
+                transport = self.defaultHttpTransport
+            else:
+                raise RuntimeError('must specify transport or url startswith https/http')
+
+        # Send the request.
+        if issubclass(transport, http.client.HTTPConnection) is False:
+            raise TypeError('transport must be a HTTPConnection')
+
+        soapdata = Package(sw)
+        self.GetConnection(transport, netloc)
+        self._request = (soapdata, url, soapaction, kw)
+        try:
+            self.SendSOAPData(soapdata, url, soapaction, **kw)
+        except (socket.error, http.client.HTTPException):
+            if not self.RetryRequest(): raise
+
+    def SerializeRequest(self, url, opname, obj, nsdict={}, soapaction=None,
+                         wsaction=None, endPointReference=None, **kw):
+        '''Serialize a request as Send does, returns (SoapWriter, Address),
+        the Address is None unless WS-Address is used.
+        '''
         endPointReference = endPointReference or self.endPointReference
+        address = None
 
         # Serialize the object.
         d = {}
@@ -205,7 +300,8 @@ class _Binding:
         d.update(nsdict)
 
         sw = SoapWriter(nsdict=d, header=True, outputclass=self.writerclass, 
-                 encodingStyle=kw.get('encodingStyle'),)
+                 encodingStyle=kw.get('encodingStyle'),
+                 mtom=kw.get('mtom', self.mtom))
         
         requesttypecode = kw.get('requesttypecode')
         if '_args' in kw: #NamedParamBinding
@@ -239,33 +335,66 @@ class _Binding:
                 raise WSActionException('soapAction(%s) and WS-Action(%s) must match'\
                     %(self.soapaction,wsaction))
 
-            self.address = Address(url, self.wsAddressURI)
-            self.address.setRequest(endPointReference, wsaction)
-            self.address.serialize(sw)
+            address = Address(url, self.wsAddressURI)
+            address.setRequest(endPointReference, wsaction)
+            address.serialize(sw)
 
         # 
         # WS-Security Signature Handler
         if self.sig_handler is not None:
             self.sig_handler.sign(sw)
 
-        scheme,netloc,path,nil,nil,nil = urllib.parse.urlparse(url)
-        transport = self.transport
-        if transport is None and url is not None:
-            if scheme == 'https':
-                transport = self.defaultHttpsTransport
-            elif scheme == 'http':
-                transport = self.defaultHttpTransport
-            else:
-                raise RuntimeError('must specify transport or url startswith https/http')
+        return sw, address
 
-        # Send the request.
-        if issubclass(transport, http.client.HTTPConnection) is False:
-            raise TypeError('transport must be a HTTPConnection')
+    def GetConnection(self, transport, netloc):
+        '''Set self.h to a connection to netloc, taken from the pool if 
+        there is one.  A previous connection whose reply was not read is 
+        closed.
+        '''
+        self.CloseConnection()
+        self._transport = (transport, netloc)
+        if self.pool is None:
+            self.h = transport(netloc, None, **self.transdict)
+            self.h.connect()
+            self._poolkey, self._reused = None, False
+        else:
+            self._poolkey, self.h, self._reused = \
+                self.pool.get(transport, netloc, self.transdict)
+
+    def ReleaseConnection(self, response):
+        '''The reply has been read, hand the connection back to the pool
+        unless the server is closing it.
+        '''
+        h, self.h = self.h, None
+        if h is None: return
+        if self._poolkey is None or response.will_close:
+            h.close()
+        else:
+            self.pool.put(self._poolkey, h)
+
+    def CloseConnection(self):
+        '''Close the current connection, it can not be reused.
+        '''
+        h, self.h = self.h, None
+        if h is not None: h.close()
 
-        soapdata = str(sw)
+    def RetryRequest(self):
+        '''A request sent on a pooled connection failed before a reply 
+        arrived: resend it once on a new connection if the connection was
+        reused and the operation is idempotent.  Returns True if resent.
+        '''
+        soapdata, url, soapaction, kw = self._request
+        if not self._reused or not kw.get('idempotent', self.idempotent):
+            self.CloseConnection()
+            return False
+        self.logger.debug('pooled connection closed by server, resend')
+        transport, netloc = self._transport
+        self.CloseConnection()
         self.h = transport(netloc, None, **self.transdict)
         self.h.connect()
+        self._reused = False
         self.SendSOAPData(soapdata, url, soapaction, **kw)
+        return True
 
     def SendSOAPData(self, soapdata, url, soapaction, headers={}, **kw):
         # Tracing?
@@ -273,33 +402,37 @@ class _Binding:
             print("_" * 33, time.ctime(time.time()), "REQUEST:", file=self.trace)
             print(soapdata, file=self.trace)
 
+        body, contenttype = soapdata, getattr(soapdata, 'content_type', None)
+        if contenttype is None:
+            if type(body) is str: body = body.encode('utf-8')
+            if self.compression and len(body) >= self.compressthreshold:
+                body = compress.Compress(body, self.compression,
+                    self.compresslevel)
+                headers = dict(headers)
+                headers['Content-Encoding'] = self.compression
+
         #scheme,netloc,path,nil,nil,nil = urlparse.urlparse(url)
         path = _get_postvalue_from_absoluteURI(url)
-        self.h.putrequest("POST", path)
-        self.h.putheader("Content-length", "%d" % len(soapdata))
-        self.h.putheader("Content-type", 'text/xml; charset=utf-8')
-        self.__addcookies()
-
-        for header,value in list(headers.items()):
+        self.h.putrequest("POST", path,
+            skip_accept_encoding=bool(self.acceptencoding))
+        self.h.putheader("Content-length", "%d" % len(body))
+        for header,value in self.RequestHeaders(soapaction, headers,
+        contenttype):
             self.h.putheader(header, value)
 
-        SOAPActionValue = '"%s"' % (soapaction or self.soapaction)
-        self.h.putheader("SOAPAction", SOAPActionValue)
-        if self.auth_style & AUTH.httpbasic:
-            val = _b64_encode(self.auth_user + ':' + self.auth_pass) \
-                        .replace("\012", "")
-            self.h.putheader('Authorization', 'Basic ' + val)
-        elif self.auth_style == AUTH.httpdigest and 'Authorization' not in headers \
+        if self.auth_style == AUTH.httpdigest and 'Authorization' not in headers \
             and 'Expect' not in headers:
             def digest_auth_cb(response):
                 self.SendSOAPDataHTTPDigestAuth(response, soapdata, url, soapaction, **kw)
                 self.http_callbacks[401] = None
             self.http_callbacks[401] = digest_auth_cb
 
-        for header,value in self.user_headers:
-            self.h.putheader(header, value)
         self.h.endheaders()
-        self.h.send(soapdata)
+        if contenttype is not None:
+            # mtom.XOPMessage, sent a part at a time
+            for data in body: self.h.send(data)
+        else:
+            self.h.send(body)
 
         # Clear prior receive state.
         self.data, self.ps = None, None
@@ -314,6 +447,14 @@ class _Binding:
         url = url or self.url
         if response.status != 401:
             raise RuntimeError('Expecting HTTP 401 response.')
+        headers = self.DigestAuthHeaders(
+            response.getheader('www-authenticate'), url)
+        self.SendSOAPData(soapdata, url, soapaction, headers, **kw)
+
+    def DigestAuthHeaders(self, challenge, url):
+        '''Return the headers of a request answering the WWW-Authenticate
+        challenge of a 401 reply with http digest authorization.
+        '''
         if self.auth_style != AUTH.httpdigest:
             raise RuntimeError('Auth style(%d) does not support requested digest authorization.' %self.auth_style)
 
@@ -322,19 +463,17 @@ class _Binding:
             build_authorization_arg,\
             dict_fetch
 
-        chaldict = fetch_challenge( response.getheader('www-authenticate') )
+        chaldict = fetch_challenge(challenge)
         if dict_fetch(chaldict,'challenge','').lower() == 'digest' and \
             dict_fetch(chaldict,'nonce',None) and \
             dict_fetch(chaldict,'realm',None) and \
             dict_fetch(chaldict,'qop',None):
             authdict = generate_response(chaldict,
                 url, self.auth_user, self.auth_pass, method='POST')
-            headers = {\
+            return {\
                 'Authorization':build_authorization_arg(authdict),
                 'Expect':'100-continue',
             }
-            self.SendSOAPData(soapdata, url, soapaction, headers, **kw)
-            return
 
         raise RuntimeError('Client expecting digest authorization challenge.')
 
@@ -342,18 +481,43 @@ class _Binding:
         '''Read a server reply, unconverted to any format and return it.
         '''
         if self.data: return self.data
+        response = self.ReceiveResponse()
+        self.data = self.ResponseReader(response).read()
+        self.ReleaseConnection(response)
+        if self.trace:
+            print(self.data, file=self.trace)
+        return self.data
+
+    def ResponseReader(self, response):
+        '''Return a file-like object reading the body of response, which
+        decompresses it if it has a Content-Encoding.
+        '''
+        encoding = response.getheader('content-encoding', 'identity')
+        if encoding.strip().lower() == 'identity':
+            return response
+        return compress.DecompressReader(response, encoding,
+            self.decompresslimit)
+
+    def ReceiveResponse(self):
+        '''Read the status line and headers of a server reply, the body
+        of the returned response is left unread.
+        '''
         trace = self.trace
         while 1:
-            response = self.h.getresponse()
-            self.reply_code, self.reply_msg, self.reply_headers, self.data = \
-                response.status, response.reason, response.msg, response.read()
+            try:
+                response = self.h.getresponse()
+            except (socket.error, http.client.HTTPException):
+                if not self.RetryRequest(): raise
+                continue
+            self._reused = False
+            self.reply_code, self.reply_msg, self.reply_headers = \
+                response.status, response.reason, response.msg
             if trace:
                 print("_" * 33, time.ctime(time.time()), "RESPONSE:", file=trace)
                 for i in (self.reply_code, self.reply_msg,):
                     print(str(i), file=trace)
                 print("-------", file=trace)
                 print(str(self.reply_headers), file=trace)
-                print(self.data, file=trace)
             saved = None
             for d in response.msg.getallmatchingheaders('set-cookie'):
                 if d[0] in [ ' ', '\t' ]:
@@ -363,35 +527,74 @@ class _Binding:
                     saved = d.strip()
             if saved: self.cookies.load(saved)
             if response.status == 401:
+                self.data = response.read()
+                if trace: print(self.data, file=trace)
                 if not isinstance(self.http_callbacks.get(response.status,None), collections.Callable):
                     raise RuntimeError('HTTP Digest Authorization Failed')
                 self.http_callbacks[response.status](response)
                 continue
-            if response.status != 100: break
+            if response.status != 100: return response
 
             # The httplib doesn't understand the HTTP continuation header.
             # Horrible internals hack to patch things up.
+            response.read()
             self.h._HTTPConnection__state = http.client._CS_REQ_SENT
             self.h._HTTPConnection__response = None
-        return self.data
 
     def IsSOAP(self):
         if self.ps: return 1
         self.ReceiveRaw()
-        mimetype = self.reply_headers.type
-        return mimetype == 'text/xml'
+        mimetype = self.reply_headers.get_content_type()
+        return mimetype == 'text/xml' or mimetype == 'multipart/related'
 
-    def ReceiveSOAP(self, readerclass=None, **kw):
+    def ReceiveSOAP(self, readerclass=None, streaming=False, **kw):
         '''Get back a SOAP message.
+        Keyword arguments:
+            streaming -- parse the reply as it is read from the connection
+                instead of building a DOM (see ParsedSoap); ignored when
+                tracing or verifying signatures, which need the whole reply.
+                The connection goes back to the pool when Parse has read
+                the reply to its end.
         '''
         if self.ps: return self.ps
+        if streaming and not self.data and not self.trace \
+        and self.sig_handler is None:
+            response = self.ReceiveResponse()
+            reader = self.ResponseReader(response)
+            if self.reply_headers.get_content_type() == 'text/xml':
+                # the connection is pooled once the parser has read the body
+                h = self.h
+                def onclose():
+                    if self.h is h: self.ReleaseConnection(response)
+                self.ps = ParsedSoap(reader, streaming=True, onclose=onclose,
+                                encodingStyle=kw.get('encodingStyle'))
+                return self.ps
+            if self.reply_headers.get_content_type() == 'multipart/related':
+                # large attachments are spooled, see MIMEResolver
+                cid = resolvers.MIMEResolver(self.reply_headers['content-type'],
+                    reader)
+                cid.ReadParts()
+                self.ReleaseConnection(response)
+                self.ps = ParsedSoap(cid.GetSOAPPart(), resolver=cid.Resolve,
+                                encodingStyle=kw.get('encodingStyle'))
+                return self.ps
+            self.data = reader.read()
+            self.ReleaseConnection(response)
+            if not self.data:
+                raise TypeError('Received empty response')
+
         if not self.IsSOAP():
-            raise TypeError(
-                'Response is "%s", not "text/xml"' % self.reply_headers.type)
+            raise TypeError('Response is "%s", not "text/xml"' \
+                % self.reply_headers.get_content_type())
         if len(self.data) == 0:
             raise TypeError('Received empty response')
 
-        self.ps = ParsedSoap(self.data, 
+        data, resolver = self.data, None
+        if self.reply_headers.get_content_type() == 'multipart/related':
+            cid = resolvers.MIMEResolver(self.reply_headers['content-type'],
+                BytesIO(self.data))
+            data, resolver = cid.GetSOAPPart(), cid.Resolve
+        self.ps = ParsedSoap(data, resolver=resolver,
                         readerclass=readerclass or self.readerclass, 
                         encodingStyle=kw.get('encodingStyle'))
 
@@ -424,17 +627,27 @@ class _Binding:
                 receive.
         '''
         self.ReceiveSOAP(**kw)
-        if self.ps.IsAFault():
-            msg = FaultFromFaultMessage(self.ps)
+        return self.ParseReply(self.ps, replytype, self.address, **kw)
+
+    def ParseReply(self, ps, replytype, address=None, **kw):
+        '''Create the Python object of a reply parsed into ps, raise 
+        FaultException if it is a fault.
+        Parameters:
+            ps -- ParsedSoap of the reply
+            replytype -- typecode, or class with a typecode
+            address -- Address of the request, if using WS-Address
+        '''
+        if ps.IsAFault():
+            msg = FaultFromFaultMessage(ps)
             raise FaultException(msg)
 
         tc = replytype
         if hasattr(replytype, 'typecode'):
             tc = replytype.typecode
 
-        reply = self.ps.Parse(tc)
-        if self.address is not None:
-            self.address.checkResponse(self.ps, kw.get('wsaction'))
+        reply = ps.Parse(tc)
+        if address is not None:
+            address.checkResponse(ps, kw.get('wsaction'))
         return reply
 
     def __repr__(self):
@@ -465,7 +678,7 @@ class Binding(_Binding):
             return getattr(self.__class__, name)
         return _Caller(self, name)
 
-    def __parse_child(self, node):
+    def __parse_child(self, node, ps):
         '''for rpc-style map each message part to a class in typesmodule
         '''
         try:
@@ -474,16 +687,16 @@ class Binding(_Binding):
             self.logger.debug('didnt find typecode for "%s" in typesmodule: %s', 
                 node.localName, self.typesmodule)
             tc = TC.Any(aslist=1)
-            return tc.parse(node, self.ps)
+            return tc.parse(node, ps)
 
         self.logger.debug('parse child with typecode : %s', tc)
         try:
-            return tc.parse(node, self.ps)
+            return tc.parse(node, ps)
         except Exception:
             self.logger.debug('parse failed try Any : %s', tc)
 
         tc = TC.Any(aslist=1)
-        return tc.parse(node, self.ps)
+        return tc.parse(node, ps)
 
     def Receive(self, replytype, **kw):
         '''Parse message, create Python object.
@@ -493,12 +706,20 @@ class Binding(_Binding):
             wsaction -- If using WS-Address, must specify Action value we expect to
                 receive.
         ''' 
+        if self.typesmodule is not None:
+            # the reply wrapper is walked as a DOM
+            kw['streaming'] = False
         self.ReceiveSOAP(**kw)
-        ps = self.ps
+        return self.ParseReply(self.ps, replytype, self.address, **kw)
+
+    def ParseReply(self, ps, replytype, address=None, **kw):
+        '''Create the Python object of a reply parsed into ps, with a
+        typesmodule the parts of an rpc-style reply are parsed into a dict.
+        '''
         tp = _find_type(ps.body_root)
         isarray = ((type(tp) in (tuple,list) and tp[1] == 'Array') or _find_arraytype(ps.body_root))
         if self.typesmodule is None or isarray:
-            return _Binding.Receive(self, replytype, **kw)
+            return _Binding.ParseReply(self, ps, replytype, address, **kw)
 
         if ps.IsAFault():
             msg = FaultFromFaultMessage(ps)
@@ -512,10 +733,10 @@ class Binding(_Binding):
         reply = {}
         for elt in _child_elements(ps.body_root):
             name = str(elt.localName)
-            reply[name] = self.__parse_child(elt)
+            reply[name] = self.__parse_child(elt, ps)
 
-        if self.address is not None:
-            self.address.checkResponse(ps, kw.get('wsaction'))
+        if address is not None:
+            address.checkResponse(ps, kw.get('wsaction'))
 
         return reply
         
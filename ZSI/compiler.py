@@ -0,0 +1,260 @@
+#! /usr/bin/env python
+# $Header$
+'''Compiled typecodes.
+
+A ComplexType parses and serializes its children by interpreting its
+fields for every element.  A ComplexType with compiled set instead has
+Python functions generated from its fields on first use: a chain of
+name tests over the children, and character data converted directly
+for simple fields of elements without attributes.  The typecodes stay
+the source of truth, anything else (href, xsi:type, nil, attributes,
+substitutes) is handed to them as before, and types the compiler does
+not support (<any>, inorder, repeated names) are not compiled.
+
+Types modules generated by wsdl2py --compile call CompileModule.
+'''
+
+from . import _copyright, _seqtypes, _Node, EvaluateException
+from .TC import SimpleType, UNBOUNDED
+from .TCcompound import ComplexType, _get_type_or_substitute
+from .wstools.Namespaces import SOAP
+from .wstools.logging import getLogger as _GetLogger
+
+_NOTSET = object()
+_PLAIN = (str, int, float, bool)
+_TEXT_NODES = (_Node.TEXT_NODE, _Node.CDATA_SECTION_NODE)
+
+
+def _dom_text(ps, elt):
+    '''Return the character data of elt, '' if it is empty, None if it
+    has other children.
+    '''
+    nodes = elt.childNodes
+    if not nodes: return ''
+    texts = []
+    for node in nodes:
+        if node.nodeType not in _TEXT_NODES: return None
+        texts.append(node.nodeValue)
+    return ''.join(texts) or None
+
+def _stream_text(ps, elt):
+    return ps.stream.text(elt)
+
+def _missing(what, elt, ps):
+    raise EvaluateException('Element "' + what.aname + \
+        '" missing from complexType', ps.Backtrace(elt))
+
+def _duplicate(what, elt, ps):
+    raise EvaluateException('Element "' + what.aname + \
+        '" occurs more than once in complexType', ps.Backtrace(elt))
+
+def _none(what, elem, elt, sw):
+    raise EvaluateException('Got None for nillable(%s), minOccurs(%d) element (%s,%s), %s' %
+        (what.nillable, what.minOccurs, what.nspname, what.pname, elem),
+        sw.Backtrace(elt))
+
+def _occurs(typecode, what, v, elt, sw):
+    '''Check the values v of a repeated field.
+    '''
+    if type(v) not in _seqtypes:
+        raise EvaluateException('pyobj (%s,%s), aname "%s": maxOccurs %s, expecting a %s' %(
+            typecode.nspname, typecode.pname, what.aname, what.maxOccurs,
+            _seqtypes), sw.Backtrace(elt))
+    occurs = len(v)
+    if what.maxOccurs != UNBOUNDED and occurs > what.maxOccurs:
+        raise EvaluateException('occurances (%d) exceeded maxOccurs(%d) for <%s>' %(
+            what.maxOccurs + 1, what.maxOccurs, what.pname), sw.Backtrace(elt))
+    if occurs < what.minOccurs:
+        raise EvaluateException('occurances(%d) less than minOccurs(%d) for <%s>' %(
+            occurs, what.minOccurs, what.pname), sw.Backtrace(elt))
+
+
+def _parses_text(what):
+    '''Does parse_text stand in for the parse method of what?
+    '''
+    if not isinstance(what, SimpleType) or what.nspname == SOAP.ENC:
+        return False
+    for cls in what.__class__.__mro__:
+        if 'parse' in cls.__dict__:
+            return 'parse_text' in cls.__dict__
+    return False
+
+def _serializes_text(what):
+    '''Can plain values of what be written without its serialize method?
+    '''
+    return isinstance(what, SimpleType) and what.unique is True and \
+        what.__class__.serialize is SimpleType.serialize and \
+        not [ t for t in _PLAIN if hasattr(t, what.attrs_aname) ]
+
+
+class _Source:
+    '''Generate the functions of a CompiledType.
+    '''
+    def __init__(self, typecode, ofwhat, multiple):
+        self.typecode = typecode
+        self.ofwhat = ofwhat
+        self.multiple = multiple
+        self.lines = []
+
+    def __str__(self):
+        for name, text in [ ('parse', '_dom_text'),
+                            ('parse_stream', '_stream_text') ]:
+            self.parse(name, text)
+        self.serialize()
+        return '\n'.join(self.lines) + '\n'
+
+    def add(self, indent, *lines):
+        self.lines.extend([ '    '*indent + l for l in lines ])
+
+    def parse(self, parse, text):
+        self.add(0, 'def %s(self, elt, ps, v, children):' %parse)
+        for i,what in enumerate(self.ofwhat):
+            self.add(1, 'f%d = %s' %(i, self.multiple[i] and 'None' or '_NOTSET'))
+
+        self.add(1, 'for c in children:', '    name = c.localName')
+        for i,what in enumerate(self.ofwhat):
+            test = 'name == %r' %what.pname
+            if what.nspname is not None:
+                test += ' and c.namespaceURI == %r' %what.nspname
+            self.add(2, '%s %s:' %(i and 'elif' or 'if', test))
+            if not self.multiple[i]:
+                self.add(3, 'if f%d is not _NOTSET: _duplicate(T%d, c, ps)' %(i,i))
+            if _parses_text(what):
+                test = 'c.hasAttributes()'
+                if what.nspname is None:
+                    test += ' or c.namespaceURI == _ENC'
+                self.add(3, 'if %s: x = T%d.%s(c, ps)' %(test, i, parse),
+                    'else:',
+                    '    t = %s(ps, c)' %text,
+                    '    if t is None: x = T%d.parse(c, ps)' %i,
+                    '    else: x = T%d.parse_text(t or None, c, ps)' %i)
+            else:
+                self.add(3, 'x = T%d.%s(c, ps)' %(i, parse))
+            if self.multiple[i]:
+                self.add(3, 'if f%d is None: f%d = [x]' %(i,i),
+                    'else: f%d.append(x)' %i)
+            else:
+                self.add(3, 'f%d = x' %i)
+
+        for i,what in enumerate(self.ofwhat):
+            aname = what.aname
+            if self.multiple[i]:
+                self.add(1, 'if f%d is not None: v[%r] = f%d' %(i, aname, i))
+                if hasattr(what, 'default'):
+                    self.add(1, 'v[%r] = T%d.default' %(aname, i))
+                elif what.minOccurs > 0:
+                    self.add(1, 'if %r not in v: _missing(T%d, elt, ps)' %(aname, i))
+                continue
+
+            self.add(1, 'if f%d is not _NOTSET: v[%r] = f%d' %(i, aname, i))
+            if hasattr(what, 'default'):
+                self.add(1, 'else: v[%r] = T%d.default' %(aname, i))
+            elif what.minOccurs > 0:
+                self.add(1, 'elif %r not in v: _missing(T%d, elt, ps)' %(aname, i))
+        self.add(1, 'return self._get_pyobj(v)')
+        self.add(0, '')
+
+    def serialize(self):
+        self.add(0, 'def serialize(self, elt, elem, sw, pyobj, kw):')
+        pyclass = self.typecode.pyclass
+        if pyclass and type(pyclass) is type:
+            get = 'getattr(pyobj, %r, None)'
+        elif pyclass:
+            self.add(1, 'd = pyobj.__dict__')
+            get = 'd.get(%r)'
+        else:
+            get = 'pyobj.get(%r)'
+
+        for i,what in enumerate(self.ofwhat):
+            self.add(1, 'v = ' + get %what.aname, 'if v is None:')
+            if what.minOccurs == 0:
+                self.add(2, 'pass')
+            elif what.nillable is True:
+                self.add(2, 'T%d.serialize(elem, sw, v, **kw)' %i)
+            else:
+                self.add(2, '_none(T%d, elem, elt, sw)' %i)
+            self.add(1, 'else:')
+            if self.multiple[i]:
+                self.add(2, '_occurs(self, T%d, v, elt, sw)' %i, 'for x in v:')
+                self.serialize_value(3, i, what, 'x')
+            else:
+                self.serialize_value(2, i, what, 'v')
+        self.add(0, '')
+
+    def serialize_value(self, indent, i, what, v):
+        if _serializes_text(what):
+            self.add(indent, 'if type(%s) in _PLAIN:' %v,
+                '    el = elem.createAppendElement(%r, %r)' %(what.nspname, what.pname),
+                '    if kw.get("typed", T%d.typed) is True: T%d.set_attribute_xsi_type(el, **kw)' %(i,i),
+                '    T%d.serialize_text_node(el, sw, %s)' %(i, v),
+                'else:')
+            indent += 1
+        self.add(indent, '_sub(T%d, %s, sw, elt).serialize(elem, sw, %s, **kw)' %(i, v, v))
+
+
+class CompiledType:
+    '''Functions generated for the fields of a ComplexType, each is
+    called with the typecode as first argument.
+
+    Instance data:
+        source -- the generated Python source.
+        parse -- parse(typecode, elt, ps, v, children), parse the
+            children of elt into the dictionary v and return the pyobj.
+        parse_stream -- same, for children in the event stream of ps.
+        serialize -- serialize(typecode, elt, elem, sw, pyobj, kw),
+            serialize the fields of pyobj into elem.
+    '''
+    logger = _GetLogger('ZSI.compiler.CompiledType')
+
+    def __init__(self, typecode, ofwhat, multiple):
+        self.source = str(_Source(typecode, ofwhat, multiple))
+        self.logger.debug('compiled (%s,%s):\n%s', typecode.nspname,
+                          typecode.pname, self.source)
+        namespace = dict(_NOTSET=_NOTSET, _PLAIN=_PLAIN, _ENC=SOAP.ENC,
+            _dom_text=_dom_text, _stream_text=_stream_text,
+            _missing=_missing, _duplicate=_duplicate, _none=_none,
+            _occurs=_occurs, _sub=_get_type_or_substitute)
+        for i,what in enumerate(ofwhat):
+            namespace['T%d' %i] = what
+        name = '<compiled %s>' %(typecode.pname or typecode.__class__.__name__)
+        exec(compile(self.source, name, 'exec'), namespace)
+        self.parse = namespace['parse']
+        self.parse_stream = namespace['parse_stream']
+        self.serialize = namespace['serialize']
+
+
+def Compile(typecode):
+    '''Return a CompiledType for the fields of a ComplexType, or None
+    if they are not supported.
+    '''
+    ofwhat, index, multiple, any = typecode._get_dispatch()
+    if any is not None or typecode.inorder is True:
+        return None
+    pnames = [ what.pname for what in ofwhat ]
+    anames = [ what.aname for what in ofwhat ]
+    if None in pnames or len(set(pnames)) < len(pnames) or \
+    len(set(anames)) < len(anames):
+        return None
+    return CompiledType(typecode, ofwhat, multiple)
+
+
+def CompileModule(namespace):
+    '''Set compiled on the ComplexType classes defined in a module, and
+    the classes nested in them.  Types modules generated by wsdl2py
+    --compile call this.
+        namespace -- globals() of the module
+    '''
+    module = namespace.get('__name__')
+    todo, seen = list(namespace.values()), set()
+    while todo:
+        cls = todo.pop()
+        if not isinstance(cls, type) or cls in seen or \
+        cls.__module__ != module:
+            continue
+        seen.add(cls)
+        if issubclass(cls, ComplexType):
+            cls.compiled = True
+        todo.extend(list(vars(cls).values()))
+
+
+if __name__ == '__main__': print(_copyright)
@@ -0,0 +1,228 @@
+#! /usr/bin/env python
+# $Header$
+'''gzip and deflate Content-Encoding of HTTP message bodies.
+
+The client bindings and the request handlers use these to compress
+what they send (when the peer accepts it) and to decompress what they
+receive.  Decompression is incremental, a DecompressReader is read by
+the parser like the connection itself.  The work done is counted in
+stats, see CompressionStats.
+'''
+
+from . import _copyright
+import threading, time, zlib
+
+ENCODINGS = ('gzip', 'deflate')
+ACCEPT_ENCODING = 'gzip, deflate'
+# most bytes a received body is decompressed to by default
+DECOMPRESS_LIMIT = 64 * 1024 * 1024
+
+_wbits = { 'gzip': 16 + zlib.MAX_WBITS, 'x-gzip': 16 + zlib.MAX_WBITS,
+           'deflate': zlib.MAX_WBITS }
+
+
+class DecompressLimitError(ValueError):
+    '''Decompressed content is larger than the limit it was read with.
+    '''
+
+
+class CompressionStats:
+    '''Counters of the compression done in this process.
+        Instance data:
+            compressed -- bodies compressed
+            compress_in, compress_out -- bytes before and after
+            compress_time -- CPU seconds spent compressing
+            decompressed -- bodies decompressed
+            decompress_in, decompress_out -- bytes before and after
+            decompress_time -- CPU seconds spent decompressing
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.compressed = self.compress_in = self.compress_out = 0
+        self.decompressed = self.decompress_in = self.decompress_out = 0
+        self.compress_time = self.decompress_time = 0.0
+
+    def add(self, kind, size_in, size_out, seconds, count=0):
+        '''Count size_in bytes made size_out by seconds of work, kind is
+        "compress" or "decompress"; count is the number of bodies
+        finished.
+        '''
+        self._lock.acquire()
+        try:
+            d = self.__dict__
+            d[kind + 'ed'] += count
+            d[kind + '_in'] += size_in
+            d[kind + '_out'] += size_out
+            d[kind + '_time'] += seconds
+        finally:
+            self._lock.release()
+
+    def compress_ratio(self):
+        '''Uncompressed to compressed size of what was compressed.
+        '''
+        return self.compress_in / float(self.compress_out or 1)
+
+    def decompress_ratio(self):
+        '''Uncompressed to compressed size of what was decompressed.
+        '''
+        return self.decompress_out / float(self.decompress_in or 1)
+
+stats = CompressionStats()
+
+
+def _check(encoding):
+    encoding = (encoding or '').strip().lower()
+    if encoding not in _wbits:
+        raise ValueError('Unsupported content encoding "%s"' %encoding)
+    return encoding
+
+
+def Negotiate(accept_encoding):
+    '''Return the encoding to use for a peer that sent the Accept-Encoding
+    header accept_encoding, gzip or deflate, None for no compression.
+    '''
+    best, bestq = None, 0.0
+    for item in (accept_encoding or '').split(','):
+        params = item.split(';')
+        name, q = params[0].strip().lower(), 1.0
+        for p in params[1:]:
+            k, sep, v = p.partition('=')
+            if k.strip().lower() == 'q':
+                try: q = float(v)
+                except ValueError: q = 0.0
+        if name == '*':
+            name = best or ENCODINGS[0]
+        if name in ENCODINGS and (q > bestq or q == bestq and \
+        best is not None and ENCODINGS.index(name) < ENCODINGS.index(best)):
+            best, bestq = name, q
+    return best
+
+
+def Compress(data, encoding, level=6):
+    '''Return the bytes data compressed with encoding.
+    '''
+    t = time.thread_time()
+    c = zlib.compressobj(level, zlib.DEFLATED, _wbits[_check(encoding)])
+    out = c.compress(data) + c.flush()
+    stats.add('compress', len(data), len(out), time.thread_time() - t, 1)
+    return out
+
+
+def Decompress(data, encoding, limit=None):
+    '''Return the bytes data decompressed, encoding is gzip or deflate.
+    Raises DecompressLimitError if that is more than limit bytes.
+    '''
+    return DecompressReader(_Bytes(data), encoding, limit).read()
+
+
+class _Bytes:
+    def __init__(self, data):
+        self.data = data
+    def read(self, size=-1):
+        data, self.data = self.data, b''
+        return data
+
+
+class CompressWriter:
+    '''File-like object compressing what is written to it into stream,
+    close writes the end of the compressed data (stream is not closed).
+    '''
+
+    def __init__(self, stream, encoding, level=6):
+        self.stream = stream
+        self._c = zlib.compressobj(level, zlib.DEFLATED,
+            _wbits[_check(encoding)])
+        self._in = self._out = 0
+        self._time = 0.0
+
+    def write(self, data):
+        if type(data) is str: data = data.encode('utf-8')
+        t = time.thread_time()
+        out = self._c.compress(data)
+        self._time += time.thread_time() - t
+        self._in += len(data)
+        if out:
+            self._out += len(out)
+            self.stream.write(out)
+
+    def close(self):
+        t = time.thread_time()
+        out = self._c.flush()
+        self._time += time.thread_time() - t
+        self._out += len(out)
+        self.stream.write(out)
+        stats.add('compress', self._in, self._out, self._time, 1)
+
+
+class DecompressReader:
+    '''File-like object reading the decompressed content of f, made
+    bufsize bytes at a time.  deflate is taken with or without the zlib
+    header, as some peers send it raw.  Reading more than limit bytes
+    (None for no limit) raises DecompressLimitError.
+    '''
+    bufsize = 64 * 1024
+
+    def __init__(self, f, encoding, limit=None):
+        self._read = getattr(f, 'read1', f.read)
+        self._wbits = _wbits[_check(encoding)]
+        self._d = zlib.decompressobj(self._wbits)
+        self._buf, self._eof, self._first = b'', False, True
+        self._limit, self._size = limit, 0
+
+    def _more(self):
+        '''Return the next decompressed data, b'' at the end.
+        '''
+        d = self._d
+        data = d.unconsumed_tail
+        if not data:
+            data = self._read(self.bufsize)
+            if not data:
+                self._eof = True
+                if not d.eof:
+                    raise ValueError('Truncated compressed content')
+                return b''
+            if d.eof:
+                # read f to its end, a connection is reused after that
+                return b''
+            stats.add('decompress', len(data), 0, 0.0)
+        t = time.thread_time()
+        try:
+            out = d.decompress(data, self.bufsize)
+        except zlib.error:
+            if not (self._first and self._wbits == zlib.MAX_WBITS): raise
+            d = self._d = zlib.decompressobj(-zlib.MAX_WBITS)
+            out = d.decompress(data, self.bufsize)
+        self._first = False
+        stats.add('decompress', 0, len(out), time.thread_time() - t,
+            int(d.eof and not d.unconsumed_tail))
+        self._size += len(out)
+        if self._limit is not None and self._size > self._limit:
+            self._eof = True
+            raise DecompressLimitError(
+                'Decompressed content larger than %d bytes' %self._limit)
+        return out
+
+    def read1(self, size=-1):
+        '''Return up to size bytes, b'' only at the end.
+        '''
+        while not self._buf and not self._eof:
+            self._buf = self._more()
+        if size is None or size < 0: size = len(self._buf)
+        data, self._buf = self._buf[:size], self._buf[size:]
+        return data
+
+    def read(self, size=-1):
+        chunks, n = [], 0
+        while size is None or size < 0 or n < size:
+            data = self.read1(-1 if size is None or size < 0 else size - n)
+            if not data: break
+            chunks.append(data)
+            n += len(data)
+        return b''.join(chunks)
+
+
+if __name__ == '__main__': print(_copyright)
@@ -3,26 +3,32 @@
 '''Simple CGI dispatching.
 '''
 
-import types, os, sys
+import types, os, sys, threading
+from io import BytesIO
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from .ZSI import *
 from .ZSI import _child_elements, _copyright, _seqtypes, _find_arraytype, _find_type, resolvers 
 from .ZSI.auth import _auth_tc, AUTH, ClientBinding
+from .ZSI.workers import ThreadPoolMixIn, ServeForever
+from .ZSI.mtom import IsXOP, Package
+from .ZSI.compress import Negotiate, Compress, CompressWriter, Decompress, \
+    DecompressLimitError, DECOMPRESS_LIMIT
 import collections
 
 
-# Client binding information is stored in a global. We provide an accessor
-# in case later on it's not.
-_client_binding = None
+# Client binding information is stored per thread, requests may be
+# handled by a pool of threads.
+_client_binding = threading.local()
 
 def GetClientBinding():
-    '''Return the client binding object.
+    '''Return the client binding object of the request the calling
+    thread is processing.
     '''
-    return _client_binding
+    return getattr(_client_binding, 'binding', None)
 
 gettypecode = lambda mod,e: getattr(mod, str(e.localName)).typecode
 def _Dispatch(ps, modules, SendResponse, SendFault, nsdict={}, typesmodule=None, 
-              gettypecode=gettypecode, rpc=False, docstyle=False, **kw):
+              gettypecode=gettypecode, rpc=False, docstyle=False, mtom=None, **kw):
     '''Find a handler for the SOAP request in ps; search modules.
     Call SendResponse or SendFault to send the reply back, appropriately.
 
@@ -40,8 +46,10 @@ def _Dispatch(ps, modules, SendResponse, SendFault, nsdict={}, typesmodule=None,
            or a list try to serialize it as a Struct but if this is not possible put it in an Array.
            Parsing done via a typecode from typesmodule, or Any.
 
+        mtom -- reply with MTOM/XOP, binary values of at least this many bytes
+           are attachments (see SoapWriter).
+
     '''
-    global _client_binding
     try:
         what = str(ps.body_root.localName)
 
@@ -61,7 +69,7 @@ def _Dispatch(ps, modules, SendResponse, SendFault, nsdict={}, typesmodule=None,
             raise TypeError("Multiple implementations found: " + repr(handlers))
         handler = handlers[0]
 
-        _client_binding = ClientBinding(ps)
+        _client_binding.binding = ClientBinding(ps)
         if docstyle:
             result = handler(ps.body_root)
             tc = TC.XML(aslist=1, pname=what+'Response')
@@ -142,9 +150,9 @@ def _Dispatch(ps, modules, SendResponse, SendFault, nsdict={}, typesmodule=None,
             #tc = getattr(result, 'typecode', TC.Any(pname=what+'Response'))
             tc = TC.Any(pname=what+'Response')
 
-        sw = SoapWriter(nsdict=nsdict)
+        sw = SoapWriter(nsdict=nsdict, mtom=mtom)
         sw.serialize(result, tc)
-        return SendResponse(str(sw), **kw)
+        return SendResponse(Package(sw), **kw)
     except Fault as e:
         return SendFault(e, **kw)
     except Exception as e:
@@ -183,19 +191,167 @@ def _CGISendFault(f, **kw):
     _CGISendXML(f.AsSOAP(), 500, **kw)
 
 
+class _ChunkedWriter:
+    '''File-like object writing HTTP/1.1 chunks to wfile.
+    '''
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data):
+        if type(data) is str:
+            data = data.encode('utf-8')
+        if data:
+            self.wfile.write(b'%x\r\n%s\r\n' %(len(data), data))
+
+    def close(self):
+        self.wfile.write(b'0\r\n\r\n')
+
+
 class SOAPRequestHandler(BaseHTTPRequestHandler):
-    '''SOAP handler.
+    '''SOAP handler.  Speaks HTTP/1.1, if the server has a true keep_alive
+    attribute (see workers.ThreadPoolMixIn) connections are kept open for
+    further (or pipelined) requests until the client closes them or they
+    are idle for timeout seconds.  A server handling one connection at a
+    time closes them after each reply.
+
+    Class data:
+        timeout -- seconds a connection may be idle, None for no limit.
+        mtom -- replies to MTOM/XOP requests send binary values of at
+            least this many bytes as attachments, None for no MTOM.
+        compressthreshold -- replies of at least this many bytes are
+            compressed if the client accepts gzip or deflate (replies
+            streamed in chunks are always), None to never compress.
+        compresslevel -- zlib compression level of replies.
+        decompresslimit -- most bytes a request body with a
+            Content-Encoding may decompress to, None for no limit.
+            Larger requests get a 413 reply.
     '''
     server_version = 'ZSI/1.1 ' + BaseHTTPRequestHandler.server_version
+    protocol_version = 'HTTP/1.1'
+    timeout = 60
+    mtom = 0
+    compressthreshold = 1024
+    compresslevel = 6
+    decompresslimit = DECOMPRESS_LIMIT
+
+    def parse_request(self):
+        self.replied = False
+        if not BaseHTTPRequestHandler.parse_request(self):
+            return False
+        if not getattr(self.server, 'keep_alive', False):
+            self.close_connection = True
+        return True
+
+    def read_body(self):
+        '''Read the request body to its end, so the next request on the
+        connection can be parsed.  Returns bytes, decompressed if it has
+        a Content-Encoding; raises DecompressLimitError if that is larger
+        than decompresslimit.
+        '''
+        body = self.read_raw_body()
+        encoding = self.headers.get('content-encoding', 'identity')
+        if encoding.strip().lower() == 'identity':
+            return body
+        return Decompress(body, encoding, self.decompresslimit)
+
+    def read_raw_body(self):
+        '''Read the request body as it was sent.
+        '''
+        te = self.headers.get('transfer-encoding', '')
+        if te.lower() == 'chunked':
+            chunks = []
+            while 1:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            # trailers
+            while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(chunks)
+        length = int(self.headers.get('content-length') or 0)
+        return self.rfile.read(length)
+
+    def body_reader(self):
+        '''Return (file, length) to read the request body from: rfile and
+        the Content-Length, or a chunked or compressed body read whole and
+        its length.
+        '''
+        te = self.headers.get('transfer-encoding', '')
+        ce = self.headers.get('content-encoding', 'identity')
+        if te.lower() == 'chunked' or ce.strip().lower() != 'identity':
+            body = self.read_body()
+            return BytesIO(body), len(body)
+        return self.rfile, int(self.headers.get('content-length') or 0)
+
+    def read_multipart(self, ct):
+        '''Return a MIMEResolver reading the multipart body from the
+        connection, it has read the SOAP part.  If the body can not be
+        parsed the connection is closed after the reply.
+        '''
+        try:
+            f, length = self.body_reader()
+            return resolvers.MIMEResolver(ct, f, length=length)
+        except Exception:
+            self.close_connection = True
+            raise
+
+    def finish_multipart(self, cid):
+        '''Read the attachments the request handler did not use, up to
+        the end of the body.
+        '''
+        try:
+            cid.ReadParts()
+        except Exception:
+            self.close_connection = True
 
     def send_xml(self, text, code=200):
         '''Send some XML.
+        text -- string, bytes, or a SoapWriter which is sent in chunks
+            to HTTP/1.1 clients, or an mtom.XOPMessage sent a part at a 
+            time.
         '''
+        if self.replied:
+            self.log_error('response already sent, dropped a %d', code)
+            return
+        self.replied = True
         self.send_response(code)
-        self.send_header('Content-type', 'text/xml; charset="utf-8"')
-        self.send_header('Content-Length', str(len(text)))
-        self.end_headers()
-        self.wfile.write(text)
+        self.send_header('Content-type', getattr(text, 'content_type',
+            'text/xml; charset="utf-8"'))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        encoding = None
+        if self.compressthreshold is not None and \
+        not hasattr(text, 'content_type'):
+            self.send_header('Vary', 'Accept-Encoding')
+            encoding = Negotiate(self.headers.get('accept-encoding'))
+        if hasattr(text, 'content_type'):
+            self.send_header('Content-Length', str(len(text)))
+            self.end_headers()
+            for data in text: self.wfile.write(data)
+        elif hasattr(text, 'write_to') and self.request_version != 'HTTP/1.0':
+            self.send_header('Transfer-Encoding', 'chunked')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            w = _ChunkedWriter(self.wfile)
+            if encoding:
+                cw = CompressWriter(w, encoding, self.compresslevel)
+                text.write_to(cw)
+                cw.close()
+            else:
+                text.write_to(w)
+            w.close()
+        else:
+            if type(text) is not bytes:
+                text = str(text).encode('utf-8')
+            if encoding and len(text) >= self.compressthreshold:
+                text = Compress(text, encoding, self.compresslevel)
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(len(text)))
+            self.end_headers()
+            self.wfile.write(text)
         self.wfile.flush()
 
     def send_fault(self, f, code=500):
@@ -203,40 +359,73 @@ class SOAPRequestHandler(BaseHTTPRequestHandler):
         '''
         self.send_xml(f.AsSOAP(), code)
 
+    def send_too_large(self, ex):
+        '''Send a fault for a request body larger than decompresslimit.
+        '''
+        self.send_fault(Fault(Fault.Client, str(ex)), 413)
+
+    def send_accepted(self):
+        '''Send an empty reply, for a request without a response.
+        '''
+        if not self.replied:
+            self.send_xml(b'', 202)
+
     def do_POST(self):
         '''The POST command.
         '''
+        cid = None
         try:
-            ct = self.headers['content-type']
+            ct = self.headers.get('content-type', '')
             if ct.startswith('multipart/'):
-                cid = resolvers.MIMEResolver(ct, self.rfile)
-                xml = cid.GetSOAPPart()
-                ps = ParsedSoap(xml, resolver=cid.Resolve)
+                cid = self.read_multipart(ct)
+                ps = ParsedSoap(cid.GetSOAPPart(), resolver=cid.Resolve)
             else:
-                length = int(self.headers['content-length'])
-                ps = ParsedSoap(self.rfile.read(length))
+                ps = ParsedSoap(self.read_body())
+        except DecompressLimitError as e:
+            self.send_too_large(e)
+            return
         except ParseException as e:
+            if cid is not None: self.finish_multipart(cid)
             self.send_fault(FaultFromZSIException(e))
             return
         except Exception as e:
+            if cid is not None: self.finish_multipart(cid)
             # Faulted while processing; assume it's in the header.
             self.send_fault(FaultFromException(e, 1, sys.exc_info()[2]))
             return
 
         _Dispatch(ps, self.server.modules, self.send_xml, self.send_fault,
                   docstyle=self.server.docstyle, nsdict=self.server.nsdict,
-                  typesmodule=self.server.typesmodule, rpc=self.server.rpc)
+                  typesmodule=self.server.typesmodule, rpc=self.server.rpc,
+                  mtom=self.mtom if IsXOP(ct) else None)
+        if cid is not None: self.finish_multipart(cid)
+        self.send_accepted()
+
+class ThreadingHTTPServer(ThreadPoolMixIn, HTTPServer):
+    '''HTTPServer handling requests in a pool of threads, see
+    workers.ThreadPoolMixIn.
+    '''
+
 
 def AsServer(port=80, modules=None, docstyle=False, nsdict={}, typesmodule=None,
-             rpc=False, addr=''):
+             rpc=False, addr='', threads=0, processes=0, max_requests=0):
+    '''Serve until SIGTERM or SIGINT, SIGHUP gracefully restarts the
+    workers.  See ServiceContainer.AsServer for threads, processes and
+    max_requests.
+    '''
     address = (addr, port)
-    httpd = HTTPServer(address, SOAPRequestHandler)
+    if threads:
+        httpd = ThreadingHTTPServer(address, SOAPRequestHandler)
+        httpd.threads, httpd.max_requests = threads, max_requests
+        max_requests = 0
+    else:
+        httpd = HTTPServer(address, SOAPRequestHandler)
     httpd.modules = modules
     httpd.docstyle = docstyle
     httpd.nsdict = nsdict
     httpd.typesmodule = typesmodule
     httpd.rpc = rpc
-    httpd.serve_forever()
+    ServeForever(httpd, processes, max_requests)
 
 def AsCGI(nsdict={}, typesmodule=None, rpc=False, modules=None):
     '''Dispatch within a CGI script.
@@ -0,0 +1,266 @@
+#! /usr/bin/env python
+# $Header$
+'''A small DOM for parsed SOAP messages.
+
+Reader builds a tree of Element and Text nodes straight from pyexpat,
+the default reader of ParsedSoap.  The nodes use __slots__ and provide
+only the part of the DOM interface the typecodes use: nodeType,
+nodeName, nodeValue, parentNode, childNodes, localName, namespaceURI,
+prefix, tagName, attributes, getAttributeNS and getAttributeNodeNS.
+Elements carry their NSScope.  Comments are dropped, processing
+instructions and DTDs are rejected.  Code that needs a full DOM (c14n
+of received elements, for instance) can pass another readerclass.
+'''
+
+from . import _copyright, ParseException
+from .pullparse import NSScope
+from .wstools.Namespaces import XMLNS
+from xml.dom import Node as _Node
+from xml.parsers import expat
+
+_EMPTY = ()
+
+
+class Attr:
+    '''Attribute node, made on request by Element.attributes and
+    getAttributeNodeNS.
+    '''
+    __slots__ = ('namespaceURI', 'localName', 'nodeName', 'value')
+    nodeType = _Node.ATTRIBUTE_NODE
+
+    def __init__(self, namespaceURI, localName, nodeName, value):
+        self.namespaceURI, self.localName = namespaceURI, localName
+        self.nodeName, self.value = nodeName, value
+
+    nodeValue = property(lambda self: self.value)
+    name = property(lambda self: self.nodeName)
+
+
+class Text:
+    '''Character data.
+    '''
+    __slots__ = ('parentNode', 'data')
+    nodeType = _Node.TEXT_NODE
+    nodeName = '#text'
+    childNodes = _EMPTY
+    attributes = None
+
+    def __init__(self, parentNode, data):
+        self.parentNode, self.data = parentNode, data
+
+    nodeValue = property(lambda self: self.data)
+
+    def cloneNode(self, deep=False):
+        return Text(None, self.data)
+
+
+class Element:
+    '''Element node.
+        Instance data:
+            parentNode -- parent Element or Document
+            childNodes -- list of Element and Text nodes, an empty tuple
+                if there are none
+            namespaceURI, localName, tagName -- name of the element
+            nsscope -- the NSScope of the element
+    '''
+    __slots__ = ('parentNode', 'childNodes', 'namespaceURI', 'localName',
+                 'tagName', 'nsscope', '_attrs')
+    nodeType = _Node.ELEMENT_NODE
+    nodeValue = None
+
+    def __init__(self, parentNode, namespaceURI, localName, tagName, nsscope):
+        self.parentNode, self.childNodes = parentNode, _EMPTY
+        self.namespaceURI, self.localName = namespaceURI, localName
+        self.tagName, self.nsscope = tagName, nsscope
+        self._attrs = None
+
+    nodeName = property(lambda self: self.tagName)
+
+    @property
+    def prefix(self):
+        i = self.tagName.find(':')
+        if i < 0: return None
+        return self.tagName[:i]
+
+    def _attr(self, key, value):
+        '''Return an Attr, its prefix is looked up in the scope.
+        '''
+        ns, name = key
+        qname = name
+        if ns == XMLNS.BASE:
+            if name != 'xmlns': qname = 'xmlns:' + name
+        elif ns is not None:
+            for prefix, uri in list(self.nsscope.dict().items()):
+                if uri == ns and prefix:
+                    qname = '%s:%s' %(prefix, name)
+                    break
+        return Attr(ns, name, qname, value)
+
+    @property
+    def attributes(self):
+        '''Dictionary of qualified name to Attr, None if there are no
+        attributes.
+        '''
+        if not self._attrs: return None
+        attrs = [ self._attr(k, v) for k,v in list(self._attrs.items()) ]
+        return dict([ (a.nodeName, a) for a in attrs ])
+
+    def hasAttributes(self):
+        return bool(self._attrs)
+
+    def hasAttributeNS(self, namespaceURI, localName):
+        return bool(self._attrs) and \
+            (namespaceURI or None, localName) in self._attrs
+
+    def getAttributeNS(self, namespaceURI, localName):
+        '''Return the value of the attribute, '' if it is not set.
+        '''
+        if not self._attrs: return ''
+        return self._attrs.get((namespaceURI or None, localName), '')
+
+    def getAttributeNodeNS(self, namespaceURI, localName):
+        key = (namespaceURI or None, localName)
+        if not self._attrs or key not in self._attrs: return None
+        return self._attr(key, self._attrs[key])
+
+    def cloneNode(self, deep=False):
+        '''Return a copy without parent, of the subtree if deep.
+        '''
+        clone = Element(None, self.namespaceURI, self.localName,
+                        self.tagName, self.nsscope)
+        if self._attrs:
+            clone._attrs = dict(self._attrs)
+        if deep and self.childNodes:
+            clone.childNodes = [ c.cloneNode(True) for c in self.childNodes ]
+            for c in clone.childNodes: c.parentNode = clone
+        return clone
+
+
+class Document:
+    '''Document node, the parent of the document element.
+    '''
+    __slots__ = ('childNodes', 'nsscope')
+    nodeType = _Node.DOCUMENT_NODE
+    nodeName = '#document'
+    nodeValue = parentNode = attributes = None
+
+    def __init__(self):
+        self.childNodes = []
+        self.nsscope = NSScope(None, {'xml':XMLNS.XML, 'xmlns':XMLNS.BASE,
+                                      '':''})
+
+    @property
+    def documentElement(self):
+        for node in self.childNodes:
+            if node.nodeType == _Node.ELEMENT_NODE: return node
+        return None
+
+
+def _split(name):
+    '''Split an expat name into (namespaceURI, localName, qualified name).
+    '''
+    parts = name.split(' ')
+    if len(parts) == 1:
+        return None, name, name
+    if len(parts) == 2 or not parts[2]:
+        return parts[0], parts[1], parts[1]
+    return parts[0], parts[1], '%s:%s' %(parts[2], parts[1])
+
+
+class Reader:
+    '''DOM reader for ParsedSoap (readerclass), see the module
+    documentation.  The names seen are shared between documents read
+    by the same Reader.
+    '''
+    bufsize = 64 * 1024
+
+    def __init__(self):
+        self._names, self._keys = {}, {}
+
+    def fromString(self, data):
+        return self._parse(data, None)
+
+    def fromStream(self, stream):
+        return self._parse(None, stream)
+
+    def releaseNode(self, node):
+        '''Nothing to release, the tree is left to the garbage collector.
+        '''
+        pass
+
+    def _parse(self, data, stream):
+        document = Document()
+        names, keys, nsdecls = self._names, self._keys, []
+        state = [document]
+
+        def start(name, attrs):
+            parent = state[0]
+            info = names.get(name)
+            if info is None:
+                info = names[name] = _split(name)
+            scope = parent.nsscope
+            elt = Element(parent, info[0], info[1], info[2], scope)
+            if nsdecls or attrs:
+                d = {}
+                if nsdecls:
+                    declared = {}
+                    for prefix, uri in nsdecls:
+                        uri = uri or ''
+                        d[(XMLNS.BASE, prefix or 'xmlns')] = uri
+                        declared[prefix or ''] = uri
+                    elt.nsscope = NSScope(scope, declared)
+                    del nsdecls[:]
+                for aname, value in attrs.items():
+                    key = keys.get(aname)
+                    if key is None:
+                        key = keys[aname] = _split(aname)[:2]
+                    d[key] = value
+                elt._attrs = d
+            children = parent.childNodes
+            if children: children.append(elt)
+            else: parent.childNodes = [elt]
+            state[0] = elt
+
+        def end(name):
+            state[0] = state[0].parentNode
+
+        def text(data):
+            parent = state[0]
+            node = Text(parent, data)
+            children = parent.childNodes
+            if children: children.append(node)
+            else: parent.childNodes = [node]
+
+        def nsdecl(prefix, uri):
+            nsdecls.append((prefix, uri))
+
+        def pi(target, data):
+            raise ParseException('Found processing instruction "<?' + \
+                    target + '...>"', 0)
+
+        def doctype(*args):
+            raise ParseException('Found DTD', 0)
+
+        p = expat.ParserCreate(namespace_separator=' ')
+        p.namespace_prefixes = True
+        p.buffer_text = True
+        p.StartElementHandler = start
+        p.EndElementHandler = end
+        p.CharacterDataHandler = text
+        p.StartNamespaceDeclHandler = nsdecl
+        p.ProcessingInstructionHandler = pi
+        p.StartDoctypeDeclHandler = doctype
+        try:
+            if stream is None:
+                p.Parse(data, True)
+            else:
+                while True:
+                    chunk = stream.read(self.bufsize)
+                    p.Parse(chunk or b'', not chunk)
+                    if not chunk: break
+        except expat.ExpatError as e:
+            raise ParseException("Can't parse document (%s)" % e, 0)
+        return document
+
+
+if __name__ == '__main__': print(_copyright)
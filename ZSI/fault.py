@@ -10,7 +10,7 @@ from .ZSI.TCcompound import Struct
 from .ZSI.TC import QName, URI, String, XMLString, AnyElement, UNBOUNDED
 
 from .ZSI.wstools.Namespaces import SOAP, ZSI_SCHEMA_URI
-from .ZSI.wstools.c14n import Canonicalize
+from .ZSI.wstools.Utility import Canonicalize
 from .ZSI.TC import ElementDeclaration
 
 import traceback, io as StringIO
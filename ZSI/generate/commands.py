@@ -46,6 +46,12 @@ def SetUpLazyEvaluation(option, opt, value, parser, *args, **kwargs):
     TypecodeContainerBase.lazy = True
     
 
+def SetUpCompiledTypecodes(option, opt, value, parser, *args, **kwargs):
+    from ZSI.generate.containers import TypesHeaderContainer, TypesFooterContainer
+    TypesHeaderContainer.imports.append('import ZSI.compiler')
+    TypesFooterContainer.footer.append('ZSI.compiler.CompileModule(globals())')
+
+
 def formatSchemaObject(fname, schemaObj):
     """ In the case of a 'schema only' generation (-s) this creates
         a fake wsdl object that will function w/in the adapters
@@ -114,6 +120,17 @@ def wsdl2py(args=None):
                   callback_kwargs={},
                   help="EXPERIMENTAL: recursion error solution, lazy evalution of typecodes")
     
+    # Compiled parse/serialize functions for complexTypes.
+    op.add_option("--compile",
+                  action="callback", callback=SetUpCompiledTypecodes,
+                  callback_kwargs={},
+                  help="parse and serialize complexTypes with functions generated for them on first use, see ZSI.compiler")
+    
+    # One module per type, imported on first use.
+    op.add_option("--split",
+                  action="store_true", dest="split", default=False,
+                  help="write the types module as a package with a module for each type definition and element declaration, imported on first use")
+    
     # Use Twisted
     op.add_option("-w", "--twisted",
                   action="callback", callback=SetUpTwistedClient, 
@@ -227,6 +244,10 @@ def wsdl2py(args=None):
              msg_fd.close()
          fd.close()
 
+    if options.split:
+        wsm.writeTypesPackage(options.output_dir)
+        return
+
     fd = open( os.path.join(options.output_dir, '%s.py' %wsm.getTypesModuleName()), 'w+')
     wsm.writeTypes(fd)
     fd.close()
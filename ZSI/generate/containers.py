@@ -1051,6 +1051,16 @@ class TypesHeaderContainer(TypesContainerBase):
         self.writeArray(TypesHeaderContainer.imports)
 
 
+class TypesFooterContainer(TypesContainerBase):
+    '''statements ending all generated types modules.
+    '''
+    footer = []
+    logger = _GetLogger("TypesFooterContainer")
+
+    def _setContent(self):
+        self.writeArray(TypesFooterContainer.footer)
+
+
 NamespaceClassContainerBase = TypesContainerBase
  
 
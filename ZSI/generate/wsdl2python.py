@@ -7,7 +7,7 @@
 
 # $Id: wsdl2python.py 1203 2006-05-03 00:13:20Z boverhof $
 
-import os
+import os, textwrap
 from ZSI import _get_idstr
 from ZSI.wstools.logging import getLogger as _GetLogger
 from ZSI.wstools import WSDLTools
@@ -225,6 +225,65 @@ class WriteServiceModule:
             for schema in l:
                 sd.fromSchema(schema)
             sd.write(fd)
+        print(TypesFooterContainer(), file=fd)
+
+    def writeTypesPackage(self, directory):
+        """write out the types module as a package in directory, with
+        a module for each type definition and element declaration.  The
+        package defines a ZSI.schema.LazyNamespace for each namespace, 
+        the modules (in subpackage _nsN) are imported when the classes
+        are first used.
+        """
+        header = '%s \n# %%s.py \n# generated by %s\n%s\n\n'\
+                  %('#'*50, self.__module__, '#'*50)
+        name = self.getTypesModuleName()
+        package = os.path.join(directory, name)
+        self.gatherNamespaces()
+        descriptions = []
+        for l in list(self.usedNamespaces.values()):
+            sd = SchemaDescription(do_extended=self.do_extended, extPyClasses=self.extPyClasses)
+            for schema in l:
+                sd.fromSchema(schema)
+            descriptions.append(sd)
+
+        aliases = [NAD.getAlias(sd.targetNamespace) for sd in descriptions]
+        fd = _openModule(package, '__init__')
+        try:
+            fd.write(header %('%s/__init__' %name))
+            print(TypesHeaderContainer(), file=fd)
+            print('from ZSI.schema import LazyNamespace\n', file=fd)
+            for alias, sd in zip(aliases, descriptions):
+                sd.writeNamespace(fd, alias)
+        finally:
+            fd.close()
+
+        imports = 'from .. import %s' %', '.join(aliases)
+        for alias, sd in zip(aliases, descriptions):
+            path = os.path.join(package, '_' + alias)
+            fd = _openModule(path, '__init__')
+            try:
+                fd.write(header %('%s/_%s/__init__' %(name, alias)))
+            finally:
+                fd.close()
+            for t in sd.items:
+                classname = t.content.getClassName()
+                fd = _openModule(path, classname)
+                try:
+                    fd.write(header %('%s/_%s/%s' %(name, alias, classname)))
+                    print(TypesHeaderContainer(), file=fd)
+                    print(imports + '\n', file=fd)
+                    print(textwrap.dedent(str(t)), file=fd)
+                    print(TypesFooterContainer(), file=fd)
+                finally:
+                    fd.close()
+
+
+def _openModule(directory, name):
+    """open the module name of the package directory for writing.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return open(os.path.join(directory, '%s.py' %name), 'w')
 
             
 class ServiceDescription:
@@ -390,12 +449,12 @@ class SchemaDescription:
             self.targetNamespace = ns
  
         self.classHead.ns = self.classFoot.ns = ns
-        for item in [t for t in schema.types if t.getAttributeName() not in self.__types]:
+        for item in [t for t in list(schema.types.values()) if t.getAttributeName() not in self.__types]:
             self.__types.append(item.getAttributeName())
             self.items.append(TypeWriter(do_extended=self.do_extended, extPyClasses=self.extPyClasses))
             self.items[-1].fromSchemaItem(item)
 
-        for item in [e for e in schema.elements if e.getAttributeName() not in self.__elements]:
+        for item in [e for e in list(schema.elements.values()) if e.getAttributeName() not in self.__elements]:
             self.__elements.append(item.getAttributeName())
             self.items.append(ElementWriter(do_extended=self.do_extended))
             self.items[-1].fromSchemaItem(item)
@@ -414,6 +473,23 @@ class SchemaDescription:
             print(t, file=fd)
         print(self.classFoot, file=fd)
 
+    def writeNamespace(self, fd, alias):
+        """write out the LazyNamespace of a types package, which finds
+        the classes in the modules of subpackage _alias.
+        """
+        names = {DEF: [], DEC: []}
+        for t in self.items:
+            names[t.content.type].append('%s%r: %r,' 
+                %(ID2, t.content.getClassName(), t.content.name))
+        print('%s = LazyNamespace(__name__ + %r, %r,' 
+              %(alias, '._' + alias, self.targetNamespace), file=fd)
+        for keyword, kind in (('types', DEF), ('elements', DEC)):
+            print('%s%s={' %(ID1, keyword), file=fd)
+            for n in names[kind]:
+                print(n, file=fd)
+            print('%s},' %ID1, file=fd)
+        print(')\n', file=fd)
+
 class SchemaItemWriter:
     """contains/generates a single declaration"""
     logger = _GetLogger("SchemaItemWriter")
@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# $Header$
+'''MTOM/XOP packaging of SOAP messages.
+
+A SoapWriter made with mtom=size writes the base64Binary values of at
+least size bytes (and binary files) as xop:Include elements, and keeps
+the values in its parts.  Package turns it into an XOPMessage, the
+multipart/related message sent over HTTP, whose binary parts are the
+raw bytes.  On the receiving side a resolvers.MIMEResolver indexes the
+parts by Content-ID, and Base64String/Base64Binary resolve xop:Include
+to a read-only memoryview of the part, without a copy.
+'''
+
+from . import _copyright
+from .binary import _read_chunks
+import email.message, uuid
+
+XOP_TYPE = 'application/xop+xml'
+
+
+def IsXOP(content_type):
+    '''Return True if content_type (a Content-Type header) is that of an
+    XOP package.
+    '''
+    m = email.message.Message()
+    m['content-type'] = content_type or 'text/plain'
+    return m.get_content_type() == 'multipart/related' and \
+        (m.get_param('type') or '').lower() == XOP_TYPE
+
+
+class XOPMessage:
+    '''multipart/related XOP package of a SOAP message and its binary
+    parts, iterate over it for the bytes of the body.
+        Instance data:
+            soapdata -- the SOAP envelope, str
+            parts -- list of (Content-ID, value), value is a bytes-like
+                object or a binary file that can seek
+            boundary -- the MIME boundary
+            content_type -- value of the Content-Type header
+        Class data:
+            chunksize -- bytes read from a file at a time
+    '''
+    chunksize = 64 * 1024
+
+    def __init__(self, soapdata, parts, boundary=None):
+        self.soapdata, self.parts = soapdata, parts
+        self.boundary = boundary or '=_' + uuid.uuid4().hex
+        self.content_type = 'multipart/related; type="%s"; ' \
+            'boundary="%s"; start="<root>"; start-info="text/xml"' \
+            %(XOP_TYPE, self.boundary)
+
+    def _headers(self):
+        '''Generate the (headers, value) of the MIME parts.
+        '''
+        delimiter = '\r\n--%s\r\n' %self.boundary
+        yield (delimiter[2:] + 'Content-Type: %s; charset=UTF-8; '
+            'type="text/xml"\r\nContent-Transfer-Encoding: 8bit\r\n'
+            'Content-ID: <root>\r\n\r\n' %XOP_TYPE).encode('ascii'), \
+            self.soapdata.encode('utf-8')
+        for cid, value in self.parts:
+            yield (delimiter + 'Content-Type: application/octet-stream\r\n'
+                'Content-Transfer-Encoding: binary\r\n'
+                'Content-ID: <%s>\r\n\r\n' %cid).encode('ascii'), value
+
+    def __iter__(self):
+        for head, value in self._headers():
+            yield head
+            if hasattr(value, 'read'):
+                value.seek(0)
+                for data in _read_chunks(value, self.chunksize):
+                    yield data
+            else:
+                yield value
+        yield ('\r\n--%s--\r\n' %self.boundary).encode('ascii')
+
+    def __len__(self):
+        size = len('\r\n--%s--\r\n' %self.boundary)
+        for head, value in self._headers():
+            if hasattr(value, 'read'):
+                value.seek(0, 2)
+                n = value.tell()
+            else:
+                n = memoryview(value).nbytes
+            size += len(head) + n
+        return size
+
+    def __bytes__(self):
+        return b''.join(self)
+
+    def __str__(self):
+        '''The message for tracing, the binary parts are left out.
+        '''
+        l = [ head.decode('ascii') for head, value in self._headers() ]
+        l[0] += self.soapdata
+        for i, (cid, value) in enumerate(self.parts):
+            l[i+1] += '[binary data]'
+        return ''.join(l) + '\r\n--%s--\r\n' %self.boundary
+
+
+def Package(sw):
+    '''Return the message of the SoapWriter sw: a str, or an XOPMessage
+    if it has attachments.
+    '''
+    soapdata = str(sw)
+    if not sw.parts: return soapdata
+    return XOPMessage(soapdata, sw.parts)
+
+
+if __name__ == '__main__': print(_copyright)
@@ -6,7 +6,9 @@
 from .ZSI import _copyright, _children, _attrs, _child_elements, _stringtypes, \
         _backtrace, EvaluateException, ParseException, _valid_encoding, \
         _Node, _find_attr, _resolve_prefix
-from .ZSI.TC import AnyElement
+from .ZSI.TC import AnyElement, TypeCode
+from .pullparse import PullParser, NSScope, START, END, _append
+from .domreader import Reader
 import types
 
 from .ZSI.wstools.Namespaces import SOAP, XMLNS
@@ -17,25 +19,67 @@ _find_mu = lambda E: E.getAttributeNS(SOAP.ENV, "mustUnderstand")
 _find_root = lambda E: E.getAttributeNS(SOAP.ENC, "root")
 _find_id = lambda E: _find_attr(E, 'id')
 
+
+class _Forward:
+    '''Placeholder for the value of a multi-ref element that is still
+    being parsed, handed out for an href back to it (a cycle).
+    '''
+    used = False
+
+
+def _patch(pyobj, forward):
+    '''Replace forward by pyobj in the lists, dictionaries and instances
+    reachable from pyobj.
+    '''
+    todo, seen = [pyobj], set()
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen: continue
+        seen.add(id(obj))
+        if type(obj) is list:
+            items = obj
+            keys = range(len(obj))
+        elif type(obj) is dict:
+            items = obj
+            keys = list(obj.keys())
+        elif hasattr(obj, '__dict__') and not isinstance(obj, (type, TypeCode)):
+            items = obj.__dict__
+            keys = [ k for k in list(items.keys()) if k != 'typecode' ]
+        else:
+            continue
+        for k in keys:
+            v = items[k]
+            if v is forward: items[k] = pyobj
+            else: todo.append(v)
+
 class ParsedSoap:
     '''A Parsed SOAP object.
         Convert the text to a DOM tree and parse SOAP elements.
         Instance data:
             reader -- the DOM reader
             dom -- the DOM object
-            ns_cache -- dictionary (by id(node)) of namespace dictionaries
-            id_cache -- dictionary (by XML ID attr) of elements
+            ns_cache -- dictionary (by node) of namespace scopes (NSScope),
+                streamed elements carry their own.
+            id_cache -- dictionary (by XML ID attr) of elements, built
+                on the first href
+            ref_cache -- dictionary (by id() of element) of the lists of
+                (typecode, value) of multi-ref elements
             envelope -- the node holding the SOAP Envelope
             header -- the node holding the SOAP Header (or None)
             body -- the node holding the SOAP Body
             body_root -- the serialization root in the SOAP Body
             data_elements -- list of non-root elements in the SOAP Body
             trailer_elements -- list of elements following the SOAP body
+            stream -- the PullParser of a streaming instance (or None)
+        Class data:
+            defaultReaderClass -- reader used when no readerclass is
+                given, domreader.Reader.
     '''
-    defaultReaderClass = None
+    defaultReaderClass = Reader
 
     def __init__(self, input, readerclass=None, keepdom=False,
-    trailers=False, resolver=None,  envelope=True, **kw):
+    trailers=False, resolver=None,  envelope=True, streaming=False,
+    onclose=None, **kw):
         '''Initialize.
         Keyword arguments:
             trailers -- allow trailer elments (default is zero)
@@ -43,7 +87,15 @@ class ParsedSoap:
             readerclass -- factory class to create a reader
             keepdom -- do not release the DOM
             envelope -- look for a SOAP envelope.
+            streaming -- do not build a DOM, typecodes pull the Body
+                from an event stream (see _init_stream).
+            onclose -- streaming, called when the input has been read to
+                its end; Parse then reads the rest after the root.
         '''
+        self.stream, self.onclose = None, onclose
+        if streaming:
+            self._init_stream(input, keepdom, trailers, resolver, envelope)
+            return
 
         self.readerclass = readerclass
         self.keepdom = keepdom
@@ -66,13 +118,14 @@ class ParsedSoap:
             raise
 
         self.ns_cache = {
-            id(self.dom): {
+            self.dom: NSScope(None, {
                 'xml': XMLNS.XML,
                 'xmlns': XMLNS.BASE,
                 '': ''
-            }
+            })
         }
-        self.trailers, self.resolver, self.id_cache = trailers, resolver, {}
+        self.trailers, self.resolver = trailers, resolver
+        self.id_cache, self.ref_cache, self._header_ids = {}, {}, None
 
         # Exactly one child element
         c = [ E for E in _children(self.dom)
@@ -189,6 +242,170 @@ class ParsedSoap:
                                 if id(E) != rootid ]
         self._check_for_pi_nodes(self.data_elements, 0)
 
+    def _init_stream(self, input, keepdom, trailers, resolver, envelope):
+        '''Read the Envelope and Header, and stop at the start tag of the
+        serialization root; its content is left in the stream until Parse
+        is called.  The root is the first Body child not marked root="0",
+        and href targets must be independent elements (Body or Header
+        children).  Other Body children and trailers are only read when
+        data_elements or trailer_elements is asked for.
+        '''
+        self.readerclass = self.reader = None
+        self.keepdom, self.trailers, self.resolver = keepdom, trailers, resolver
+        self.stream = stream = PullParser(input)
+        self.dom = stream.document
+        self.ns_cache = { self.dom: stream.scope }
+        self.id_cache, self.ref_cache, self._header_ids = {}, {}, set()
+        self._drained, self._root_parsed = False, False
+
+        event, elt = stream.next()
+        if event is not START:
+            raise ParseException("Document has no Envelope", 0)
+        _append(self.dom, elt)
+        if envelope is False:
+            self.body_root, self._drained = elt, True
+            self._register_ids([elt], deep=False)
+            return
+
+        if elt.localName != "Envelope" \
+        or elt.namespaceURI != SOAP.ENV:
+            raise ParseException('Document has "' + elt.localName + \
+                '" element, not Envelope', 0)
+        for a in _attrs(elt):
+            name = a.nodeName
+            if name.find(":") == -1 and name not in [ "xmlns", "id" ]:
+                raise ParseException('Unqualified attribute "' + \
+                        name + '" in Envelope', 0)
+        self.envelope = elt
+        if not _valid_encoding(self.envelope):
+            raise ParseException("Envelope has invalid encoding", 0)
+
+        text = []
+        children = stream.children(self.envelope, text)
+        elt = next(children, None)
+        if elt is None:
+            raise ParseException("Envelope is empty (no Body)", 0)
+        if elt.localName == "Header" \
+        and elt.namespaceURI == SOAP.ENV:
+            self.header = stream.expand(elt)
+            _append(self.envelope, elt)
+            self._check_for_legal_children("Header", elt)
+            self.header_elements = _child_elements(self.header)
+            self._register_ids(self.header_elements, header=True)
+            elt = next(children, None)
+            if elt is None:
+                raise ParseException("Envelope has header but no Body", 0)
+        else:
+            self.header, self.header_elements = None, []
+        self._check_for_legal_text("Envelope", self.envelope, text)
+
+        if elt.localName != "Body" \
+        or elt.namespaceURI != SOAP.ENV:
+            if self.header:
+                raise ParseException('Header followed by "' + \
+                        elt.localName + \
+                        '" element, not Body', 0, elt, self.dom)
+            else:
+                raise ParseException('Document has "' + \
+                        elt.localName + \
+                        '" element, not Body', 0, elt, self.dom)
+        self.body = elt
+        _append(self.envelope, elt)
+        if not _valid_encoding(self.body):
+            raise ParseException("Body has invalid encoding", 0)
+
+        self.body_root, self._data_elements = None, []
+        text = []
+        for elt in stream.children(self.body, text):
+            self._check_for_legal_text("Body", self.body, text)
+            root = _find_root(elt)
+            if root == "0":
+                self._data_elements.append(stream.expand(elt))
+                _append(self.body, elt)
+                self._register_ids([elt])
+                continue
+            if root not in [ "1", "" ]:
+                raise ParseException('Illegal value for root attribute',
+                        0, elt, self.dom)
+            self.body_root = elt
+            break
+        else:
+            raise ParseException('No serialization root found',
+                    0, self.body, self.dom)
+        if not _valid_encoding(self.body_root):
+            raise ParseException("Invalid encoding", 0,
+                    elt, self.dom)
+        self._register_ids([self.body_root], deep=False)
+
+    def _check_for_legal_text(self, name, elt, text):
+        '''Streaming counterpart of _check_for_legal_children for the
+        character data read so far.
+        '''
+        for data in text:
+            if data.strip():
+                raise ParseException("Non-element child in " + name,
+                        name == "Header", elt, self.dom)
+        del text[:]
+
+    def _drain(self):
+        '''Read the rest of a streaming document.  Events belonging to an
+        element the consumer has not finished are pushed back, Body
+        children after it become data_elements and anything after the
+        Body trailer_elements.
+        '''
+        stream, self._drained = self.stream, True
+        depth, pending = len(stream.stack), []
+        data, trailers = self._data_elements, []
+        while True:
+            item = stream._read()
+            if item is None:
+                onclose, self.onclose = self.onclose, None
+                if onclose is not None: onclose()
+                break
+            event, elt = item
+            if depth > 2:
+                pending.append(item)
+                if event is START: depth += 1
+                elif event is END: depth -= 1
+            elif event is START:
+                stream.build(elt)
+                if depth == 2:
+                    data.append(elt)
+                    _append(self.body, elt)
+                    self._register_ids([elt])
+                else:
+                    trailers.append(elt)
+                    _append(self.envelope, elt)
+            elif event is END:
+                depth -= 1
+            elif elt.strip():
+                raise ParseException("Non-element child in " + \
+                        (depth == 2 and "Body" or "Envelope"), 0)
+        stream.pushback.extend(pending)
+
+        self.data_elements = data
+        if not self.trailers:
+            if len(trailers):
+                raise ParseException("Element found after Body",
+                        0, trailers[0], self.dom)
+        else:
+            self.trailer_elements = trailers
+            for elt in self.trailer_elements:
+                if not elt.namespaceURI:
+                    raise ParseException('Unqualified trailer element',
+                            0, elt, self.dom)
+
+    def __getattr__(self, attr):
+        '''Streaming instances read data_elements and trailer_elements
+        on first use.
+        '''
+        if attr in ('data_elements', 'trailer_elements') and \
+        self.__dict__.get('stream') is not None and \
+        not self.__dict__.get('_drained'):
+            self._drain()
+            return getattr(self, attr)
+        raise AttributeError(attr)
+
     def __del__(self):
         try:
             if not self.keepdom:
@@ -235,6 +452,32 @@ class ParsedSoap:
         '''
         return _backtrace(elt, self.dom)
 
+    def _register_ids(self, elts, header=False, deep=True):
+        '''Add the elements with an id attribute in elts (and their
+        descendants if deep) to id_cache.  An id must be unique.
+        '''
+        cache, list = self.id_cache, elts[:]
+        while list:
+            e = list.pop()
+            if e.nodeType != _Node.ELEMENT_NODE: continue
+            nodeid = _find_id(e)
+            if nodeid:
+                if nodeid in cache:
+                    raise ParseException('Duplicate id "%s"' % nodeid,
+                            header, e, self.dom)
+                cache[nodeid] = e
+                if header: self._header_ids.add(nodeid)
+            if deep: list += _children(e)
+
+    def _index_ids(self):
+        '''Index the ids of the Body and Header in one walk of the DOM.
+        A streaming instance registers them as the elements are built.
+        '''
+        self._header_ids = set()
+        self._register_ids(getattr(self, 'data_elements', []) + 
+                           [self.body_root])
+        self._register_ids(getattr(self, 'header_elements', []), header=True)
+
     def FindLocalHREF(self, href, elt, headers=1):
         '''Find a local HREF in the data elements.
         '''
@@ -243,24 +486,48 @@ class ParsedSoap:
                 'Absolute HREF ("%s") not implemented' % href,
                 self.Backtrace(elt))
         frag = href[1:]
-        # Already found?
+        if self._header_ids is None:
+            self._index_ids()
         e = self.id_cache.get(frag)
-        if e: return e
-        # Do a breadth-first search, in the data first.  Most likely
-        # to find multi-ref targets shallow in the data area.
-        list = self.data_elements[:] + [self.body_root]
-        if headers: list.extend(self.header_elements)
-        while list:
-            e = list.pop()
-            if e.nodeType == _Node.ELEMENT_NODE:
-                nodeid = _find_id(e)
-                if nodeid:
-                    self.id_cache[nodeid] = e
-                    if nodeid == frag: return e
-            list += _children(e)
+        if e is None and self.stream is not None and not self._drained:
+            self._drain()
+            e = self.id_cache.get(frag)
+        if e is not None and (headers or frag not in self._header_ids):
+            return e
         raise EvaluateException('''Can't find node for HREF "%s"''' % href,
                 self.Backtrace(elt))
 
+    def ParseLocalHREF(self, href, elt, typecode, parse):
+        '''Parse the element a local HREF refers to once, every href
+        to it parsed by the same typecode, or one of the same class, pyclass
+        and ofwhat, gets the same value.  An href back to an element still
+        being parsed (a cycle) gets a placeholder, which is replaced by the
+        value when it is complete.
+            href -- the href attribute of elt
+            elt -- the referring element
+            typecode -- the typecode parsing the target
+            parse -- parse(target, ps), parse the content of the target
+        '''
+        target = self.FindLocalHREF(href, elt)
+        values = self.ref_cache.setdefault(id(target), [])
+        for tc, pyobj in values:
+            if tc is typecode or (tc.__class__ is typecode.__class__ and
+                getattr(tc, 'pyclass', None) is getattr(typecode, 'pyclass', None) and
+                getattr(tc, 'ofwhat', None) is getattr(typecode, 'ofwhat', None)):
+                if isinstance(pyobj, _Forward): pyobj.used = True
+                return pyobj
+        i = len(values)
+        forward = _Forward()
+        values.append((typecode, forward))
+        try:
+            pyobj = parse(target, self)
+        except:
+            del values[i:]
+            raise
+        values[i] = (typecode, pyobj)
+        if forward.used: _patch(pyobj, forward)
+        return pyobj
+
     def ResolveHREF(self, uri, tc, **keywords):
         r = getattr(tc, 'resolver', self.resolver)
         if not r:
@@ -283,22 +550,40 @@ class ParsedSoap:
         return [ E for E in self.header_elements
                 if _find_actor(E) in actorlist ]
 
-    def GetElementNSdict(self, elt):
-        '''Get a dictionary of all the namespace attributes for the indicated
-        element.  The dictionaries are cached, and we recurse up the tree
-        as necessary.
+    def GetElementNSScope(self, elt):
+        '''Get the namespace scope (NSScope) of the indicated element,
+        its prefixes are looked up without copying.  The scopes of DOM
+        elements are built on first use and cached, streamed elements
+        carry theirs.
         '''
-        d = self.ns_cache.get(id(elt))
-        if not d:
-            if elt != self.dom: d = self.GetElementNSdict(elt.parentNode)
+        scope = getattr(elt, 'nsscope', None)
+        if scope is not None: return scope
+        cache, path = self.ns_cache, []
+        scope = cache.get(elt)
+        while scope is None:
+            path.append(elt)
+            elt = elt.parentNode
+            if elt is None:
+                scope = cache[self.dom]
+            else:
+                scope = getattr(elt, 'nsscope', None) or cache.get(elt)
+        for elt in reversed(path):
+            declared = {}
             for a in _attrs(elt):
                 if a.namespaceURI == XMLNS.BASE:
                     if a.localName == "xmlns":
-                        d[''] = a.nodeValue
+                        declared[''] = a.nodeValue
                     else:
-                        d[a.localName] = a.nodeValue
-            self.ns_cache[id(elt)] = d
-        return d.copy()
+                        declared[a.localName] = a.nodeValue
+            if declared: scope = NSScope(scope, declared)
+            cache[elt] = scope
+        return scope
+
+    def GetElementNSdict(self, elt):
+        '''Get a dictionary of all the namespace attributes for the indicated
+        element.  A new dictionary is returned, see GetElementNSScope.
+        '''
+        return self.GetElementNSScope(elt).dict()
 
     def GetDomAndReader(self):
         '''Returns a tuple containing the dom and reader objects. (dom, reader)
@@ -320,6 +605,16 @@ class ParsedSoap:
         '''Parse the message.
         '''
         if type(how) == type: how = how.typecode
+        if self.stream is not None:
+            if self._root_parsed:
+                raise EvaluateException(
+                    'Serialization root already parsed from the stream',
+                    self.Backtrace(self.body_root))
+            self._root_parsed = True
+            pyobj = how.parse_stream(self.body_root, self)
+            if self.onclose is not None and not self._drained:
+                self._drain()
+            return pyobj
         return how.parse(self.body_root, self)
 
     def WhatMustIUnderstand(self):
@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+# $Header$
+'''Keep-alive HTTP connection pool for the client bindings.
+'''
+
+from . import _copyright
+from .wstools.logging import getLogger as _GetLogger
+import select, socket, threading, time
+
+
+class ConnectionPool:
+    '''Idle HTTP/1.1 connections, kept for reuse by the bindings.  A
+    connection is only returned to the pool after its reply has been
+    read in full, and is keyed by transport class (scheme), host, port
+    and the transdict it was created with.
+        Instance data:
+            maxsize -- idle connections kept per key
+            timeout -- seconds an idle connection is kept
+            hits -- connections taken from the pool
+            misses -- connections created
+            stale -- pooled connections found closed by the server
+    '''
+    logger = _GetLogger('ZSI.pool.ConnectionPool')
+
+    def __init__(self, maxsize=4, timeout=60):
+        '''Initialize.
+        Keyword arguments:
+            maxsize -- idle connections kept per key
+            timeout -- seconds an idle connection is kept
+        '''
+        self.maxsize, self.timeout = maxsize, timeout
+        self.hits = self.misses = self.stale = 0
+        self._idle, self._lock = {}, threading.Lock()
+
+    def key(self, transport, netloc, transdict=None):
+        '''Return the pool key for connections made by
+        transport(netloc, None, **transdict).
+        '''
+        items = sorted([ (k, repr(v)) for k,v in (transdict or {}).items() ])
+        return (transport, netloc.lower(), tuple(items))
+
+    def get(self, transport, netloc, transdict=None):
+        '''Return (key, connection, reused), an idle connection if one is
+        alive, else a new connected one.
+        '''
+        key = self.key(transport, netloc, transdict)
+        now = time.time()
+        while True:
+            self._lock.acquire()
+            try:
+                idle = self._idle.get(key)
+                if not idle:
+                    self.misses += 1
+                    break
+                conn, released = idle.pop()
+            finally:
+                self._lock.release()
+
+            if now - released > self.timeout:
+                conn.close()
+            elif self._is_stale(conn):
+                self.stale += 1
+                conn.close()
+            else:
+                self._lock.acquire()
+                self.hits += 1
+                self._lock.release()
+                return key, conn, True
+
+        conn = transport(netloc, None, **(transdict or {}))
+        conn.connect()
+        return key, conn, False
+
+    def put(self, key, conn):
+        '''Return a connection whose reply has been read to the pool.
+        '''
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append((conn, time.time()))
+                return
+        finally:
+            self._lock.release()
+        conn.close()
+
+    def clear(self):
+        '''Close all idle connections.
+        '''
+        self._lock.acquire()
+        try:
+            idle, self._idle = self._idle, {}
+        finally:
+            self._lock.release()
+        for l in idle.values():
+            for conn,released in l: conn.close()
+
+    def _is_stale(self, conn):
+        '''An idle connection has nothing to read; if it is readable the
+        server has closed it (or broken the protocol).
+        '''
+        sock = conn.sock
+        if sock is None: return True
+        try:
+            r,w,e = select.select([sock], [], [], 0)
+        except (ValueError, socket.error):
+            return True
+        return bool(r)
+
+    def __repr__(self):
+        return '<%s maxsize=%d hits=%d misses=%d stale=%d>' %(
+            self.__class__.__name__, self.maxsize, self.hits, self.misses,
+            self.stale)
+
+
+if __name__ == '__main__': print(_copyright)
@@ -0,0 +1,296 @@
+#! /usr/bin/env python
+# $Header$
+'''Event driven (pull) parsing of SOAP messages.
+
+A PullParser wraps pyexpat and hands out start/end/text events on
+demand, feeding the document in chunks as they are needed.  Elements
+are created for start tags but are not linked into a tree unless a
+consumer asks for the subtree to be built (expand), so a typecode can
+walk the message and drop what it has converted.
+'''
+
+from . import _copyright, _stringtypes, ParseException
+from .wstools.Namespaces import XMLNS
+from xml.parsers import expat
+from xml.dom import minidom
+from collections import deque
+
+START, END, TEXT = 1, 2, 3
+_NOTSET = object()
+
+
+def _append(parent, node):
+    '''Link node as the last child of parent; node.parentNode is
+    already set.
+    '''
+    children = parent.childNodes
+    if children:
+        last = children[-1]
+        last.nextSibling, node.previousSibling = node, last
+    children.append(node)
+
+
+class NSScope:
+    '''Namespace scope of an element, immutable: the prefixes declared
+    on the element, chained to the scope of the nearest ancestor that
+    declares any.  Elements without declarations share the scope of
+    their parent.  The default namespace is keyed by ''.
+        Instance data:
+            parent -- enclosing NSScope, or None
+            declared -- dictionary of the prefixes declared here
+    '''
+    __slots__ = ('parent', 'declared')
+
+    def __init__(self, parent, declared):
+        self.parent, self.declared = parent, declared
+
+    def get(self, prefix, default=None):
+        '''Return the namespace bound to prefix, or default.
+        '''
+        scope = self
+        while scope is not None:
+            declared = scope.declared
+            if prefix in declared: return declared[prefix]
+            scope = scope.parent
+        return default
+
+    def __getitem__(self, prefix):
+        uri = self.get(prefix, _NOTSET)
+        if uri is _NOTSET: raise KeyError(prefix)
+        return uri
+
+    def __contains__(self, prefix):
+        return self.get(prefix, _NOTSET) is not _NOTSET
+
+    def dict(self):
+        '''Return a new dictionary of all the prefixes in scope.
+        '''
+        scopes, scope = [], self
+        while scope is not None:
+            scopes.append(scope.declared)
+            scope = scope.parent
+        d = {}
+        for declared in reversed(scopes): d.update(declared)
+        return d
+
+
+class _Element(minidom.Element):
+    '''Element carrying its NSScope.
+    '''
+    __slots__ = ('nsscope',)
+
+
+class PullParser:
+    '''Pull events from an XML document.
+        Instance data:
+            document -- owner document of all nodes handed out
+            scope -- NSScope of the document
+            stack -- the elements currently open, outermost first
+            pushback -- events to deliver before reading more input
+    '''
+    bufsize = 64 * 1024
+
+    def __init__(self, input, bufsize=None):
+        '''Initialize.
+        Parameters:
+            input -- string, bytes or a file-like object with read()
+            bufsize -- number of bytes fed to expat at a time
+        '''
+        self.bufsize = bufsize or self.bufsize
+        if type(input) in _stringtypes or isinstance(input, bytes):
+            self._data, self._source = input, None
+        else:
+            self._data, self._source = None, input
+
+        self.document = minidom.Document()
+        self.scope = NSScope(None, {'xml':XMLNS.XML, 'xmlns':XMLNS.BASE, '':''})
+        self._scopes = [self.scope]
+        self.stack, self.pushback = [], deque()
+        self._events, self._nsdecls, self._done = deque(), [], False
+        self._current = self.document
+
+        p = self._parser = expat.ParserCreate(namespace_separator=' ')
+        p.namespace_prefixes = True
+        p.buffer_text = True
+        p.StartElementHandler = self._start
+        p.EndElementHandler = self._end
+        p.CharacterDataHandler = self._text
+        p.StartNamespaceDeclHandler = self._nsdecl
+        p.ProcessingInstructionHandler = self._pi
+        p.StartDoctypeDeclHandler = self._doctype
+
+    def _qname(self, name):
+        '''Split an expat name into (namespaceURI, qualified name).
+        '''
+        parts = name.split(' ')
+        if len(parts) == 1:
+            return None, parts[0]
+        if len(parts) == 2 or not parts[2]:
+            return parts[0], parts[1]
+        return parts[0], '%s:%s' %(parts[2], parts[1])
+
+    def _start(self, name, attrs):
+        nsuri, qname = self._qname(name)
+        prefix = ':' in qname and qname.split(':', 1)[0] or None
+        elt = _Element(qname, nsuri, prefix)
+        elt.ownerDocument = self.document
+        scope = self._scopes[-1]
+        if self._nsdecls:
+            declared = {}
+            for prefix, uri in self._nsdecls:
+                if prefix:
+                    elt.setAttributeNS(XMLNS.BASE, 'xmlns:' + prefix, uri or '')
+                else:
+                    elt.setAttributeNS(XMLNS.BASE, 'xmlns', uri or '')
+                declared[prefix or ''] = uri or ''
+            scope = NSScope(scope, declared)
+            self._nsdecls = []
+        elt.nsscope = scope
+        self._scopes.append(scope)
+        for name, value in attrs.items():
+            nsuri, qname = self._qname(name)
+            elt.setAttributeNS(nsuri, qname, value)
+        self._events.append((START, elt))
+
+    def _end(self, name):
+        self._scopes.pop()
+        self._events.append((END, None))
+
+    def _text(self, data):
+        self._events.append((TEXT, data))
+
+    def _nsdecl(self, prefix, uri):
+        self._nsdecls.append((prefix, uri))
+
+    def _pi(self, target, data):
+        raise ParseException('Found processing instruction "<?' + \
+                target + '...>"', 0)
+
+    def _doctype(self, *args):
+        raise ParseException('Found DTD', 0)
+
+    def _feed(self):
+        '''Feed the next chunk of input to expat.
+        '''
+        if self._source is not None:
+            data = self._source.read(self.bufsize)
+            final = not data
+        else:
+            data, self._data = self._data, None
+            final = True
+        if final: self._done = True
+        try:
+            self._parser.Parse(data or b'', final)
+        except expat.ExpatError as e:
+            raise ParseException("Can't parse document (%s)" % e, 0)
+
+    def _read(self):
+        '''Return the next (event, value) from the input, or None at the
+        end of the document.  Start events carry the new element, end
+        events carry the element being closed.  The open element stack
+        is not maintained.
+        '''
+        while not self._events:
+            if self._done: return None
+            self._feed()
+        event, value = self._events.popleft()
+        if event is START:
+            value.parentNode = self._current
+            self._current = value
+        elif event is END:
+            value, self._current = self._current, self._current.parentNode
+        return event, value
+
+    def next(self):
+        '''Return the next (event, value), keeping track of open elements.
+        '''
+        if self.pushback:
+            item = self.pushback.popleft()
+        else:
+            item = self._read()
+            if item is None:
+                raise ParseException('Unexpected end of document', 0)
+        event = item[0]
+        if event is START:
+            self.stack.append(item[1])
+        elif event is END:
+            self.stack.pop()
+        return item
+
+    def expand(self, elt, read=None):
+        '''Build the subtree of elt, whose start tag was the last event
+        consumed; returns elt.  The end tag of elt is consumed.
+        '''
+        read = read or self.next
+        document, node = self.document, elt
+        while True:
+            event, value = read()
+            if event is START:
+                _append(node, value)
+                node = value
+            elif event is TEXT:
+                text = document.createTextNode(value)
+                text.parentNode = node
+                _append(node, text)
+            elif event is END:
+                if node is elt: return elt
+                node = node.parentNode
+
+    def build(self, elt):
+        '''Like expand, but reads past the open element stack, used to
+        read ahead of a consumer.
+        '''
+        return self.expand(elt, read=self._read)
+
+    def text(self, elt):
+        '''Return the character data of elt, whose start tag was the last
+        event consumed, and consume its end tag; '' if it is empty.
+        If elt has child elements its subtree is built instead and None
+        is returned.
+        '''
+        texts = []
+        while True:
+            item = self.next()
+            event = item[0]
+            if event is TEXT:
+                texts.append(item[1])
+            elif event is END:
+                return ''.join(texts)
+            else:
+                # give the child back, and build elt from its text
+                self.stack.pop()
+                self.pushback.appendleft(item)
+                for data in texts:
+                    node = self.document.createTextNode(data)
+                    node.parentNode = elt
+                    _append(elt, node)
+                self.expand(elt)
+                return None
+
+    def skip(self, elt):
+        '''Consume events up to and including the end tag of elt.
+        '''
+        depth = self.stack.index(elt)
+        while len(self.stack) > depth:
+            self.next()
+
+    def children(self, elt, text=None):
+        '''Generator of the child elements of elt, whose start tag was the
+        last event consumed.  A child whose content is not consumed by the
+        caller is skipped.  Character data is appended to the list text if
+        one is given.
+        '''
+        depth = len(self.stack)
+        while True:
+            event, value = self.next()
+            if event is START:
+                yield value
+                if len(self.stack) > depth:
+                    self.skip(value)
+            elif event is END:
+                return
+            elif text is not None:
+                text.append(value)
+
+
+if __name__ == '__main__': print(_copyright)
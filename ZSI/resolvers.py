@@ -4,34 +4,40 @@
 '''
 
 from .ZSI import _copyright, _child_elements, EvaluateException, TC
-import multifile, mimetools, urllib.request, urllib.parse, urllib.error
-from base64 import decodestring as b64decode
+import urllib.request, urllib.parse, urllib.error
+import email.message, email.parser, quopri, re, mmap, tempfile
+from base64 import decodebytes as b64decode
+from .binary import Base64Decoder
 import io as StringIO
 
 
+def _decode(data, enc):
+    '''Undo the Content-Transfer-Encoding enc of the bytes-like data.
+    '''
+    enc = (enc or '7bit').lower()
+    if enc in ['7bit', '8bit', 'binary']: return data
+    if enc == 'base64': return b64decode(data)
+    if enc == 'quoted-printable': return quopri.decodestring(bytes(data))
+    raise EvaluateException('Unsupported transfer encoding "%s"' %enc)
+
+
 def Opaque(uri, tc, ps, **keywords):
     '''Resolve a URI and return its content as a string.
     '''
     source = urllib.request.urlopen(uri, **keywords)
-    enc = source.info().getencoding()
-    if enc in ['7bit', '8bit', 'binary']: return source.read()
-
-    data = StringIO.StringIO()
-    mimetools.decode(source, data, enc)
-    return data.getvalue()
+    enc = source.info().get('content-transfer-encoding')
+    return _decode(source.read(), enc)
 
 
 def XML(uri, tc, ps, **keywords):
     '''Resolve a URI and return its content as an XML DOM.
     '''
     source = urllib.request.urlopen(uri, **keywords)
-    enc = source.info().getencoding()
-    if enc in ['7bit', '8bit', 'binary']:
+    enc = source.info().get('content-transfer-encoding')
+    if (enc or '7bit').lower() in ['7bit', '8bit', 'binary']:
         data = source
     else:
-        data = StringIO.StringIO()
-        mimetools.decode(source, data, enc)
-        data.seek(0)
+        data = StringIO.BytesIO(_decode(source.read(), enc))
     dom = ps.readerclass().fromStream(data)
     return _child_elements(dom)[0]
 
@@ -62,68 +68,246 @@ class NetworkResolver:
         return Opaque(uri, tc, ps, **keywords)
 
 
+class _Spool:
+    '''Content of a part as it is read, in memory up to size bytes and
+    then in a temporary file.
+    '''
+    def __init__(self, size):
+        self.size, self.data, self.file = size, bytearray(), None
+
+    def write(self, data):
+        if self.file is not None:
+            self.file.write(data)
+            return
+        self.data += data
+        if len(self.data) > self.size:
+            self.file = tempfile.TemporaryFile()
+            self.file.write(self.data)
+            self.data = None
+
+    def view(self):
+        '''Return a read-only memoryview of the content, a spooled part
+        is mapped.
+        '''
+        if self.file is None:
+            return memoryview(self.data).toreadonly()
+        self.file.flush()
+        m = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file.close()
+        return memoryview(m)
+
+
+class PartReader:
+    '''Read-only file over the memoryview of a part.
+    '''
+    def __init__(self, view):
+        self.view, self.pos = view, 0
+
+    def read(self, size=-1):
+        end = len(self.view)
+        if size is not None and size >= 0: end = min(end, self.pos + size)
+        data = self.view[self.pos:end].tobytes()
+        self.pos = end
+        return data
+
+    def seek(self, pos, whence=0):
+        self.pos = max(0, pos + (0, self.pos, len(self.view))[whence])
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def getvalue(self):
+        return self.view.tobytes()
+
+
+_header_end = re.compile(br'\r?\n\r?\n')
+
 class MIMEResolver:
-    '''Multi-part MIME resolver -- SOAP With Attachments, mostly.
+    '''Multi-part MIME resolver -- SOAP With Attachments and MTOM/XOP.
+    The message is read from f as far as needed: up to the SOAP part when
+    the resolver is made, the other parts when they are asked for (or by
+    ReadParts).  A part is kept as a read-only memoryview, a part larger
+    than spoolsize is spooled to a temporary file and mapped.
+        Instance data:
+            parts -- list of (header, content) of the parts read, in
+                message order; header is an email.message.Message,
+                content a memoryview
+            id_dict, loc_dict -- the parts by Content-ID (without <>)
+                and Content-Location
+            start -- the SOAP part, the start parameter of ct or the first
+        Class data:
+            spoolsize -- largest part kept in memory
+            bufsize -- bytes read from f at a time
     '''
+    spoolsize = 1024 * 1024
+    bufsize = 64 * 1024
 
     def __init__(self, ct, f, next=None, uribase='thismessage:/',
-    seekable=0, **kw):
-        # Get the boundary.  It's too bad I have to write this myself,
-        # but no way am I going to import cgi for 10 lines of code!
-        for param in ct.split(';'):
-            a = param.strip()
-            if a.startswith('boundary='):
-                if a[9] in [ '"', "'" ]:
-                    boundary = a[10:-1]
-                else:
-                    boundary = a[9:]
-                break
-        else:
+    seekable=0, length=None, **kw):
+        '''
+        ct -- value of the Content-Type header
+        f -- binary file to read the message body from
+        length -- size of the body, None to read up to the close
+            delimiter (or the end of f)
+        '''
+        m = email.message.Message()
+        m['content-type'] = ct
+        boundary = m.get_param('boundary')
+        if not boundary:
             raise ValueError('boundary parameter not found')
 
         self.id_dict, self.loc_dict, self.parts = {}, {}, []
         self.next = next
         self.base = uribase
+        self._read = getattr(f, 'read1', f.read)
+        self._left, self._done = length, False
+        self._delimiter = b'\n--' + boundary.encode('latin-1')
+        self._parser = email.parser.BytesHeaderParser()
+        # the newline matches a delimiter at the start of the body
+        self._buf = bytearray(b'\n')
+        if not self._read_to_delimiter(None):
+            raise ValueError('no body parts found')
 
-        mf = multifile.MultiFile(f, seekable)
-        mf.push(boundary)
-        while next(mf):
-            head = mimetools.Message(mf)
-            body = StringIO.StringIO()
-            mimetools.decode(mf, body, head.getencoding())
-            body.seek(0)
-            part = (head, body)
-            self.parts.append(part)
-            key = head.get('content-id')
-            if key:
-                if key[0] == '<' and key[-1] == '>': key = key[1:-1]
-                self.id_dict[key] = part
-            key = head.get('content-location')
-            if key: self.loc_dict[key] = part
-        mf.pop()
+        start = m.get_param('start')
+        if start and start[0] == '<' and start[-1] == '>': start = start[1:-1]
+        self.start = None
+        while self.start is None and not self._done:
+            part = self._read_part()
+            if not start or part[0].get('content-id', '').strip('<>') == start:
+                self.start = part
+        if self.start is None:
+            raise ValueError('start part <%s> not found' %start)
+
+    def _fill(self):
+        '''Read more of the body into the buffer, False at its end.
+        '''
+        size = self.bufsize
+        if self._left is not None: size = min(size, self._left)
+        data = size and self._read(size)
+        if not data: return False
+        if type(data) is str: data = data.encode('latin-1')
+        if self._left is not None: self._left -= len(data)
+        self._buf += data
+        return True
+
+    def _read_to_delimiter(self, write):
+        '''Pass the data up to the next delimiter to write (None to drop
+        it) and consume the delimiter line.  Returns False if it was the
+        close delimiter.
+        '''
+        buf, delimiter = self._buf, self._delimiter
+        keep = len(delimiter) + 1
+        while True:
+            i = buf.find(delimiter)
+            if i >= 0: break
+            if len(buf) > keep:
+                if write is not None: write(bytes(buf[:-keep]))
+                del buf[:-keep]
+            if not self._fill():
+                raise ValueError('truncated multipart message')
+        end = i
+        if end and buf[end-1] == 13: end -= 1
+        if write is not None and end: write(bytes(buf[:end]))
+        i += len(delimiter)
+        while buf.find(b'\n', i) < 0 and len(buf) < i + 2 and self._fill():
+            pass
+        more = buf[i:i+2] != b'--'
+        if more:
+            while buf.find(b'\n', i) < 0:
+                if not self._fill():
+                    raise ValueError('truncated multipart message')
+            del buf[:buf.find(b'\n', i) + 1]
+        else:
+            # the epilogue is dropped
+            self._done = True
+            del buf[:]
+            while self._left and self._fill(): del buf[:]
+        return more
+
+    def _read_headers(self):
+        buf = self._buf
+        while len(buf) < 2 and self._fill(): pass
+        if buf[:1] == b'\n' or buf[:2] == b'\r\n':
+            del buf[:buf.find(b'\n') + 1]
+            return self._parser.parsebytes(b'')
+        while True:
+            match = _header_end.search(buf)
+            if match is not None: break
+            if not self._fill():
+                raise ValueError('truncated multipart message')
+        head = self._parser.parsebytes(bytes(buf[:match.start()]))
+        del buf[:match.end()]
+        return head
+
+    def _read_part(self):
+        '''Read the next part, add it to parts and the dictionaries.
+        '''
+        head = self._read_headers()
+        spool = _Spool(self.spoolsize)
+        enc = (head.get('content-transfer-encoding') or '7bit').lower()
+        if enc == 'base64':
+            decoder = Base64Decoder(spool)
+            self._done = not self._read_to_delimiter(decoder.write)
+            decoder.close()
+            content = spool.view()
+        else:
+            self._done = not self._read_to_delimiter(spool.write)
+            content = memoryview(_decode(spool.view(), enc)).toreadonly()
+        part = (head, content)
+        self.parts.append(part)
+        key = head.get('content-id')
+        if key:
+            if key[0] == '<' and key[-1] == '>': key = key[1:-1]
+            self.id_dict[key] = part
+        key = head.get('content-location')
+        if key: self.loc_dict[key] = part
+        return part
+
+    def ReadParts(self):
+        '''Read the rest of the message, return parts.
+        '''
+        while not self._done:
+            self._read_part()
+        return self.parts
 
     def GetSOAPPart(self):
         '''Get the SOAP body part.
         '''
-        head, part = self.parts[0]
-        return StringIO.StringIO(part.getvalue())
+        head, part = self.start
+        return PartReader(part)
 
-    def get(self, uri):
-        '''Get the content for the bodypart identified by the uri.
+    def GetContent(self, uri):
+        '''Return the content of the bodypart identified by uri, None if
+        there is none.  A cid: uri must be found.  The message is read
+        up to the part.
         '''
         if uri.startswith('cid:'):
             # Content-ID, so raise exception if not found.
-            head, part = self.id_dict[uri[4:]]
-            return StringIO.StringIO(part.getvalue())
-        if uri in self.loc_dict:
-            head, part = self.loc_dict[uri]
-            return StringIO.StringIO(part.getvalue())
-        return None
+            head, part = self._find(urllib.parse.unquote(uri[4:]),
+                self.id_dict)
+            return part
+        head, part = self._find(uri, self.loc_dict) or (None, None)
+        return part
+
+    def _find(self, key, d):
+        '''Return d[key], reading parts until it is there.
+        '''
+        while key not in d and not self._done:
+            self._read_part()
+        return d[key] if d is self.id_dict else d.get(key)
+
+    def get(self, uri):
+        '''Get the content for the bodypart identified by the uri.
+        '''
+        content = self.GetContent(uri)
+        if content is None: return None
+        return PartReader(content)
 
     def Opaque(self, uri, tc, ps, **keywords):
-        content = self.get(uri)
-        if content: return content.getvalue()
-        if not self.__next__: raise EvaluateException("Unresolvable URI " + uri)
+        content = self.GetContent(uri)
+        if content is not None: return content
+        if not self.next: raise EvaluateException("Unresolvable URI " + uri)
         return self.next.Opaque(uri, tc, ps, **keywords)
 
     def XML(self, uri, tc, ps, **keywords):
@@ -131,7 +315,7 @@ class MIMEResolver:
         if content:
             dom = ps.readerclass().fromStream(content)
             return _child_elements(dom)[0]
-        if not self.__next__: raise EvaluateException("Unresolvable URI " + uri)
+        if not self.next: raise EvaluateException("Unresolvable URI " + uri)
         return self.next.XML(uri, tc, ps, **keywords)
 
     def Resolve(self, uri, tc, ps, **keywords):
@@ -140,8 +324,7 @@ class MIMEResolver:
         return self.Opaque(uri, tc, ps, **keywords)
 
     def __getitem__(self, cid):
-        head, body = self.id_dict[cid]
-        newio = StringIO.StringIO(body.getvalue())
-        return newio
+        head, body = self._find(cid, self.id_dict)
+        return PartReader(body)
 
 if __name__ == '__main__': print(_copyright)
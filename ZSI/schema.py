@@ -6,6 +6,7 @@
 from .ZSI import _copyright, _seqtypes, _find_type, EvaluateException
 from .ZSI.wstools.Namespaces import SCHEMA, SOAP
 from .ZSI.wstools.Utility import SplitQName
+import importlib
 
 
 def _get_type_definition(namespaceURI, name, **kw):
@@ -50,6 +51,19 @@ def RegisterAnyElement():
     '''
     return _GetPyobjWrapper.RegisterAnyElement()
 
+def RegisterLazyModule(module, types=(), elements=()):
+    '''Register the module defining the global type definitions types
+    and element declarations elements, lists of (namespaceURI, NCName).
+    The module is imported by the first GTD or GED looking up one of
+    them, see LazyNamespace.
+    '''
+    for key in types:
+        if key not in SchemaInstanceType.types:
+            SchemaInstanceType.type_modules[key] = module
+    for key in elements:
+        if key not in SchemaInstanceType.elements:
+            SchemaInstanceType.element_modules[key] = module
+
 
 class SchemaInstanceType(type):
     '''Register all types/elements, when hit already defined 
@@ -63,10 +77,16 @@ class SchemaInstanceType(type):
             global element declarations.
         element_typecode_cache -- dict of typecode instances 
             representing global element declarations.
+        type_modules -- dict of the modules, not imported yet, 
+            defining global type definitions.
+        element_modules -- dict of the modules, not imported yet, 
+            defining global element declarations.
     '''
     types = {}
     elements = {}
     element_typecode_cache = {}
+    type_modules = {}
+    element_modules = {}
     
     def __new__(cls,classname,bases,classdict):
         '''If classdict has literal and schema register it as a
@@ -108,6 +128,8 @@ class SchemaInstanceType(type):
            name -- 
         '''
         klass = cls.types.get((namespaceURI, name), None)
+        if klass is None and cls.type_modules:
+            klass = cls._load(cls.type_modules, cls.types, (namespaceURI, name))
         if lazy and klass is not None:
             return _Mirage(klass)
         return klass
@@ -125,6 +147,8 @@ class SchemaInstanceType(type):
             isref -- if element reference, return class definition.
         '''
         key = (namespaceURI, name)
+        if key not in cls.elements and cls.element_modules:
+            cls._load(cls.element_modules, cls.elements, key)
         if isref:
             klass = cls.elements.get(key,None)
             if klass is not None and lazy is True:
@@ -141,6 +165,18 @@ class SchemaInstanceType(type):
         return typecode
     getElementDeclaration = classmethod(getElementDeclaration)
 
+    def _load(cls, modules, registry, key):
+        '''Import the module registered for key, its classes register
+        themselves, and return the class registered for key.
+        '''
+        module = modules.get(key)
+        if module is None:
+            return None
+        importlib.import_module(module)
+        modules.pop(key, None)
+        return registry.get(key)
+    _load = classmethod(_load)
+
 
 class ElementDeclaration(metaclass=SchemaInstanceType):
     '''Typecodes subclass to represent a Global Element Declaration by
@@ -181,7 +217,7 @@ class TypeDefinition(metaclass=SchemaInstanceType):
             
         typeName = _find_type(elt)
         prefix,typeName = SplitQName(typeName)
-        uri = ps.GetElementNSdict(elt).get(prefix)
+        uri = ps.GetElementNSScope(elt).get(prefix)
         subclass = SchemaInstanceType.getTypeDefinition(uri, typeName)
         if subclass is None:
             raise EvaluateException(
@@ -264,6 +300,42 @@ class _Mirage:
     __call__ = _hide_type
 
 
+class LazyNamespace:
+    '''Stands for the class nsN of a types module generated with
+    wsdl2py --split: the types package has a module for each type
+    definition and element declaration, imported when the class is
+    first used (as an attribute of this object, or by GTD or GED).
+
+    Instance data:
+        targetNamespace -- the namespace
+        modules -- dict of class name to the module defining it
+    '''
+
+    def __init__(self, package, targetNamespace, types=None, elements=None):
+        '''Parameters:
+            package -- name of the package of the modules, one per class
+            targetNamespace -- the namespace
+            types -- dict of class name to NCName of the type definitions
+            elements -- dict of class name to NCName of the element declarations
+        '''
+        self.targetNamespace = targetNamespace
+        self.modules = {}
+        for classname, name in list((types or {}).items()):
+            module = self.modules[classname] = '%s.%s' %(package, classname)
+            RegisterLazyModule(module, types=[(targetNamespace, name)])
+        for classname, name in list((elements or {}).items()):
+            module = self.modules[classname] = '%s.%s' %(package, classname)
+            RegisterLazyModule(module, elements=[(targetNamespace, name)])
+
+    def __getattr__(self, name):
+        module = self.__dict__.get('modules', {}).get(name)
+        if module is None:
+            raise AttributeError(name)
+        klass = getattr(importlib.import_module(module), name)
+        setattr(self, name, klass)
+        return klass
+
+
 class _GetPyobjWrapper:
     '''Get a python object that wraps data and typecode.  Used by
     <any> parse routine, so that typecode information discovered
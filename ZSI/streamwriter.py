@@ -0,0 +1,384 @@
+#! /usr/bin/env python
+# $Header$
+'''SOAP message output without a DOM.
+
+StreamElementProxy is an outputclass for SoapWriter.  It keeps a
+compact element tree (no DOM nodes, no attribute nodes) with the same
+prefix rules as wstools.Utility.ElementProxy, and writes canonical XML
+in a single pass into a byte sink:
+
+    sw = SoapWriter(outputclass=StreamElementProxy)
+    sw.serialize(pyobj, typecode)
+    sw.write_to(wfile)
+'''
+
+from . import _copyright
+from .wstools.Utility import MessageInterface, NamespaceError
+from .wstools.Namespaces import XMLNS, SOAP, SCHEMA, ZSI_SCHEMA_URI
+from xml.dom import Node
+
+
+def _escape_text(s):
+    if '&' in s: s = s.replace('&', '&amp;')
+    if '<' in s: s = s.replace('<', '&lt;')
+    if '>' in s: s = s.replace('>', '&gt;')
+    if '\r' in s: s = s.replace('\r', '&#xD;')
+    return s
+
+def _escape_attr(s):
+    if '&' in s: s = s.replace('&', '&amp;')
+    if '<' in s: s = s.replace('<', '&lt;')
+    if '"' in s: s = s.replace('"', '&quot;')
+    if '\t' in s: s = s.replace('\t', '&#x9;')
+    if '\n' in s: s = s.replace('\n', '&#xA;')
+    if '\r' in s: s = s.replace('\r', '&#xD;')
+    return s
+
+def _ns_key(item):
+    '''Order of namespace declarations, default namespace first.'''
+    return (item[0] != 'xmlns', item[0])
+
+def _attr_key(item):
+    '''Order of attributes, (namespaceURI, localName), no namespace first.'''
+    (nsuri, localName) = item[0]
+    return (nsuri is not None, nsuri or '', localName)
+
+
+class _Text:
+    '''Character data.'''
+    __slots__ = ('data', 'parentNode')
+    nodeType = Node.TEXT_NODE
+
+    def __init__(self, data, parent):
+        self.data, self.parentNode = data, parent
+
+
+class _Element:
+    '''Element in the output tree.
+        Instance data:
+            nodeName -- qualified name
+            parentNode -- parent _Element, None for the document
+            childNodes -- list of _Element and _Text
+            xmlns -- namespace declarations, localName: (qname, value)
+            attrs -- attributes, (namespaceURI, localName): (qname, value)
+    '''
+    __slots__ = ('nodeName', 'parentNode', 'childNodes', 'xmlns', 'attrs')
+    nodeType = Node.ELEMENT_NODE
+
+    def __init__(self, qname, parent):
+        self.nodeName, self.parentNode = qname, parent
+        self.childNodes, self.xmlns, self.attrs = [], None, None
+
+
+class _Document(_Element):
+    __slots__ = ()
+    nodeType = Node.DOCUMENT_NODE
+
+
+class _Sink:
+    '''Collect output strings, pass them to write as encoded chunks.
+    '''
+    def __init__(self, write, chunksize, encoding='utf-8'):
+        self.write, self.chunksize, self.encoding = write, chunksize, encoding
+        self.data, self.size = [], 0
+
+    def __call__(self, s):
+        self.data.append(s)
+        self.size += len(s)
+        if self.size >= self.chunksize: self.flush()
+
+    def flush(self):
+        if self.data:
+            self.write(''.join(self.data).encode(self.encoding))
+            self.data, self.size = [], 0
+
+
+class StreamElementProxy(MessageInterface):
+    '''MessageInterface without a DOM.  Elements, attributes and namespace
+    declarations can be added until the message is written, so multi-ref
+    callbacks and late attributes (SOAP-ENC:root) work as they do with
+    ElementProxy, and the output is the same canonical XML.
+        Instance data:
+            node -- _Element or _Document
+    '''
+    chunksize = 16*1024
+
+    reserved_ns = {
+        'SOAP-ENV': SOAP.ENV,
+        'SOAP-ENC': SOAP.ENC,
+        'ZSI': ZSI_SCHEMA_URI,
+        'xsd': SCHEMA.XSD3,
+        'xsi': SCHEMA.XSI3,
+    }
+
+    def __init__(self, sw, node=None):
+        '''Initialize.
+            sw -- SoapWriter
+            node -- _Element
+        '''
+        MessageInterface.__init__(self, sw)
+        self._indx = 0
+        self.node = node
+
+    def __str__(self):
+        return self.toString()
+
+    def _getNode(self):
+        return self.node
+
+    def isFault(self):
+        return False
+
+    def isEmpty(self):
+        return not self.node
+
+    #############################################
+    # Namespaces
+    #############################################
+    def _findNS(self, localName, node=None):
+        '''Return the value of the nearest xmlns declaration with
+        localName ("xmlns" for the default namespace), or None.
+        '''
+        node = node or self.node
+        while node is not None:
+            if node.xmlns and localName in node.xmlns:
+                return node.xmlns[localName][1]
+            node = node.parentNode
+        return None
+
+    def _getPrefix(self, node, nsuri):
+        '''Same search order as ElementProxy._getPrefix.
+        Keyword arguments:
+            node -- _Element
+            nsuri -- namespace of element or attribute
+        '''
+        while node is not None:
+            if node.nodeType == Node.ELEMENT_NODE and \
+                nsuri == self._findNS('xmlns', node):
+                return None
+            if nsuri == XMLNS.XML:
+                return 'xml'
+            for localName,(qname,value) in list((node.xmlns or {}).items()):
+                if value == nsuri:
+                    return localName
+            node = node.parentNode
+        raise NamespaceError('namespaceURI "%s" is not defined' %nsuri)
+
+    def _getUniquePrefix(self):
+        while 1:
+            self._indx += 1
+            prefix = 'ns%d' %self._indx
+            if self._findNS(prefix) is None:
+                return prefix
+
+    def getPrefix(self, namespaceURI):
+        try:
+            prefix = self._getPrefix(self.node, namespaceURI)
+        except NamespaceError as ex:
+            prefix = self._getUniquePrefix()
+            self.setNamespaceAttribute(prefix, namespaceURI)
+        return prefix
+
+    def findNamespaceURI(self, qualifiedName):
+        prefix = qualifiedName.split(':', 1)
+        if len(prefix) == 1:
+            return self._findNS('xmlns')
+        return self.resolvePrefix(prefix[0])
+
+    def resolvePrefix(self, prefix):
+        value = self._findNS(prefix)
+        if value is None:
+            raise NamespaceError('Value for prefix %s not found.' %prefix)
+        return value
+
+    def setNamespaceAttribute(self, prefix, namespaceURI):
+        '''
+        Keyword arguments:
+            prefix -- xmlns prefix
+            namespaceURI -- value of prefix
+        '''
+        self._setAttributeNS(XMLNS.BASE, 'xmlns:%s' %prefix, namespaceURI)
+
+    #############################################
+    # Attributes
+    #############################################
+    def _setAttributeNS(self, namespaceURI, qualifiedName, value):
+        node = self.node
+        if node.nodeType != Node.ELEMENT_NODE:
+            raise NamespaceError('cannot set attribute "%s" on the document'
+                %qualifiedName)
+        localName = qualifiedName.split(':')[-1]
+        if namespaceURI == XMLNS.BASE:
+            if node.xmlns is None: node.xmlns = {}
+            node.xmlns[localName] = (qualifiedName, value)
+            return
+        if node.attrs is None: node.attrs = {}
+        node.attrs[(namespaceURI, localName)] = (qualifiedName, str(value))
+
+    def setAttributeNS(self, namespaceURI, localName, value):
+        '''
+        Keyword arguments:
+            namespaceURI -- namespace of attribute to create, None is for
+                attributes in no namespace.
+            localName -- local name of new attribute
+            value -- value of new attribute
+        '''
+        qualifiedName = localName
+        if namespaceURI:
+            prefix = self.getPrefix(namespaceURI)
+            if prefix:
+                qualifiedName = '%s:%s' %(prefix, localName)
+        self._setAttributeNS(namespaceURI, qualifiedName, value)
+
+    def setAttributeType(self, namespaceURI, localName):
+        '''set xsi:type
+        Keyword arguments:
+            namespaceURI -- namespace of attribute value
+            localName -- name of new attribute value
+        '''
+        value = localName
+        if namespaceURI:
+            value = '%s:%s' %(self.getPrefix(namespaceURI),localName)
+
+        xsi_prefix = self.getPrefix(SCHEMA.XSI3)
+        self._setAttributeNS(SCHEMA.XSI3, '%s:type' %xsi_prefix, value)
+
+    def hasAttribute(self, namespaceURI, localName):
+        return (namespaceURI, localName) in (self.node.attrs or {})
+
+    def getAttributeValue(self, namespaceURI, localName):
+        return (self.node.attrs or {}).get((namespaceURI, localName),
+            (None,None))[1]
+
+    #############################################
+    # Elements and text
+    #############################################
+    def createDocument(self, namespaceURI, localName, doctype=None):
+        '''If specified must be a SOAP envelope, else may contruct an empty
+        document.
+        '''
+        self.node = _Document(None, None)
+        if namespaceURI is localName is None:
+            return
+        if namespaceURI != SOAP.ENV:
+            raise KeyError('only support creation of document in %s' %SOAP.ENV)
+
+        self.node = self._append(_Element('SOAP-ENV:%s' %localName, self.node))
+        for prefix,nsuri in list(self.reserved_ns.items()):
+            self.setNamespaceAttribute(prefix, nsuri)
+
+    def _append(self, node):
+        self.node.childNodes.append(node)
+        return node
+
+    def createAppendElement(self, namespaceURI, localName, prefix=None):
+        '''Create a new element (namespaceURI,name), append it
+           to current node, and return the newly created node.
+        Keyword arguments:
+            namespaceURI -- namespace of element to create
+            localName -- local name of new element
+            prefix -- if namespaceURI is not defined, declare prefix.
+        '''
+        declare = False
+        qualifiedName = localName
+        if namespaceURI:
+            if self.node.nodeType == Node.ELEMENT_NODE:
+                prefix = self.getPrefix(namespaceURI)
+            else:
+                declare, prefix = True, prefix or self._getUniquePrefix()
+            if prefix:
+                qualifiedName = '%s:%s' %(prefix, localName)
+
+        node = StreamElementProxy(self.sw,
+            self._append(_Element(qualifiedName, self.node)))
+        if declare:
+            node.setNamespaceAttribute(prefix, namespaceURI)
+        return node
+
+    def createAppendTextNode(self, pyobj):
+        if type(pyobj) is not str:
+            raise TypeError('node contents must be a string')
+        return self._append(_Text(pyobj, self.node))
+
+    #############################################
+    # Output
+    #############################################
+    def canonicalize(self):
+        data = []
+        self._write(self.node, data.append)
+        return ''.join(data)
+
+    def toString(self):
+        return self.canonicalize()
+
+    def write_to(self, stream, chunksize=None):
+        '''Write the message to stream as UTF-8 encoded chunks.
+        Parameters:
+            stream -- file-like object with a write method taking bytes
+        Keyword arguments:
+            chunksize -- size of the chunks passed to stream.write
+        '''
+        sink = _Sink(stream.write, chunksize or self.chunksize)
+        self._write(self.node, sink)
+        sink.flush()
+
+    def _write(self, node, W):
+        '''Canonical XML of node, same rules as wstools.c14n for the
+        documents SoapWriter produces: namespace declarations not already
+        in scope, sorted, then sorted attributes, and no empty-element tags.
+        '''
+        if node is None: return
+        if node.nodeType == Node.DOCUMENT_NODE:
+            for c in node.childNodes:
+                self._write_element(c, W, {}, {})
+            return
+        if node.nodeType == Node.TEXT_NODE:
+            W(_escape_text(node.data))
+            return
+
+        # a subtree: collect what is in scope from the ancestors
+        chain, p = [], node.parentNode
+        while p is not None:
+            chain.insert(0, p)
+            p = p.parentNode
+        ns_local = {}
+        for p in chain:
+            for qname,value in (p.xmlns or {}).values():
+                ns_local[qname] = value
+        self._write_element(node, W, ns_local, {})
+
+    def _write_element(self, node, W, ns_local, ns_rendered):
+        if node.nodeType == Node.TEXT_NODE:
+            W(_escape_text(node.data))
+            return
+
+        W('<'); W(node.nodeName)
+        if node.xmlns:
+            ns_local = ns_local.copy()
+            for qname,value in node.xmlns.values():
+                ns_local[qname] = value
+            render = []
+            for n,v in ns_local.items():
+                if n == 'xmlns' and v in (XMLNS.BASE, '') and \
+                    ns_rendered.get('xmlns') in (XMLNS.BASE, '', None):
+                    continue
+                if n in ('xmlns:xml', 'xml') and v == XMLNS.XML:
+                    continue
+                if n not in ns_rendered or ns_rendered[n] != v:
+                    render.append((n, v))
+            if render:
+                ns_rendered = ns_rendered.copy()
+                for n,v in sorted(render, key=_ns_key):
+                    W(' %s="%s"' %(n, _escape_attr(v)))
+                    ns_rendered[n] = v
+        if node.attrs:
+            for key,(qname,value) in sorted(node.attrs.items(), key=_attr_key):
+                W(' %s="%s"' %(qname, _escape_attr(value)))
+        W('>')
+
+        for c in node.childNodes:
+            self._write_element(c, W, ns_local, ns_rendered)
+        W('</'); W(node.nodeName); W('>')
+
+
+if __name__ == '__main__': print(_copyright)
@@ -0,0 +1,272 @@
+#! /usr/bin/env python
+# $Header$
+'''Worker pools for the HTTP servers of dispatch and ServiceContainer:
+a bounded pool of threads, and pre-forked processes sharing a listening
+socket.  Workers can be replaced after a number of requests, to contain
+leaks, and are restarted or stopped gracefully on signals.
+'''
+
+from .ZSI import _copyright
+from .ZSI.wstools.logging import getLogger as _GetLogger
+import os, queue, select, signal, sys, threading, time, traceback
+
+_RECYCLE = object()
+
+
+class ThreadPoolMixIn:
+    '''Mix-in class for socketserver servers, requests are handled by a
+    fixed pool of threads instead of a thread per request (ThreadingMixIn).
+    Accepting blocks while queue_size requests wait for a thread, further
+    clients wait in the listen backlog.
+
+    Class data (set on the class or the server instance):
+        threads -- number of worker threads
+        queue_size -- accepted requests waiting for a thread, default is
+            the number of threads.
+        max_requests -- requests a thread handles before it is replaced,
+            0 for no limit.
+        keep_alive -- keep HTTP/1.1 connections open between requests,
+            an idle connection holds its thread until the handler timeout.
+    '''
+    threads = 10
+    queue_size = 0
+    max_requests = 0
+    keep_alive = True
+    logger = _GetLogger('ZSI.workers.ThreadPoolMixIn')
+    _pool = None
+
+    def process_request(self, request, client_address):
+        '''Queue the request for a worker thread.
+        '''
+        if self._pool is None:
+            self._start()
+        self._queue.put((request, client_address))
+
+    def _start(self):
+        self._queue = queue.Queue(self.queue_size or self.threads)
+        self._lock = threading.Lock()
+        self._pool, self._generation, self._closing = set(), 0, False
+        for i in range(self.threads):
+            self._spawn()
+
+    def _spawn(self):
+        if self._closing: return
+        t = threading.Thread(target=self._work, args=(self._generation,),
+                             name='ZSI worker')
+        t.daemon = True
+        with self._lock:
+            self._pool.add(t)
+        t.start()
+
+    def _work(self, generation):
+        handled = 0
+        try:
+            while 1:
+                item = self._queue.get()
+                if item is None:
+                    return
+                if item is not _RECYCLE:
+                    request, client_address = item
+                    try:
+                        self.finish_request(request, client_address)
+                    except Exception:
+                        self.handle_error(request, client_address)
+                    finally:
+                        self.shutdown_request(request)
+                    handled += 1
+                if generation != self._generation or \
+                (self.max_requests and handled >= self.max_requests):
+                    self.logger.debug('replace worker after %d requests', handled)
+                    self._spawn()
+                    return
+        finally:
+            with self._lock:
+                self._pool.discard(threading.current_thread())
+
+    def recycle(self):
+        '''Replace the worker threads, each once it is done with the
+        request it is processing.
+        '''
+        if self._pool is None: return
+        self._generation += 1
+        for i in range(self.threads):
+            try:
+                self._queue.put_nowait(_RECYCLE)
+            except queue.Full:
+                # busy threads check their generation after the request
+                break
+
+    def server_close(self):
+        '''Close the listening socket, wait for the worker threads to
+        finish the requests accepted.
+        '''
+        super().server_close()
+        if self._pool is None: return
+        self._closing = True
+        with self._lock:
+            pool = list(self._pool)
+        for t in pool:
+            self._queue.put(None)
+        for t in pool:
+            t.join()
+
+
+class PreForkServer:
+    '''Serve a socketserver server from worker processes forked after it
+    is bound, the processes share its listening socket.  Exited workers are
+    replaced.  SIGHUP restarts the workers gracefully, SIGTERM and SIGINT
+    stop them after the requests in process.
+
+    Instance data:
+        server -- bound server
+        processes -- number of worker processes
+        max_requests -- requests a process handles before it is replaced,
+            0 for no limit.
+        children -- pids of the worker processes
+    '''
+    poll = 0.5
+    logger = _GetLogger('ZSI.workers.PreForkServer')
+
+    def __init__(self, server, processes=4, max_requests=0):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('pre-fork workers need os.fork')
+        self.server = server
+        self.processes = processes
+        self.max_requests = max_requests
+        self.children = set()
+        self._stop = self._restart = False
+
+    def serve_forever(self):
+        '''Run the workers until SIGTERM or SIGINT.
+        '''
+        handlers = _SetSignals(self._on_stop, self._on_restart)
+        try:
+            while not self._stop:
+                while len(self.children) < self.processes and not self._stop:
+                    self._fork()
+                if self._restart:
+                    self._restart = False
+                    self.logger.debug('restart %d workers', len(self.children))
+                    self._kill(signal.SIGTERM)
+                self._reap()
+                time.sleep(self.poll)
+            self._kill(signal.SIGTERM)
+            while self.children:
+                self._reap(block=True)
+        finally:
+            _RestoreSignals(handlers)
+            self.server.server_close()
+
+    def _on_stop(self, signum, frame):
+        self._stop = True
+
+    def _on_restart(self, signum, frame):
+        self._restart = True
+
+    def _kill(self, signum):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                self.children.discard(pid)
+
+    def _reap(self, block=False):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, (not block and os.WNOHANG) or 0)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0: return
+            self.children.discard(pid)
+            if block: return
+
+    def _fork(self):
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return
+        status = 0
+        try:
+            self._work()
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _work(self):
+        '''Serve in a worker process, until stopped or max_requests.
+        '''
+        stopping = []
+        _SetSignals(lambda *args: stopping.append(args[0]))
+        server, handled = self.server, 0
+        server.timeout = self.poll
+        # the workers race for connections, the losers must not block
+        server.socket.setblocking(False)
+
+        # count the connections accepted, not the races lost
+        process = server.process_request
+        def process_request(request, client_address):
+            nonlocal handled
+            handled += 1
+            process(request, client_address)
+        server.process_request = process_request
+        try:
+            while not stopping:
+                if self.max_requests and handled >= self.max_requests:
+                    break
+                if select.select([server], [], [], self.poll)[0]:
+                    server.handle_request()
+        finally:
+            server.server_close()
+
+
+def _SetSignals(stop, restart=None):
+    '''Install handlers of SIGTERM, SIGINT (stop) and SIGHUP (restart,
+    default stop).  Returns the previous handlers for _RestoreSignals.
+    '''
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+    handlers = { signal.SIGTERM:stop, signal.SIGINT:stop }
+    if hasattr(signal, 'SIGHUP'):
+        handlers[signal.SIGHUP] = restart or stop
+    return _RestoreSignals(handlers)
+
+
+def _RestoreSignals(handlers):
+    old = {}
+    for signum, handler in list(handlers.items()):
+        old[signum] = signal.signal(signum, handler)
+    return old
+
+
+def ServeForever(server, processes=0, max_requests=0):
+    '''Serve until SIGTERM or SIGINT, finishing the requests accepted.
+    server -- bound socketserver server
+    processes -- number of pre-forked worker processes, 0 serves in this
+        process.
+    max_requests -- requests a worker process handles before it is
+        replaced, see ThreadPoolMixIn for threads.
+    SIGHUP restarts the worker processes, or the threads of a
+    ThreadPoolMixIn server.
+    '''
+    if processes:
+        PreForkServer(server, processes, max_requests).serve_forever()
+        return
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+    def restart(signum, frame):
+        getattr(server, 'recycle', lambda: None)()
+    handlers = _SetSignals(stop, restart)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _RestoreSignals(handlers)
+        server.server_close()
+
+
+if __name__ == '__main__': print(_copyright)
@@ -5,9 +5,8 @@
 
 from .ZSI import _copyright, _get_idstr, ZSI_SCHEMA_URI
 from .ZSI import _backtrace, _stringtypes, _seqtypes
-from .ZSI.wstools.Utility import MessageInterface, ElementProxy
+from .ZSI.wstools.Utility import MessageInterface, ElementProxy, Canonicalize
 from .ZSI.wstools.Namespaces import XMLNS, SOAP, SCHEMA
-from .ZSI.wstools.c14n import Canonicalize
 import types
 
 _standard_ns = [ ('xml', XMLNS.XML), ('xmlns', XMLNS.BASE) ]
@@ -20,37 +19,106 @@ _reserved_ns = {
         'xsi': SCHEMA.BASE + '-instance',
 }
 
+_scalartypes = (type(None), bool, int, float, complex, str, bytes)
+_opaquetypes = (type, types.ModuleType, types.FunctionType, 
+                types.BuiltinFunctionType, types.MethodType)
+
+def _references(obj):
+    '''Return the objects obj refers to, for finding shared objects:
+    items of lists, tuples and dictionaries, and instance attributes.
+    '''
+    t = type(obj)
+    if t in _seqtypes:
+        return obj
+    if t is dict:
+        return list(obj.values())
+    if t in _scalartypes or isinstance(obj, _opaquetypes):
+        return ()
+    refs = []
+    d = getattr(obj, '__dict__', None)
+    if d is not None:
+        refs.extend([ v for k,v in list(d.items()) if k != 'typecode' ])
+    for k in getattr(t, '__slots__', ()):
+        if hasattr(obj, k): refs.append(getattr(obj, k))
+    return refs
+
+
 class SoapWriter:
     '''SOAP output formatter.
        Instance Data:
-           memo -- memory for id/href 
+           memo -- memory for id/href, id() of the objects written to
+               the objects.
+           shared -- with findshared, the id() of the objects referred 
+               to more than once.  None if every object may be shared.
            envelope -- add Envelope?
            encodingStyle -- 
            header -- add SOAP Header?
-           outputclass -- ElementProxy class.
+           outputclass -- ElementProxy class, or another MessageInterface
+               (streamwriter.StreamElementProxy writes without a DOM).
+           mtom -- with MTOM, binary values of at least this many bytes
+               are sent as XOP attachments; None for none.
+           parts -- list of the (Content-ID, value) of the attachments,
+               see mtom.Package.
     '''
 
     def __init__(self, envelope=True, encodingStyle=None, header=True, 
-    nsdict={}, outputclass=None, **kw):
+    nsdict={}, outputclass=None, findshared=False, mtom=None, **kw):
         '''Initialize.
+        findshared -- before serializing, find the objects referred to
+            more than once (by instance attributes, lists, tuples and 
+            dictionaries); only those are written once with id/href, the
+            others inline.
+        mtom -- size in bytes from which base64 values (and any binary
+            file) are written as MTOM/XOP attachments, 0 for all of them.
         '''
         outputclass = outputclass or ElementProxy
         if not issubclass(outputclass, MessageInterface):
             raise TypeError('outputclass must subclass MessageInterface')
 
         self.dom, self.memo, self.nsdict= \
-            outputclass(self), [], nsdict
+            outputclass(self), {}, nsdict
+        self.shared = self._seen = None
+        if findshared:
+            self.shared, self._seen = set(), set()
         self.envelope = envelope
         self.encodingStyle = encodingStyle
         self.header = header
         self.body = None
         self.callbacks = []
         self.closed = False
+        self.mtom, self.parts = mtom, []
 
     def __str__(self):
         self.close()
         return str(self.dom)
 
+    def write_to(self, stream):
+        '''Close off the message and write it to stream, UTF-8 encoded.
+        An outputclass with a write_to method (streamwriter.StreamElementProxy)
+        writes it in chunks, without building the whole string.
+
+        Parameters:
+            stream -- file-like object with a write method taking bytes
+        '''
+        self.close()
+        write_to = getattr(self.dom, 'write_to', None)
+        if write_to is not None:
+            write_to(stream)
+            return
+        stream.write(str(self.dom).encode('utf-8'))
+
+    def AddAttachment(self, pyobj):
+        '''Add a binary attachment, return its Content-ID.
+        Parameters:
+            pyobj -- bytes-like object or binary file that can seek
+        '''
+        if not self.parts:
+            import uuid
+            self._cid = uuid.uuid4().hex
+        cid = '%d.%s@zsi' %(len(self.parts) + 1, self._cid)
+        self.parts.append((cid, pyobj))
+        return cid
+
     def getSOAPHeader(self):
         if self.header in (True, False):
             return None
@@ -66,6 +134,8 @@ class SoapWriter:
             typecode -- default typecode
         '''
         kw['unique'] = True
+        if self._seen is not None and id(pyobj) not in self._seen:
+            self.FindShared(pyobj)
         soap_env = _reserved_ns['SOAP-ENV']
         #header = self.dom.getElement(soap_env, 'Header')
         header = self._header
@@ -89,6 +159,8 @@ class SoapWriter:
               instance must specify the typecode attribute.
         '''
         self.body = None
+        if self._seen is not None:
+            self.FindShared(pyobj, *header_pyobjs)
         if self.envelope: 
             soap_env = _reserved_ns['SOAP-ENV']
             self.dom.createDocument(soap_env, 'Envelope')
@@ -153,21 +225,39 @@ class SoapWriter:
 
     def Known(self, obj):
         '''Seen this object (known by its id()?  Return 1 if so,
-        otherwise add it to our memory and return 0.
+        otherwise add it to our memory and return 0.  The memory keeps
+        obj alive, so its id() is not reused.
         '''
-        obj = _get_idstr(obj)
-        if obj in self.memo: return 1
-        self.memo.append(obj)
+        key = id(obj)
+        if key in self.memo: return 1
+        self.memo[key] = obj
         return 0
 
     def Forget(self, obj):
         '''Forget we've seen this object.
         '''
-        obj = _get_idstr(obj)
-        try:
-            self.memo.remove(obj)
-        except ValueError:
-            pass
+        self.memo.pop(id(obj), None)
+
+    def Shared(self, obj):
+        '''May this object be written more than once?  Objects that are 
+        not shared need no id/href.
+        '''
+        return self.shared is None or id(obj) in self.shared
+
+    def FindShared(self, *pyobjs):
+        '''Walk the objects reachable from pyobjs, those reached more 
+        than once (here or in an earlier call) are added to shared.
+        '''
+        seen, shared = self._seen, self.shared
+        todo = list(pyobjs)
+        while todo:
+            obj = todo.pop()
+            key = id(obj)
+            if key in seen:
+                shared.add(key)
+                continue
+            seen.add(key)
+            todo.extend(_references(obj))
 
     def Backtrace(self, elt):
         '''Return a human-readable "backtrace" from the document root to
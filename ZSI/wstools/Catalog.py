@@ -0,0 +1,315 @@
+#! /usr/bin/env python
+"""XML catalog resolution of the documents imported by WSDL and schemas.
+
+A Catalog maps the urls (and the namespaces of schema imports without a
+schemaLocation) to local files or to documents held in memory, from
+OASIS XML Catalog files or entries added by the program.  A Resolver
+opens what DOM.loadFromURL reads while it is in use (see WSDLReader and
+SchemaReader resolver, or use it in a with statement): from the catalog
+when it has an entry, from the url otherwise.  A document is read once
+per load however many times it is imported, and the imports found in a
+document are fetched in parallel, by a few threads, before the parser
+asks for them.
+"""
+
+ident = "$Id$"
+
+import os, threading, urllib.request, urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from os.path import isfile
+from xml.parsers import expat
+from .Utility import DOM, basejoin
+
+OASIS_CATALOG = 'urn:oasis:names:tc:entity:xmlns:xml:catalog'
+XML_BASE = ('http://www.w3.org/XML/1998/namespace', 'base')
+
+_active = threading.local()
+
+
+class Catalog:
+    """Map of urls and namespaces to other urls, local files usually, and
+       to documents held in memory.
+
+       Instance data:
+           uris -- dict of name (url or namespace) to url
+           rewrites -- list of (start of url, prefix replacing it)
+           suffixes -- list of (end of url, url)
+           documents -- dict of url to the bytes of the document
+           catalogs -- the next catalogs, tried when this one has no entry
+    """
+
+    def __init__(self, *files):
+        """files -- OASIS XML Catalog files to load
+        """
+        self.uris, self.documents = {}, {}
+        self.rewrites, self.suffixes, self.catalogs = [], [], []
+        for name in files:
+            self.load(name)
+
+    def load(self, name):
+        """Add the entries of the OASIS XML Catalog file name: uri, system,
+           rewriteURI, rewriteSystem, uriSuffix, systemSuffix, group and
+           nextCatalog; the others are ignored.
+        """
+        f = open(name, 'rb')
+        try:
+            document = DOM.loadDocument(f)
+        finally:
+            f.close()
+        base = 'file:' + urllib.request.pathname2url(os.path.abspath(name))
+        self._load(document.documentElement, base)
+        document.unlink()
+
+    def _load(self, element, base):
+        if element.hasAttributeNS(*XML_BASE):
+            base = basejoin(base, element.getAttributeNS(*XML_BASE))
+        for node in element.childNodes:
+            if node.nodeType != node.ELEMENT_NODE or \
+               node.namespaceURI != OASIS_CATALOG:
+                continue
+            get = node.getAttribute
+            name = node.localName
+            if name == 'group':
+                self._load(node, base)
+            elif name in ('uri', 'system'):
+                self.addURI(get(name == 'uri' and 'name' or 'systemId'),
+                            basejoin(base, get('uri')))
+            elif name in ('rewriteURI', 'rewriteSystem'):
+                start = name == 'rewriteURI' and 'uriStartString' or \
+                    'systemIdStartString'
+                self.addRewrite(get(start), basejoin(base, get('rewritePrefix')))
+            elif name in ('uriSuffix', 'systemSuffix'):
+                self.suffixes.append((get(name), basejoin(base, get('uri'))))
+            elif name == 'nextCatalog':
+                self.catalogs.append(Catalog(_filename(
+                    basejoin(base, get('catalog')))))
+
+    def addURI(self, name, uri):
+        """Map name, a url or a namespace, to uri.
+        """
+        self.uris[name] = uri
+
+    def addRewrite(self, start, prefix):
+        """Map the urls beginning with start to the same urls beginning
+           with prefix instead.
+        """
+        self.rewrites.append((start, prefix))
+
+    def addDocument(self, uri, data):
+        """Hold the document of uri in memory, data is its bytes or str.
+        """
+        if type(data) is str:
+            data = data.encode('utf-8')
+        self.documents[uri] = data
+
+    def resolve(self, uri):
+        """Return what the catalog maps uri to, None if it has no entry.
+        """
+        if uri in self.uris:
+            return self.uris[uri]
+        match = None
+        for start, prefix in self.rewrites:
+            if uri.startswith(start) and (match is None or
+                                          len(start) > len(match[0])):
+                match = (start, prefix)
+        if match is not None:
+            return match[1] + uri[len(match[0]):]
+        for end, target in self.suffixes:
+            if uri.endswith(end) and (match is None or len(end) > len(match[0])):
+                match = (end, target)
+        if match is not None:
+            return match[1]
+        for catalog in self.catalogs:
+            target = catalog.resolve(uri)
+            if target is not None:
+                return target
+        return None
+
+    def getDocument(self, uri):
+        """Return the bytes of uri held in memory, None if there are none.
+        """
+        data = self.documents.get(uri)
+        if data is None:
+            for catalog in self.catalogs:
+                data = catalog.getDocument(uri)
+                if data is not None:
+                    break
+        return data
+
+
+def _filename(url):
+    """Return the file name of a url, the url itself if it is not local.
+    """
+    scheme, netloc, path = urllib.parse.urlparse(url)[:3]
+    if scheme == 'file':
+        return urllib.request.url2pathname(path)
+    return url
+
+def _references(data, url):
+    """Return the urls of the documents imported or included by the
+       document data read from url.
+    """
+    urls = []
+    def start(name, attrs):
+        if name.split(':')[-1] in ('import', 'include', 'redefine'):
+            location = attrs.get('schemaLocation') or attrs.get('location')
+            if location:
+                urls.append(basejoin(url, location))
+    p = expat.ParserCreate()
+    p.StartElementHandler = start
+    try:
+        p.Parse(data, True)
+    except expat.ExpatError:
+        pass
+    return urls
+
+
+class Resolver:
+    """Opener of the documents read by DOM.loadFromURL, see the module
+       documentation.  The documents read are shared until the end of
+       the outermost with statement (or load of a reader).
+
+       Instance data:
+           catalog -- the Catalog, or None
+           workers -- number of threads fetching documents
+           timeout -- seconds to wait for an http server
+           fetches -- documents read from their url (not the catalog)
+           reused -- documents read again and taken from the memory
+    """
+
+    def __init__(self, catalog=None, workers=4, timeout=20):
+        self.catalog, self.workers, self.timeout = catalog, workers, timeout
+        self.fetches = self.reused = 0
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._pool = None
+        self._depth = 0
+
+    def __enter__(self):
+        stack = _active.__dict__.setdefault('stack', [])
+        stack.append((self, DOM.setURLOpener(self)))
+        self._lock.acquire()
+        self._depth += 1
+        self._lock.release()
+        return self
+
+    def __exit__(self, *exc):
+        resolver, previous = _active.stack.pop()
+        DOM.setURLOpener(previous)
+        self._lock.acquire()
+        try:
+            self._depth -= 1
+            if self._depth == 0:
+                for future in self._documents.values():
+                    future.cancel()
+                self._documents = {}
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """Stop the threads.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def __call__(self, url):
+        """Return a file object of the document of url.
+        """
+        return BytesIO(self.fetch(url))
+
+    def resolve(self, url):
+        """Return the url url is read from.
+        """
+        if self.catalog is not None:
+            return self.catalog.resolve(url) or url
+        return url
+
+    def resolveNamespace(self, namespace):
+        """Return the location of the schema of namespace, None if the
+           catalog does not know it.
+        """
+        if self.catalog is not None:
+            return self.catalog.resolve(namespace)
+        return None
+
+    def fetch(self, url):
+        """Return the bytes of the document of url, and start fetching
+           the documents it imports.
+        """
+        url = urllib.parse.urldefrag(url)[0]
+        self._lock.acquire()
+        try:
+            future = self._documents.get(url)
+            if future is None:
+                future = self._documents[url] = self._submit(url)
+            else:
+                self.reused += 1
+        finally:
+            self._lock.release()
+        data = future.result()
+        self.prefetch(_references(data, url))
+        return data
+
+    def prefetch(self, urls):
+        """Start fetching the documents of urls.
+        """
+        self._lock.acquire()
+        try:
+            for url in urls:
+                url = urllib.parse.urldefrag(url)[0]
+                if url not in self._documents:
+                    self._documents[url] = self._submit(url)
+        finally:
+            self._lock.release()
+
+    def _submit(self, url):
+        """Return a Future of the bytes of url, done already unless the
+           document is read from the network.
+        """
+        if self.catalog is not None:
+            data = self.catalog.getDocument(url)
+            if data is None:
+                data = self.catalog.getDocument(self.resolve(url))
+            if data is not None:
+                return _call(lambda: data)
+        target = self.resolve(url)
+        self.fetches += 1
+        path = _filename(target)
+        if isfile(path):
+            return _call(self._read, path)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers)
+        return self._pool.submit(self._read, target)
+
+    def _read(self, target):
+        if isfile(target):
+            f = open(target, 'rb')
+        else:
+            f = urllib.request.urlopen(target, timeout=self.timeout)
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+
+def _call(function, *args):
+    """Return a Future done with the result of function(*args).
+    """
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as ex:
+        future.set_exception(ex)
+    return future
+
+
+def ResolveNamespace(namespace):
+    """Return the location of the schema of namespace given by the
+       Resolver in use in this thread, None if there is none.
+    """
+    stack = getattr(_active, 'stack', None)
+    if stack and namespace:
+        return stack[-1][0].resolveNamespace(namespace)
+    return None
@@ -0,0 +1,272 @@
+#! /usr/bin/env python
+"""Disk cache of loaded WSDL and XMLSchema instances.
+
+A WSDLReader or SchemaReader made with cache=ModelCache(...) loads a url
+through the cache.  The documents read while loading (the WSDL and what
+it imports) are recorded with their validators: mtime and size of a
+file, ETag and Last-Modified of an http resource, and the SHA-256 of the
+content.  The loaded object is pickled to a file named by the hash of
+those contents, so the same documents are parsed once whatever url they
+are reached by.  A later load checks the validators, with a stat or a
+conditional GET, and unpickles the object if the contents are the same.
+An offline cache checks nothing: it returns what it has, and raises
+CacheError for a url it has not seen.
+
+Pickles are not safe to load from an untrusted source, the cache
+directory should be writable only by its user.
+"""
+
+ident = "$Id$"
+
+import hashlib, json, os, pickle, sys, tempfile, warnings, weakref
+import urllib.request, urllib.error, urllib.parse
+from io import BytesIO
+from os.path import isfile
+from .Utility import DOM
+
+# bumped when the pickled object model changes
+FORMAT = 1
+
+
+class CacheError(Exception):
+    """Raised by an offline cache for a url it does not hold."""
+
+
+class _Gone:
+    pass
+
+def _deadref():
+    return weakref.ref(_Gone())
+
+
+class _Pickler(pickle.Pickler):
+    """Pickles the weak references (the wstools objects refer to their
+       parents with them) as references to the same object.
+    """
+    def reducer_override(self, obj):
+        if type(obj) is weakref.ref:
+            target = obj()
+            if target is None:
+                return _deadref, ()
+            return weakref.ref, (target,)
+        return NotImplemented
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _localpath(url):
+    """Return the file name of url, None if it is not a local file."""
+    if isfile(url):
+        return url
+    scheme, netloc, path = urllib.parse.urlparse(url)[:3]
+    if scheme == 'file':
+        return urllib.request.url2pathname(path)
+    return None
+
+
+class ModelCache:
+    """Content addressed disk cache of the objects loaded from urls, see
+       the module documentation.
+
+       Instance data:
+           directory -- where the entries are kept
+           offline -- if true the sources are never checked
+           timeout -- seconds to wait for an http server
+           hits -- loads answered from the cache
+           misses -- loads that parsed the documents
+    """
+
+    def __init__(self, directory=None, offline=False, timeout=20):
+        """directory -- defaults to ZSI/wsdl in the user cache directory
+           offline -- use the cached objects without checking the sources
+           timeout -- seconds to wait for an http server
+        """
+        if directory is None:
+            directory = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                os.path.join(os.path.expanduser('~'), '.cache'), 'ZSI', 'wsdl')
+        self.directory, self.offline, self.timeout = directory, offline, timeout
+        self.hits = self.misses = 0
+
+    def load(self, url, loader, kind='wsdl'):
+        """Return loader(url), from the cache if the documents it reads
+           are unchanged since it was stored.
+           url -- url of the document
+           loader -- function loading url, it must read the documents
+               with DOM.loadFromURL
+           kind -- tells apart the objects loaded from the same url
+
+           The documents are read through the opener set with
+           DOM.setURLOpener when there is one (a Catalog.Resolver), and
+           then validated by their content only.
+        """
+        opener = DOM.getURLOpener()
+        index = os.path.join(self.directory, _digest('%s %s' %(kind, url)))
+        fetched = {}
+        entry = self._read(index + '.json', json.loads)
+        if entry is not None and entry.get('format') == FORMAT:
+            sources, changed = entry['sources'], False
+            if not self.offline:
+                sources, changed = self._check(sources, fetched, opener)
+            obj = self._read(self._objectPath(sources), pickle.loads)
+            if obj is not None:
+                self.hits += 1
+                if changed:
+                    entry['sources'] = sources
+                    self._store(index + '.json', entry)
+                return obj
+        if self.offline:
+            raise CacheError('%s is not in the cache %s' %(url, self.directory))
+
+        sources = []
+        DOM.setURLOpener(self._recorder(sources, fetched, opener))
+        try:
+            obj = loader(url)
+        finally:
+            DOM.setURLOpener(opener)
+        self.misses += 1
+        self._store(self._objectPath(sources), obj)
+        self._store(index + '.json',
+            {'format': FORMAT, 'url': url, 'sources': sources})
+        return obj
+
+    def _objectPath(self, sources):
+        """Return the file of the object made from the contents of sources.
+        """
+        key = ['%d %d.%d' %((FORMAT,) + tuple(sys.version_info[:2]))]
+        for source in sources:
+            key.append('%s %s' %(source['url'], source['sha256']))
+        return os.path.join(self.directory, _digest('\n'.join(key)) + '.pickle')
+
+    def _check(self, sources, fetched, opener=None):
+        """Return (sources, changed), the sources with current validators
+           and whether any validator changed.  The contents fetched to
+           tell are kept in fetched, by url.
+        """
+        checked, changed = [], False
+        for source in sources:
+            url = source['url']
+            path = opener is None and _localpath(url)
+            if path:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    st = None
+                if st is not None and \
+                   [st.st_mtime_ns, st.st_size] == [source.get('mtime'), source.get('size')]:
+                    checked.append(source)
+                    continue
+            try:
+                record, data = self._fetch(url, source, opener)
+            except (OSError, ValueError):
+                # gone: no cached object matches, the loader reports it
+                record, data = dict(url=url, sha256=None), None
+            if record is None or record == source:
+                checked.append(source)
+                continue
+            if data is not None:
+                fetched[url] = (record, data)
+            checked.append(record)
+            changed = True
+        return checked, changed
+
+    def _fetch(self, url, source=None, opener=None):
+        """Return (record, content) of url, (None, None) if it is not
+           modified since source was recorded.  With an opener only the
+           content is recorded.
+        """
+        path = _localpath(url)
+        if opener is not None:
+            f = opener(url)
+            try:
+                data = f.read()
+            finally:
+                f.close()
+            record = {}
+        elif path is not None:
+            f = open(path, 'rb')
+            try:
+                st = os.fstat(f.fileno())
+                data = f.read()
+            finally:
+                f.close()
+            record = {'mtime': st.st_mtime_ns, 'size': st.st_size}
+        else:
+            request = urllib.request.Request(url)
+            if source and source.get('etag'):
+                request.add_header('If-None-Match', source['etag'])
+            if source and source.get('modified'):
+                request.add_header('If-Modified-Since', source['modified'])
+            try:
+                response = urllib.request.urlopen(request, timeout=self.timeout)
+            except urllib.error.HTTPError as ex:
+                if ex.code == 304:
+                    return None, None
+                raise
+            try:
+                data = response.read()
+                record = {'etag': response.headers.get('ETag'),
+                          'modified': response.headers.get('Last-Modified')}
+            finally:
+                response.close()
+        record['url'] = url
+        record['sha256'] = hashlib.sha256(data).hexdigest()
+        return record, data
+
+    def _recorder(self, sources, fetched, previous=None):
+        """Return the opener for DOM.loadFromURL recording in sources
+           the documents read (through the previous opener if any).
+        """
+        def opener(url):
+            if url in fetched:
+                record, data = fetched.pop(url)
+            else:
+                record, data = self._fetch(url, None, previous)
+            sources.append(record)
+            return BytesIO(data)
+        return opener
+
+    def _read(self, name, loads):
+        """Return loads(content of the file name), None if it is missing
+           or can not be read.
+        """
+        try:
+            f = open(name, 'rb')
+        except OSError:
+            return None
+        try:
+            try:
+                return loads(f.read())
+            except Exception as ex:
+                warnings.warn('Ignoring cache entry %s: %s' %(name, ex))
+                return None
+        finally:
+            f.close()
+
+    def _store(self, name, obj):
+        """Write obj to the file name, replacing it atomically.  An object
+           that can not be pickled is left out of the cache.
+        """
+        try:
+            if name.endswith('.json'):
+                data = json.dumps(obj).encode('utf-8')
+            else:
+                f = BytesIO()
+                _Pickler(f, pickle.HIGHEST_PROTOCOL).dump(obj)
+                data = f.getvalue()
+        except (pickle.PicklingError, TypeError, AttributeError,
+                RecursionError) as ex:
+            warnings.warn('Not caching %s: %s' %(name, ex))
+            return
+        os.makedirs(self.directory, 0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.replace(tmp, name)
+        except:
+            os.unlink(tmp)
+            raise
@@ -185,6 +185,10 @@ class BEA:
     SECCONV = "http://schemas.xmlsoap.org/ws/2004/04/sc"
     SCTOKEN = "http://schemas.xmlsoap.org/ws/2004/04/security/sc/sct"
 
+class XOP:
+    INCLUDE = "http://www.w3.org/2004/08/xop/include"
+    XMIME   = "http://www.w3.org/2005/05/xmlmime"
+
 class GLOBUS:
     SECCONV = "http://wsrf.globus.org/core/2004/07/security/secconv"
     CORE    = "http://www.globus.org/namespaces/2004/06/core"
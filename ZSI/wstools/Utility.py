@@ -14,14 +14,13 @@
 
 ident = "$Id: Utility.py 1116 2006-01-24 20:51:57Z boverhof $"
 
-import sys, types, http.client, smtplib, urllib.request, urllib.parse, urllib.error, socket, weakref
+import sys, types, urllib.parse, weakref
+import threading
 from os.path import isfile
 from string import join, strip, split
 from UserDict import UserDict
 from io import StringIO
-from .TimeoutSocket import TimeoutSocket, TimeoutError
 from urllib.parse import urlparse
-from http.client import HTTPConnection, HTTPSConnection
 from exceptions import Exception
 try:
     from ZSI import _get_idstr
@@ -39,10 +38,16 @@ import xml.dom.minidom
 from xml.dom import Node
 
 from . import logging
-from .c14n import Canonicalize
 from .Namespaces import SCHEMA, SOAP, XMLNS, ZSI_SCHEMA_URI
 
 
+def Canonicalize(node, output=None, **kw):
+    '''c14n.Canonicalize, the module is imported on first use.
+    '''
+    from .c14n import Canonicalize
+    return Canonicalize(node, output, **kw)
+
+
 try:
     from xml.dom.ext import SplitQName
 except:
@@ -104,106 +109,20 @@ class Base:
         self.logger = logging.getLogger('%s-%s(%s)' %(module, self.__class__, _get_idstr(self)))
 
 
-class HTTPResponse:
-    """Captures the information in an HTTP response message."""
-
-    def __init__(self, response):
-        self.status = response.status
-        self.reason = response.reason
-        self.headers = response.msg
-        self.body = response.read() or None
-        response.close()
-
-class TimeoutHTTP(HTTPConnection):
-    """A custom http connection object that supports socket timeout."""
-    def __init__(self, host, port=None, timeout=20):
-        HTTPConnection.__init__(self, host, port)
-        self.timeout = timeout
-
-    def connect(self):
-        self.sock = TimeoutSocket(self.timeout)
-        self.sock.connect((self.host, self.port))
-
-
-class TimeoutHTTPS(HTTPSConnection):
-    """A custom https object that supports socket timeout. Note that this
-       is not really complete. The builtin SSL support in the Python socket
-       module requires a real socket (type) to be passed in to be hooked to
-       SSL. That means our fake socket won't work and our timeout hacks are
-       bypassed for send and recv calls. Since our hack _is_ in place at
-       connect() time, it should at least provide some timeout protection."""
-    def __init__(self, host, port=None, timeout=20, **kwargs):
-        HTTPSConnection.__init__(self, str(host), port, **kwargs)
-        self.timeout = timeout
-
-    def connect(self):
-        sock = TimeoutSocket(self.timeout)
-        sock.connect((self.host, self.port))
-        realsock = getattr(sock.sock, '_sock', sock.sock)
-        ssl = socket.ssl(realsock, self.key_file, self.cert_file)
-        self.sock = http.client.FakeSocket(sock, ssl)
+def urlopen(url, timeout=20, redirects=None):
+    """A minimal urlopen replacement hack that supports timeouts for http,
+       see TimeoutHTTP.urlopen (imported on first use)."""
+    from .TimeoutHTTP import urlopen
+    return urlopen(url, timeout, redirects)
 
 
-def urlopen(url, timeout=20, redirects=None):
-    """A minimal urlopen replacement hack that supports timeouts for http.
-       Note that this supports GET only."""
-    scheme, host, path, params, query, frag = urlparse(url)
-
-    if not scheme in ('http', 'https'):
-        return urllib.request.urlopen(url)
-    if params: path = '%s;%s' % (path, params)
-    if query:  path = '%s?%s' % (path, query)
-    if frag:   path = '%s#%s' % (path, frag)
-
-    if scheme == 'https':
-        # If ssl is not compiled into Python, you will not get an exception
-        # until a conn.endheaders() call.   We need to know sooner, so use
-        # getattr.
-        if hasattr(socket, 'ssl'):
-            conn = TimeoutHTTPS(host, None, timeout)
-        else:
-            import M2Crypto
-            ctx = M2Crypto.SSL.Context()
-            ctx.set_session_timeout(timeout)
-            conn = M2Crypto.httpslib.HTTPSConnection(host, ssl_context=ctx)
-            #conn.set_debuglevel(1)
-    else:
-        conn = TimeoutHTTP(host, None, timeout)
-
-    conn.putrequest('GET', path)
-    conn.putheader('Connection', 'close')
-    conn.endheaders()
-    response = None
-    while 1:
-        response = conn.getresponse()
-        if response.status != 100:
-            break
-        conn._HTTPConnection__state = http.client._CS_REQ_SENT
-        conn._HTTPConnection__response = None
-
-    status = response.status
-
-    # If we get an HTTP redirect, we will follow it automatically.
-    if status >= 300 and status < 400:
-        location = response.msg.getheader('location')
-        if location is not None:
-            response.close()
-            if redirects is not None and location in redirects:
-                raise RecursionError(
-                    'Circular HTTP redirection detected.'
-                    )
-            if redirects is None:
-                redirects = {}
-            redirects[location] = 1
-            return urlopen(location, timeout, redirects)
-        raise HTTPResponse(response)
-
-    if not (status >= 200 and status < 300):
-        raise HTTPResponse(response)
-
-    body = StringIO(response.read())
-    response.close()
-    return body
+def __getattr__(name):
+    # the http helpers are in TimeoutHTTP, which imports http.client
+    if name in ('HTTPResponse', 'TimeoutHTTP', 'TimeoutHTTPS',
+                'TimeoutSocket', 'TimeoutError'):
+        from . import TimeoutHTTP
+        return getattr(TimeoutHTTP, name)
+    raise AttributeError("module %r has no attribute %r" %(__name__, name))
 
 class DOM:
     """The DOM singleton defines a number of XML related constants and
@@ -629,9 +548,26 @@ class DOM:
            document instance."""
         return xml.dom.minidom.parse(data)
 
+    _opener = threading.local()
+
+    def setURLOpener(self, opener):
+        """Make loadFromURL, in this thread, call opener(url) for the file
+           object of a url (None restores the default), and return the
+           previous opener.  A cache uses this to see what is loaded."""
+        previous = getattr(self._opener, 'value', None)
+        self._opener.value = opener
+        return previous
+
+    def getURLOpener(self):
+        """Return the opener loadFromURL uses in this thread, or None."""
+        return getattr(self._opener, 'value', None)
+
     def loadFromURL(self, url):
         """Load an xml file from a URL and return a DOM document."""
-        if isfile(url) is True:
+        opener = self.getURLOpener()
+        if opener is not None:
+            file = opener(url)
+        elif isfile(url) is True:
             file = open(url, 'r')
         else:
             file = urlopen(url)
@@ -671,6 +607,9 @@ class MessageInterface:
     def Forget(self, obj):
         return self.sw().Forget(obj)
 
+    def Shared(self, obj):
+        return self.sw().Shared(obj)
+
     def canonicalize(self):
         '''canonicalize the underlying DOM, and return as string.
         '''
@@ -709,6 +648,91 @@ class MessageInterface:
         raise NotImplementedError('')
 
 
+class NamespaceScope:
+    """Namespace declarations in effect at an element, flattened from the
+    scope of its parent so that a lookup is a dictionary access.  Answers
+    the same as the DOM walks in ElementProxy._getPrefix, DOM.findNamespaceURI
+    and DOM.findDefaultNS.  Declarations and subtree moves made through
+    ElementProxy bump a per-document generation, a scope built for an older
+    generation is rebuilt from its parent when next used.
+        Instance data:
+            node -- DOM Element
+            parent -- scope of node.parentNode, or None
+            prefixes -- {namespaceURI: prefix}, None for the default namespace
+            uris -- {prefix: namespaceURI}, "xmlns" for the default namespace
+    """
+    generations = weakref.WeakKeyDictionary()
+
+    def __init__(self, node, parent=None):
+        self.node, self.parent = node, parent
+        self.parentNode, self.generation = node.parentNode, None
+        self.prefixes = self.uris = None
+
+    def invalidate(cls, node):
+        '''Invalidate the scopes of node's document.
+        '''
+        document = node.ownerDocument or node
+        cls.generations[document] = cls.generations.get(document, 0) + 1
+    invalidate = classmethod(invalidate)
+
+    def update(self):
+        '''Rebuild the maps if declarations changed since they were built.
+        '''
+        node = self.node
+        generation = self.generations.get(node.ownerDocument or node, 0)
+        if generation == self.generation:
+            return self
+
+        parent, pnode = self.parent, node.parentNode
+        if pnode is None or pnode.nodeType != Node.ELEMENT_NODE:
+            parent = None
+        elif parent is None or parent.node is not pnode:
+            parent = NamespaceScope(pnode)
+        self.parent, self.parentNode = parent, pnode
+
+        prefixes, uris = {}, {}
+        if parent is not None:
+            parent.update()
+            prefixes, uris = parent.prefixes, parent.uris
+        if hasattr(node, '__imported__'):
+            uris = {}
+
+        decls = [ (attr.localName, attr.value) for attr in
+            list(node.attributes.values()) if attr.namespaceURI == XMLNS.BASE ]
+        if decls:
+            prefixes, uris = prefixes.copy(), uris.copy()
+            for prefix,nsuri in reversed(decls):
+                prefixes[nsuri] = prefix
+            for prefix,nsuri in decls:
+                uris[prefix] = nsuri
+        if 'xmlns' in uris and prefixes.get(uris['xmlns'], 0) is not None:
+            if not decls: prefixes = prefixes.copy()
+            prefixes[uris['xmlns']] = None
+
+        self.prefixes, self.uris = prefixes, uris
+        self.generation = generation
+        return self
+
+    def getPrefix(self, nsuri):
+        '''Return the prefix of nsuri, None for the default namespace.
+        '''
+        self.update()
+        if nsuri == XMLNS.XML and self.uris.get('xmlns', 0) != nsuri:
+            return ElementProxy._xml_prefix
+        try:
+            return self.prefixes[nsuri]
+        except KeyError:
+            raise NamespaceError('namespaceURI "%s" is not defined' %nsuri)
+
+    def getNamespaceURI(self, prefix):
+        '''Return the namespace declared for prefix.
+        '''
+        try:
+            return self.update().uris[prefix]
+        except KeyError:
+            raise DOMException('Value for prefix %s not found.' % prefix)
+
+
 class ElementProxy(Base, MessageInterface):
     '''
     '''
@@ -750,6 +774,7 @@ class ElementProxy(Base, MessageInterface):
         MessageInterface.__init__(self, sw)
         Base.__init__(self)
         self._dom = DOM
+        self._scope = None
         self.node = None
         if type(message) in (bytes,str):
             self.loadFromString(message)
@@ -820,16 +845,35 @@ class ElementProxy(Base, MessageInterface):
     def _getOwnerDocument(self):
         return self.node.ownerDocument or self.node
 
+    def _getScope(self, node=None):
+        '''Return the NamespaceScope of node (default the current node),
+        None if node is not an element.
+        '''
+        node = node or self.node
+        if node is None or node.nodeType != Node.ELEMENT_NODE:
+            return None
+        if node is not self.node:
+            return NamespaceScope(node)
+        scope = self._scope
+        if scope is None or scope.node is not node or \
+            scope.parentNode is not node.parentNode:
+            scope = self._scope = NamespaceScope(node)
+        return scope
+
     def _getUniquePrefix(self):
         '''I guess we need to resolve all potential prefixes
         because when the current node is attached it copies the 
         namespaces into the parent node.
         '''
+        scope = self._getScope()
         while 1:
             self._indx += 1
             prefix = 'ns%d' %self._indx
             try:
-                self._dom.findNamespaceURI(prefix, self._getNode())
+                if scope is None:
+                    self._dom.findNamespaceURI(prefix, self._getNode())
+                else:
+                    scope.getNamespaceURI(prefix)
             except DOMException as ex:
                 break
         return prefix
@@ -840,6 +884,9 @@ class ElementProxy(Base, MessageInterface):
             node -- DOM Element Node
             nsuri -- namespace of attribute value
         '''
+        scope = self._getScope(node)
+        if scope is not None:
+            return scope.getPrefix(nsuri)
         try:
             if node and (node.nodeType == node.ELEMENT_NODE) and \
                 (nsuri == self._dom.findDefaultNS(node)):
@@ -866,6 +913,8 @@ class ElementProxy(Base, MessageInterface):
         if node is None:
             raise TypeError('node is None')
         self.node.appendChild(node)
+        if node.childNodes:
+            NamespaceScope.invalidate(node)
 
     def _insertBefore(self, newChild, refChild):
         '''
@@ -874,6 +923,8 @@ class ElementProxy(Base, MessageInterface):
             refChild -- DOM Element Node 
         '''
         self.node.insertBefore(newChild, refChild)
+        if newChild.childNodes:
+            NamespaceScope.invalidate(newChild)
 
     def _setAttributeNS(self, namespaceURI, qualifiedName, value):
         '''
@@ -883,6 +934,8 @@ class ElementProxy(Base, MessageInterface):
             value -- value of attribute
         '''
         self.node.setAttributeNS(namespaceURI, qualifiedName, value)
+        if namespaceURI == XMLNS.BASE:
+            NamespaceScope.invalidate(self.node)
 
     #############################################
     #General Methods
@@ -1050,6 +1103,7 @@ class ElementProxy(Base, MessageInterface):
         if declare:
             node._setAttributeNS(XMLNS.BASE, 'xmlns:%s' %prefix, namespaceURI)
         self._appendChild(node=node._getNode())
+        node._scope = NamespaceScope(node._getNode(), self._getScope())
         return node
 
     def createInsertBefore(self, namespaceURI, localName, refChild):
@@ -1110,6 +1164,9 @@ class ElementProxy(Base, MessageInterface):
         return self._dom.findNamespaceURI(parts[0], element)
 
     def resolvePrefix(self, prefix):
+        scope = self._getScope()
+        if scope is not None:
+            return scope.getNamespaceURI(prefix)
         element = self._getNode()
         return self._dom.findNamespaceURI(prefix, element)
 
@@ -1123,7 +1180,9 @@ class ElementProxy(Base, MessageInterface):
 
 class Collection(UserDict):
     """Helper class for maintaining ordered named collections."""
-    default = lambda self,k: k.name
+    def default(self, k):
+        return k.name
+
     def __init__(self, parent, key=None):
         UserDict.__init__(self)
         self.parent = weakref.ref(parent)
@@ -1152,7 +1211,9 @@ class Collection(UserDict):
 
 class CollectionNS(UserDict):
     """Helper class for maintaining ordered named collections."""
-    default = lambda self,k: k.name
+    def default(self, k):
+        return k.name
+
     def __init__(self, parent, key=None):
         UserDict.__init__(self)
         self.parent = weakref.ref(parent)
@@ -20,11 +20,26 @@ class WSDLReader:
     """A WSDLReader creates WSDL instances from urls and xml data."""
 
     # Custom subclasses of WSDLReader may wish to implement a caching
-    # strategy or other optimizations. Because application needs vary 
-    # so widely, we don't try to provide any caching by default.
+    # strategy or other optimizations.  A ModelCache given as cache
+    # keeps the WSDL instances loaded from urls on disk, a Resolver
+    # given as resolver opens the imported documents.
+    cache = resolver = None
+
+    def __init__(self, cache=None, resolver=None):
+        """cache -- ModelCache.ModelCache to load urls through, or None
+           resolver -- Catalog.Resolver opening the documents, or None
+        """
+        self.cache = cache
+        self.resolver = resolver
 
     def loadFromStream(self, stream, name=None):
         """Return a WSDL instance loaded from a stream object."""
+        if self.resolver is not None:
+            with self.resolver:
+                return self._loadFromStream(stream, name)
+        return self._loadFromStream(stream, name)
+
+    def _loadFromStream(self, stream, name=None):
         document = DOM.loadDocument(stream)
         wsdl = WSDL()
         if name:
@@ -36,6 +51,17 @@ class WSDLReader:
 
     def loadFromURL(self, url):
         """Return a WSDL instance loaded from the given url."""
+        if self.resolver is not None:
+            with self.resolver:
+                return self._cachedLoadFromURL(url)
+        return self._cachedLoadFromURL(url)
+
+    def _cachedLoadFromURL(self, url):
+        if self.cache is not None:
+            return self.cache.load(url, self._loadFromURL, 'wsdl')
+        return self._loadFromURL(url)
+
+    def _loadFromURL(self, url):
         document = DOM.loadFromURL(url)
         wsdl = WSDL()
         wsdl.location = url
@@ -413,7 +439,9 @@ class ImportElement(Element):
 
 
 class Types(Collection):
-    default = lambda self,k: k.targetNamespace
+    def default(self, k):
+        return k.targetNamespace
+
     def __init__(self, parent):
         Collection.__init__(self, parent)
         self.documentation = ''
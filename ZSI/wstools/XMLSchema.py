@@ -17,6 +17,7 @@ ident = "$Id: XMLSchema.py 1207 2006-05-04 18:34:01Z boverhof $"
 import types, weakref, sys, warnings
 from .Namespaces import SCHEMA, XMLNS
 from .Utility import DOM, DOMException, Collection, SplitQName, basejoin
+from .Catalog import ResolveNamespace
 from io import StringIO
 
 # If we have no threading, this should be a no-op
@@ -46,6 +47,17 @@ def GetSchema(component):
     while not isinstance(parent, XMLSchema):
         parent = parent._parent()
     return parent
+
+
+class _AttributeKey:
+    """Key function of a Collection, the value of an attribute of the
+       items (a class rather than a lambda so the collection pickles).
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, item):
+        return item.attributes[self.name]
     
 class SchemaReader:
     """A SchemaReader creates XMLSchema objects from urls and xml data.
@@ -53,11 +65,16 @@ class SchemaReader:
     
     namespaceToSchema = {}
     
-    def __init__(self, domReader=None, base_url=None):
+    def __init__(self, domReader=None, base_url=None, cache=None,
+                 resolver=None):
         """domReader -- class must implement DOMAdapterInterface
            base_url -- base url string
+           cache -- ModelCache.ModelCache to load urls through, or None
+           resolver -- Catalog.Resolver opening the documents, or None
         """
         self.__base_url = base_url
+        self.cache = cache
+        self.resolver = resolver
         self.__readerClass = domReader
         if not self.__readerClass:
             self.__readerClass = DOMAdapter
@@ -128,10 +145,21 @@ class SchemaReader:
            url -- URL to dereference
            schema -- Optional XMLSchema instance.
         """
-        reader = self.__readerClass()
         if self.__base_url:
             url = basejoin(self.__base_url,url)
-
+        if self.resolver is not None and schema is None:
+            with self.resolver:
+                return self.__cachedLoadFromURL(url)
+        return self.__cachedLoadFromURL(url, schema)
+
+    def __cachedLoadFromURL(self, url, schema=None):
+        if self.cache is not None and schema is None and \
+           not (self._includes or self._imports):
+            return self.cache.load(url, self.__loadFromURL, 'schema')
+        return self.__loadFromURL(url, schema)
+
+    def __loadFromURL(self, url, schema=None):
+        reader = self.__readerClass()
         reader.loadFromURL(url)
         schema = schema or XMLSchema()
         schema.setBaseUrl(url)
@@ -1009,9 +1037,9 @@ class XMLSchema(XMLSchemaComponent):
         self.__node = None
         self.targetNamespace = None
         XMLSchemaComponent.__init__(self, parent)
-        f = lambda k: k.attributes['name']
-        ns = lambda k: k.attributes['namespace']
-        sl = lambda k: k.attributes['schemaLocation']
+        f = _AttributeKey('name')
+        ns = _AttributeKey('namespace')
+        sl = _AttributeKey('schemaLocation')
         self.includes = Collection(self, key=sl)
         self.imports = Collection(self, key=ns)
         self.elements = Collection(self, key=f)
@@ -1307,7 +1335,8 @@ class XMLSchema(XMLSchemaComponent):
                     schema = self._parent()._parent().getImportSchemas().get(ns)
 
                 if not schema:
-                    url = self.attributes.get('schemaLocation')
+                    url = self.attributes.get('schemaLocation') or \
+                        ResolveNamespace(ns)
                     if not url:
                         raise SchemaError('namespace(%s) is unknown' %ns)
                     base_url = self._parent().getBaseUrl()
@@ -1326,9 +1355,11 @@ class XMLSchema(XMLSchemaComponent):
             reader._includes = self._parent().getIncludeSchemas()
             self._schema = schema
 
-            if 'schemaLocation' not in self.attributes:
+            location = self.attributes.get('schemaLocation') or \
+                ResolveNamespace(self.attributes.get('namespace'))
+            if not location:
                 raise SchemaError('no schemaLocation')
-            reader.loadFromURL(self.attributes.get('schemaLocation'), schema)
+            reader.loadFromURL(location, schema)
 
 
     class Include(XMLSchemaComponent):
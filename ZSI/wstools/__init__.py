@@ -1,9 +1,20 @@
 #! /usr/bin/env python
-"""WSDL parsing services package for Web Services for Python."""
+"""WSDL parsing services package for Web Services for Python.
+
+The modules are imported on first use: import ZSI needs Namespaces and
+Utility only, WSDLTools, XMLSchema and the rest are loaded when a WSDL
+or schema is read.
+"""
 
 ident = "$Id: __init__.py 840 2004-12-07 15:54:53Z blunck2 $"
 
-from . import WSDLTools
-from . import XMLname
-from . import logging
+import importlib
+
+# imported by the package before it was lazy, still attributes of it
+__all__ = ['WSDLTools', 'XMLname', 'logging']
+
 
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.%s' %name, __name__)
+    raise AttributeError("module %r has no attribute %r" %(__name__, name))
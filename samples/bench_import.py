@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+'''Import time of the ZSI package, from python -X importtime, against a
+budget: the median time of "import ZSI" in a fresh interpreter, and the
+modules it must not import (the subsystems loaded on first use).  The
+exit status is 1 when the budget is exceeded.
+
+    python bench_import.py [-n runs] [-b budget ms] [-m module] [-t top]
+
+The bytecode is written by a first run which is not counted, the time
+of the others depends on the machine: pass the budget measured on the
+machine the benchmark runs on.
+'''
+import sys, os, subprocess, optparse
+
+# not imported by "import ZSI"
+LAZY = [ 'ZSI.wstools.WSDLTools', 'ZSI.wstools.XMLSchema',
+         'ZSI.wstools.c14n', 'ZSI.wstools.Catalog', 'ZSI.wstools.TimeoutHTTP',
+         'ZSI.twisted', 'ZSI.generate', 'ZSI.ServiceProxy', 'http.client' ]
+
+
+def importtime(module):
+    '''Return {module: (self us, cumulative us)} of importing module in a
+    new interpreter.
+    '''
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    p = subprocess.run([ sys.executable, '-X', 'importtime', '-c',
+        'import %s' %module ], env=env, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    times = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+        except ValueError:
+            pass # the header
+    return times
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    return (values[(n-1)//2] + values[n//2]) / 2.0
+
+
+def main():
+    op = optparse.OptionParser(usage='%prog [options]')
+    op.add_option('-n', '--runs', type='int', default=15,
+                  help='interpreters started (default 15)')
+    op.add_option('-b', '--budget', type='float', default=60.0,
+                  help='median milliseconds allowed (default 60)')
+    op.add_option('-m', '--module', default='ZSI',
+                  help='module imported (default ZSI)')
+    op.add_option('-t', '--top', type='int', default=10,
+                  help='modules listed by their own time (default 10)')
+    options, args = op.parse_args()
+
+    importtime(options.module)
+    runs = [ importtime(options.module) for i in range(options.runs) ]
+    total = median([ r[options.module][1] for r in runs ]) / 1000.0
+    names = set()
+    for r in runs: names.update(r)
+    own = [ (median([ r.get(n, (0, 0))[0] for r in runs ]), n) for n in names ]
+    own.sort(reverse=True)
+
+    print('import %s: %.1f ms median of %d, %d modules' %(options.module,
+        total, options.runs, len(runs[-1])))
+    for t, name in own[:options.top]:
+        print('%10.2f ms  %s' %(t / 1000.0, name))
+
+    failed = False
+    if total > options.budget:
+        print('over budget: %.1f ms > %.1f ms' %(total, options.budget))
+        failed = True
+    loaded = [ n for n in LAZY if n in runs[-1] ]
+    if loaded:
+        print('imported but loaded on first use: %s' %', '.join(loaded))
+        failed = True
+    return failed and 1 or 0
+
+
+if __name__ == '__main__': sys.exit(main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''Compare the ZSI domreader with minidom: parse throughput and memory
+per element of a SOAP message, and ParsedSoap.Parse with each reader.
+
+    python bench_reader.py [number of items]
+'''
+import sys, time, tracemalloc
+from xml.dom import minidom
+from ZSI import ParsedSoap, TC
+from ZSI.domreader import Reader
+
+
+class MinidomReader:
+    def fromString(self, data):
+        return minidom.parseString(data)
+    def fromStream(self, stream):
+        return minidom.parse(stream)
+    def releaseNode(self, node):
+        node.unlink()
+
+
+def message(n):
+    items = ''.join([ '<item xsi:type="xsd:int">%d</item>' %i for i in range(n) ])
+    return ('<SOAP-ENV:Envelope '
+        'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" '
+        'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        '<SOAP-ENV:Body><p:values xmlns:p="urn:bench" '
+        'SOAP-ENC:arrayType="xsd:int[%d]">%s</p:values>'
+        '</SOAP-ENV:Body></SOAP-ENV:Envelope>' %(n, items))
+
+
+def best(func, repeat=5):
+    times = []
+    for i in range(repeat):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+def main():
+    n = int((sys.argv[1:] or [20000])[0])
+    data = message(n)
+    typecode = TC.Array('int', TC.Integer(), 'values')
+    elements = n + 4
+    print('%d elements, %d bytes' %(elements, len(data)))
+    print('%-10s %12s %12s %14s' %('reader', 'parse MB/s', 'bytes/elt',
+        'Parse() ms'))
+    for name, readerclass in [ ('minidom', MinidomReader),
+                               ('domreader', Reader) ]:
+        seconds = best(lambda: readerclass().fromString(data))
+        tracemalloc.start()
+        dom = readerclass().fromString(data)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del dom
+        parse = best(lambda: ParsedSoap(data,
+            readerclass=readerclass).Parse(typecode))
+        print('%-10s %12.1f %12d %14.1f' %(name, len(data)/seconds/1e6,
+            size/elements, parse*1000))
+
+
+if __name__ == '__main__': main()
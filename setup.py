@@ -33,6 +33,8 @@ except:
 _packages = [ "ZSI", "ZSI.generate", "ZSI.wstools"]
 if sys.version_info[0:2] >= (2, 4):
     _packages.append("ZSI.twisted")
+if sys.version_info[0:2] >= (3, 5):
+    _packages.append("ZSI.aio")
     
 
 # setuptools specific logic
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+import unittest, sys
+from io import BytesIO
+from ZSI import *
+from ZSI.TCcompound import ComplexType
+
+
+class Ref:
+    pass
+
+class t10TestCase(unittest.TestCase):
+    "Test streaming ParsedSoap against the DOM"
+
+    def setUp(self):
+        self.typecode = ComplexType(None, [ TC.Integer('a'), TC.String('b'),
+            TC.Integer('c', maxOccurs=10),
+            TC.Array(('', 'int'), TC.Integer(), 'arr'),
+            TC.Struct(Ref, [ TC.String('b'), TC.Integer('a') ], 'ref'), ],
+            'req')
+
+    def check_stream_parse(self):
+        d1 = ParsedSoap(text).Parse(self.typecode)
+        ps = ParsedSoap(BytesIO(text.encode('utf-8')), streaming=True)
+        self.assertEqual(len(ps.header_elements), 1)
+        self.assertEqual(ps.body_root.localName, 'req')
+        d2 = ps.Parse(self.typecode)
+        self.assertEqual(d1['ref'].__dict__, d2['ref'].__dict__)
+        del d1['ref'], d2['ref']
+        self.assertEqual(d1, d2)
+        self.assertEqual(d2['arr'], [3, 4])
+        self.assertEqual([ E.localName for E in ps.data_elements ], ['multi'])
+
+    def check_stream_data_elements_first(self):
+        ps = ParsedSoap(text, streaming=True)
+        self.assertEqual(len(ps.data_elements), 1)
+        self.assertEqual(ps.Parse(self.typecode)['c'], [1, 2])
+
+    def check_stream_trailers(self):
+        ps = ParsedSoap(text.replace('</SOAP-ENV:Body>',
+            '</SOAP-ENV:Body><t:x xmlns:t="urn:t"/>'), streaming=True)
+        self.assertRaises(ParseException, ps.Parse, self.typecode)
+
+    def check_stream_missing(self):
+        ps = ParsedSoap(text.replace('<b>hello</b>', ''), streaming=True)
+        self.assertRaises(EvaluateException, ps.Parse, self.typecode)
+
+    def check_stream_nsscope(self):
+        ps = ParsedSoap(text, streaming=True)
+        req = ps.body_root
+        scope = ps.GetElementNSScope(req)
+        self.assertEqual(scope.get('p'), 'urn:p')
+        self.assertEqual(scope['xsd'], 'http://www.w3.org/2001/XMLSchema')
+        self.assertEqual(scope.get('h'), None)
+        self.assertTrue(scope.parent is ps.GetElementNSScope(ps.body))
+        self.assertEqual(ps.GetElementNSdict(req), scope.dict())
+        self.assertEqual(ps.Parse(self.typecode)['a'], 5)
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t10TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+text = '''<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+<SOAP-ENV:Header><h:x xmlns:h="urn:h">1</h:x></SOAP-ENV:Header>
+<SOAP-ENV:Body>
+<p:req xmlns:p="urn:p">
+  <a xsi:type="xsd:int">5</a>
+  <b>hello</b>
+  <c>1</c>
+  <c>2</c>
+  <arr SOAP-ENC:arrayType="xsd:int[2]"><i>3</i><i>4</i></arr>
+  <ref href="#r1"/>
+</p:req>
+<multi id="r1"><b>x</b><a>9</a></multi>
+</SOAP-ENV:Body>
+</SOAP-ENV:Envelope>'''
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import unittest, sys
+from io import BytesIO
+from ZSI import *
+from ZSI.TCcompound import ComplexType
+from ZSI.streamwriter import StreamElementProxy
+from ZSI.wstools.Namespaces import SCHEMA
+
+
+class Req:
+    pass
+
+class Shared:
+    pass
+
+class t11TestCase(unittest.TestCase):
+    "Test SoapWriter output without a DOM against ElementProxy"
+
+    def setUp(self):
+        self.typecode = ComplexType(Req, [ TC.Integer('a'), TC.String('b'),
+            TC.String(('urn:x', 'c')), TC.String(('urn:y', 'd')),
+            TC.Array((SCHEMA.XSD3, 'int'), TC.Integer(), 'arr'),
+            TC.Struct(Shared, [ TC.String('v') ], 's1', inline=False),
+            TC.Struct(Shared, [ TC.String('v') ], 's2', inline=False),
+            TC.Integer('n', nillable=True), ], ('urn:p', 'req'))
+        shared = Shared()
+        shared.v = 'shared'
+        self.pyobj = Req()
+        self.pyobj.__dict__.update(dict(a=1, b='<&"\r', c='c', d='d',
+            arr=[1, 2], s1=shared, s2=shared, n=None))
+
+    def check_same_output(self):
+        for kw in [ dict(typed=False), dict(typed=True) ]:
+            sw1 = SoapWriter(nsdict={'x':'urn:x'})
+            sw1.serialize(self.pyobj, self.typecode, **kw)
+            sw2 = SoapWriter(nsdict={'x':'urn:x'},
+                outputclass=StreamElementProxy)
+            sw2.serialize(self.pyobj, self.typecode, **kw)
+            self.assertEqual(str(sw1), str(sw2))
+
+    def check_write_to(self):
+        sw = SoapWriter(outputclass=StreamElementProxy)
+        sw.serialize(self.pyobj, self.typecode)
+        sw.dom.chunksize = 64
+        chunks = []
+        class Sink:
+            write = chunks.append
+        sw.write_to(Sink())
+        self.assertTrue(len(chunks) > 1)
+        data = b''.join(chunks)
+        self.assertEqual(data, str(sw).encode('utf-8'))
+        d = ParsedSoap(data, streaming=True).Parse(self.typecode)
+        self.assertEqual(d.s1.v, 'shared')
+        self.assertEqual(d.arr, [1, 2])
+
+    def check_multiref(self):
+        tc = TC.Struct(Shared, [ TC.String('v') ], 'shared', inline=False,
+            mutable=False, unique=False)
+        sw = SoapWriter(outputclass=StreamElementProxy)
+        sw.serialize(self.pyobj.s1, tc)
+        data = str(sw)
+        self.assertTrue(data.find('href="#') > 0)
+        self.assertTrue(data.find('id="') > 0)
+        sw1 = SoapWriter()
+        sw1.serialize(self.pyobj.s1, tc)
+        self.assertEqual(str(sw1), data)
+        ps = ParsedSoap(data, streaming=True)
+        self.assertEqual(ps.Parse(tc).v, 'shared')
+
+    def check_findshared(self):
+        tc = ComplexType(Req, [
+            TC.Struct(Shared, [ TC.String('v') ], 's1', mutable=False, unique=False),
+            TC.Struct(Shared, [ TC.String('v') ], 's2', mutable=False, unique=False),
+            TC.String('c', unique=False), ], 'req')
+        data = str(SoapWriter().serialize(self.pyobj, tc))
+        self.assertEqual(data.count('id="'), 2)
+        data = str(SoapWriter(findshared=True).serialize(self.pyobj, tc))
+        self.assertEqual(data.count('href="#'), 2)
+        self.assertEqual(data.count('id="'), 1)
+        pyobj = Req()
+        pyobj.s1, pyobj.s2, pyobj.c = self.pyobj.s1, Shared(), 'c'
+        pyobj.s2.v = 'other'
+        data = str(SoapWriter(findshared=True).serialize(pyobj, tc))
+        self.assertEqual(data.find('href="#'), -1)
+        self.assertEqual(data.find('id="'), -1)
+
+    def check_prefix_scope(self):
+        sw = SoapWriter()
+        sw.serialize(self.pyobj, self.typecode)
+        body = sw.body
+        el = body.createAppendElement('urn:a', 'a').createAppendElement(None, 'b')
+        self.assertEqual(el.getPrefix('urn:a'), 'ns2')
+        body.setNamespaceAttribute('q', 'urn:q')
+        self.assertEqual(el.getPrefix('urn:q'), 'q')
+        self.assertEqual(el.resolvePrefix('q'), 'urn:q')
+        el.setNamespaceAttribute('q', 'urn:q2')
+        self.assertEqual(el.getPrefix('urn:q2'), 'q')
+        self.assertEqual(el.resolvePrefix('q'), 'urn:q2')
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t11TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+import unittest, asyncio, time, threading, http.server
+from ZSI import *
+from ZSI.ServiceContainer import ServiceSOAPBinding
+from ZSI.dispatch import SOAPRequestHandler
+from ZSI.aio.client import Binding, ConnectionPool
+from ZSI.aio.server import ServiceContainer, GetSOAPContext
+
+
+class Echo:
+    pass
+
+request_tc = TC.Struct(Echo, [ TC.Integer('i') ], 'echo')
+response_tc = TC.Struct(Echo, [ TC.Integer('i') ], 'echoResponse')
+Echo.typecode = response_tc
+
+
+async def echo_server(reader, writer):
+    '''HTTP/1.1 keep-alive server answering echo requests in order,
+    i = -1 is answered once the client hangs up.
+    '''
+    try:
+        await echo_requests(reader, writer)
+    except asyncio.CancelledError:
+        pass
+    writer.close()
+
+async def echo_requests(reader, writer):
+    while 1:
+        line = await reader.readline()
+        if not line: break
+        length = 0
+        while 1:
+            line = await reader.readline()
+            if line in (b'\r\n', b''): break
+            name, value = line.decode('latin-1').split(':', 1)
+            if name.lower() == 'content-length': length = int(value)
+        body = await reader.readexactly(length)
+        obj = ParsedSoap(body, streaming=True).Parse(request_tc)
+        if obj.i == -1: await reader.read()
+        data = str(SoapWriter().serialize(obj, response_tc)).encode('utf-8')
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/xml\r\n' +
+            b'Content-Length: ' + str(len(data)).encode() + b'\r\n\r\n' + data)
+
+
+class EchoService(ServiceSOAPBinding):
+    soapAction = { 'urn:echo': 'echo', 'urn:echo#async': 'aecho' }
+
+    def echo(self, ps):
+        obj = ps.Parse(request_tc)
+        assert GetSOAPContext().parsedsoap is ps
+        time.sleep(0.1)
+        return Echo.reply(obj.i)
+
+    async def aecho(self, ps):
+        obj = ps.Parse(request_tc)
+        await asyncio.sleep(0.1)
+        return Echo.reply(obj.i * 10)
+
+class DispatchHandler(SOAPRequestHandler):
+    '''Replies with the text of the request twice, compressed when it is
+    large and the client accepts gzip.
+    '''
+    def do_POST(self):
+        text = ParsedSoap(self.read_body()).Parse(TC.String('echo'))
+        self.send_xml(str(SoapWriter().serialize(text * 2, TC.String('echo'))))
+
+    def log_message(self, *args):
+        pass
+
+def _reply(i):
+    obj = Echo()
+    obj.i = i
+    return obj
+Echo.reply = staticmethod(_reply)
+
+
+class t12TestCase(unittest.TestCase):
+    "Test the asyncio client Binding against a loopback server"
+
+    def run_client(self, client, pool):
+        async def main():
+            server = await asyncio.start_server(echo_server, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await client('http://127.0.0.1:%d/echo' %port)
+            finally:
+                pool.clear()
+                server.close()
+                await server.wait_closed()
+        return asyncio.run(main())
+
+    def call(self, b, i, **kw):
+        obj = Echo()
+        obj.i = i
+        kw.setdefault('soapaction', 'urn:echo')
+        return b.RPC(None, 'echo', obj, requesttypecode=request_tc,
+            replytype=response_tc, streaming=True, **kw)
+
+    def check_concurrent(self):
+        for pipeline in (1, 4):
+            pool = ConnectionPool(maxsize=8, pipeline=pipeline)
+            async def client(url):
+                b = Binding(url=url, pool=pool, timeout=30)
+                return await asyncio.gather(*[ self.call(b, i) for i in range(200) ])
+            replies = self.run_client(client, pool)
+            self.assertEqual([ r.i for r in replies ], list(range(200)))
+            self.assertEqual(pool.misses, 8)
+
+    def check_timeout(self):
+        pool = ConnectionPool()
+        async def client(url):
+            b = Binding(url=url, pool=pool, timeout=0.1)
+            try:
+                await self.call(b, -1)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                self.fail('expecting asyncio.TimeoutError')
+            return await self.call(b, 1)
+        self.assertEqual(self.run_client(client, pool).i, 1)
+
+    def check_cancel(self):
+        pool = ConnectionPool(maxsize=1)
+        async def client(url):
+            b = Binding(url=url, pool=pool)
+            obj = Echo()
+            obj.i = -1
+            call = await b.Send(None, 'echo', obj, requesttypecode=request_tc)
+            await asyncio.sleep(0.1)
+            call.cancel()
+            try:
+                await b.Receive(response_tc, call=call)
+            except asyncio.CancelledError:
+                pass
+            else:
+                self.fail('expecting asyncio.CancelledError')
+            return await self.call(b, 2)
+        self.assertEqual(self.run_client(client, pool).i, 2)
+
+    def check_server(self):
+        async def main():
+            sc = ServiceContainer([ EchoService('/echo') ], max_concurrency=20)
+            server = await sc.start('127.0.0.1', 0)
+            url = 'http://127.0.0.1:%d/echo' %sc.server_port
+            pool = ConnectionPool(maxsize=30)
+            b = Binding(url=url, pool=pool, timeout=30)
+            try:
+                replies = await asyncio.gather(*[ self.call(b, i)
+                    for i in range(20) ])
+                self.assertEqual([ r.i for r in replies ], list(range(20)))
+                replies = await asyncio.gather(*[ self.call(b, i,
+                    soapaction='urn:echo#async') for i in range(20) ])
+                self.assertEqual([ r.i for r in replies ],
+                    [ i*10 for i in range(20) ])
+                replies = await asyncio.gather(*[ self.call(b, i)
+                    for i in range(30) ], return_exceptions=True)
+                busy = [ r for r in replies if isinstance(r, FaultException) ]
+                self.assertEqual(len(busy), 10)
+                self.assertEqual(b.reply_code in (200, 503), True)
+            finally:
+                pool.clear()
+                server.close()
+                await server.wait_closed()
+        asyncio.run(main())
+
+    def check_compressed_reply(self):
+        server = http.server.HTTPServer(('127.0.0.1', 0), DispatchHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        url = 'http://127.0.0.1:%d/' %server.server_port
+        text = 'hello' * 1000
+        async def main():
+            pool = ConnectionPool()
+            b = Binding(url=url, pool=pool, timeout=30)
+            try:
+                call = await b.Send(None, 'echo', text,
+                    requesttypecode=TC.String('echo'))
+                ps = await b.ReceiveSOAP(call=call)
+                return b.reply_headers['content-encoding'], \
+                    ps.Parse(TC.String('echo'))
+            finally:
+                pool.clear()
+        try:
+            self.assertEqual(asyncio.run(main()), ('gzip', text * 2))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t12TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+import unittest, threading, time, http.client, http.server, socket, urllib.request
+import os
+from ZSI import SoapWriter, TC
+from ZSI.dispatch import SOAPRequestHandler
+from ZSI.streamwriter import StreamElementProxy
+from ZSI.workers import ThreadPoolMixIn, PreForkServer
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    active = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.active.append(self)
+            self.server.peak = max(self.server.peak, len(self.active))
+        time.sleep(0.05)
+        with self.lock:
+            self.active.remove(self)
+        data = str(threading.current_thread().ident).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class PidHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        data = str(os.getpid()).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class RacyServer(http.server.HTTPServer):
+    '''Loses the race for every other connection, as a pre-forked worker
+    does when another one accepts it first.
+    '''
+    lost = False
+
+    def get_request(self):
+        self.lost = not self.lost
+        if self.lost:
+            raise BlockingIOError()
+        return http.server.HTTPServer.get_request(self)
+
+class Server(ThreadPoolMixIn, http.server.HTTPServer):
+    peak = 0
+
+class SOAPHandler(SOAPRequestHandler):
+    timeout = 0.5
+
+    def do_POST(self):
+        body = self.read_body().decode('utf-8')
+        if self.path == '/none':
+            return self.send_accepted()
+        sw = SoapWriter(outputclass=StreamElementProxy)
+        sw.serialize(body, TC.String('echo'))
+        self.send_xml(sw)
+
+    def log_message(self, *args):
+        pass
+
+
+class t13TestCase(unittest.TestCase):
+    "Test the thread pool of the HTTP servers"
+
+    def check_thread_pool(self):
+        server = Server(('127.0.0.1', 0), Handler)
+        server.threads, server.max_requests = 3, 2
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        url = 'http://127.0.0.1:%d/' %server.server_port
+        replies = []
+        clients = [ threading.Thread(target=lambda:
+            replies.append(urllib.request.urlopen(url).read()))
+            for i in range(12) ]
+        try:
+            for t in clients: t.start()
+            for t in clients: t.join()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.assertEqual(len(replies), 12)
+        self.assertTrue(server.peak <= 3)
+        self.assertEqual(len(server._pool), 0)
+
+    def check_keep_alive(self):
+        server = Server(('127.0.0.1', 0), SOAPHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', server.server_port)
+            socks = set()
+            for body in [ 'one', '\u00e9t\u00e9' ]:
+                conn.request('POST', '/', body.encode('utf-8'))
+                socks.add(conn.sock)
+                r = conn.getresponse()
+                self.assertEqual(r.getheader('transfer-encoding'), 'chunked')
+                self.assertTrue(r.read().decode('utf-8').find(body) > 0)
+            conn.request('POST', '/none', b'')
+            r = conn.getresponse()
+            self.assertEqual((r.status, r.read()), (202, b''))
+            self.assertEqual(len(socks), 1)
+            conn.close()
+
+            # pipelined, one chunked request body
+            s = socket.create_connection(('127.0.0.1', server.server_port))
+            s.sendall(b'POST /none HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc'
+                b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+                b'3\r\ntwo\r\n0\r\n\r\n')
+            # the idle connection is closed after the replies
+            data = s.makefile('rb').read().decode('utf-8')
+            self.assertTrue(data.startswith('HTTP/1.1 202'))
+            self.assertTrue(data.find('HTTP/1.1 200') > 0)
+            self.assertTrue(data.find('>two<') > 0)
+            s.close()
+
+            # a serial server closes connections after the reply
+            server.keep_alive = False
+            conn = http.client.HTTPConnection('127.0.0.1', server.server_port)
+            conn.request('POST', '/none', b'')
+            r = conn.getresponse()
+            self.assertEqual(r.getheader('connection'), 'close')
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def check_pre_fork(self):
+        server = RacyServer(('127.0.0.1', 0), PidHandler)
+        url = 'http://127.0.0.1:%d/' %server.server_port
+        workers = PreForkServer(server, processes=1, max_requests=3)
+        workers.poll = 0.05
+        thread = threading.Thread(target=workers.serve_forever)
+        thread.start()
+        get = lambda: urllib.request.urlopen(url, timeout=10).read()
+        try:
+            pids = [ get() for i in range(9) ]
+            # replaced after 3 requests, the races lost are not counted
+            self.assertEqual([ pids.count(p) for p in set(pids) ], [3, 3, 3])
+
+            # a restart replaces the workers after their requests
+            alive = set(workers.children)
+            workers._on_restart(None, None)
+            for i in range(50):
+                if workers.children and \
+                alive.isdisjoint(workers.children): break
+                time.sleep(0.05)
+            self.assertTrue(alive.isdisjoint(workers.children))
+            self.assertFalse(get() in pids)
+        finally:
+            workers._on_stop(None, None)
+            thread.join()
+        self.assertEqual(workers.children, set())
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t13TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+import unittest, sys, types
+from ZSI import *
+from ZSI.TC import UNBOUNDED
+from ZSI.TCcompound import ComplexType
+from ZSI.compiler import Compile, CompileModule
+
+
+class Item:
+    pass
+
+class t14TestCase(unittest.TestCase):
+    "Test compiled typecodes against the generic ComplexType code"
+
+    def setUp(self):
+        self.typecode = ComplexType(Item, [ TC.String('name'),
+            TC.Integer('qty', minOccurs=0), TC.Boolean('ok', minOccurs=0),
+            TC.String(('urn:x', 'q'), minOccurs=0),
+            TC.Integer('n', nillable=True, minOccurs=0),
+            TC.String('rep', minOccurs=0, maxOccurs=UNBOUNDED),
+            ComplexType(Item, [ TC.String('s') ], 'sub', minOccurs=0), ],
+            ('urn:p', 'item'))
+        self.wrapper = '<SOAP-ENV:Envelope '\
+            'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '\
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '\
+            'xmlns:x="urn:x"><SOAP-ENV:Body><p:item xmlns:p="urn:p">%s'\
+            '</p:item></SOAP-ENV:Body></SOAP-ENV:Envelope>'
+
+    def tearDown(self):
+        ComplexType.compiled = False
+
+    def parse(self, content):
+        ps = ParsedSoap(self.wrapper %content, streaming=True)
+        try:
+            pyobj = ps.Parse(self.typecode)
+        except EvaluateException as e:
+            return str(e)
+        d = dict(vars(pyobj))
+        if 'sub' in d: d['sub'] = vars(d['sub'])
+        return d
+
+    def check_parse(self):
+        for content in [
+            '<name> a </name><qty>3</qty><ok>TRUE</ok><x:q>q</x:q>'
+            '<n xsi:nil="true"/><rep>1</rep><rep/><sub><s>z</s></sub>',
+            '<name>a</name><name>b</name><q>other namespace</q><extra/>',
+            '<name>a<b/></name>', '<qty>1</qty>', '<name/><qty/>',
+            '<name>a</name><qty>x</qty>', ]:
+            ComplexType.compiled = False
+            generic = self.parse(content)
+            ComplexType.compiled = True
+            self.assertEqual(self.parse(content), generic)
+
+    def check_serialize(self):
+        pyobj = Item()
+        pyobj.__dict__.update(dict(name='a', qty=3, ok=False, q='q', n=None,
+            rep=['1', '2']))
+        pyobj.sub = Item()
+        pyobj.sub.s = 'z'
+        for kw in [ {}, dict(typed=False) ]:
+            ComplexType.compiled = False
+            generic = str(SoapWriter().serialize(pyobj, self.typecode, **kw))
+            ComplexType.compiled = True
+            compiled = str(SoapWriter().serialize(pyobj, self.typecode, **kw))
+            self.assertEqual(compiled, generic)
+        self.assertTrue(generic.find('<rep>1</rep><rep>2</rep>') > 0)
+
+    def check_unsupported(self):
+        self.assertNotEqual(Compile(self.typecode), None)
+        tc = ComplexType(Item, [ TC.String('a'), TC.String('a') ], 'dup')
+        self.assertEqual(Compile(tc), None)
+        tc = ComplexType(Item, [ TC.String('a') ], 'ordered', inorder=True)
+        self.assertEqual(Compile(tc), None)
+
+    def check_module(self):
+        module = types.ModuleType('t14_types')
+        exec('import ZSI.TCcompound\n'
+             'class ns0:\n'
+             '    class Item_Def(ZSI.TCcompound.ComplexType):\n'
+             '        pass\n', module.__dict__)
+        CompileModule(module.__dict__)
+        self.assertEqual(module.ns0.Item_Def.compiled, True)
+        self.assertEqual(ComplexType.compiled, False)
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t14TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
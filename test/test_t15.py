@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+import unittest, sys
+from ZSI import *
+from ZSI.TCcompound import ComplexType
+
+
+class Node:
+    pass
+
+class t15TestCase(unittest.TestCase):
+    "Test multi-ref href resolution"
+
+    def setUp(self):
+        next = ComplexType(Node, [], 'next', minOccurs=0)
+        next.ofwhat = ofwhat = (TC.String('v'), next)
+        self.typecode = ComplexType(Node, [ ComplexType(Node, ofwhat, 'a'),
+            ComplexType(Node, ofwhat, 'b') ], 'top')
+        self.wrapper = '<SOAP-ENV:Envelope '\
+            'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '\
+            'xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/">'\
+            '<SOAP-ENV:Body>%s</SOAP-ENV:Body></SOAP-ENV:Envelope>'
+
+    def parse(self, content):
+        return ParsedSoap(self.wrapper %content, streaming=True).Parse(self.typecode)
+
+    def check_shared(self):
+        pyobj = self.parse('<top><a href="#1"/><b href="#1"/></top>'
+            '<m id="1" SOAP-ENC:root="0"><v>one</v></m>')
+        self.assertTrue(pyobj.a is pyobj.b)
+        self.assertEqual(pyobj.a.v, 'one')
+
+    def check_cycle(self):
+        pyobj = self.parse('<top><a href="#1"/><b href="#2"/></top>'
+            '<m id="1" SOAP-ENC:root="0"><v>one</v><next href="#2"/></m>'
+            '<m id="2" SOAP-ENC:root="0"><v>two</v><next href="#1"/></m>')
+        self.assertEqual(pyobj.a.next.v, 'two')
+        self.assertTrue(pyobj.a.next.next is pyobj.a)
+        self.assertTrue(pyobj.b is pyobj.a.next)
+
+    def check_distinct_typecodes(self):
+        self.typecode = TC.Struct(None, [ TC.Struct(None, [TC.String('v')], 'a'),
+            TC.Struct(None, [TC.String('w')], 'b') ], 'top')
+        pyobj = self.parse('<top><a href="#1"/><b href="#1"/></top>'
+            '<m id="1" SOAP-ENC:root="0"><v>one</v><w>two</w></m>')
+        self.assertEqual(pyobj['a'], {'v': 'one'})
+        self.assertEqual(pyobj['b'], {'w': 'two'})
+
+    def check_duplicate_id(self):
+        self.assertRaises(ParseException, self.parse,
+            '<top><a href="#1"/><b href="#1"/></top>'
+            '<m id="1"><v>one</v></m><m id="1"><v>two</v></m>')
+
+    def check_missing(self):
+        self.assertRaises(EvaluateException, self.parse,
+            '<top><a href="#1"/><b href="#2"/></top><m id="1"><v>one</v></m>')
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t15TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
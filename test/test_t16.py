@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import unittest, sys
+from io import BytesIO
+from xml.dom import Node, minidom
+from ZSI import *
+from ZSI.domreader import Reader
+
+
+class t16TestCase(unittest.TestCase):
+    "Test the domreader DOM against minidom"
+
+    def walk(self, node):
+        '''Return the elements of a tree as comparable tuples, adjacent
+        text and CDATA joined, comments left out.
+        '''
+        attrs = sorted([ (a.nodeName, a.namespaceURI, a.localName, a.value)
+            for a in list((node.attributes or {}).values()) ])
+        children, text = [], ''
+        for c in node.childNodes:
+            if c.nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE):
+                text += c.nodeValue
+            elif c.nodeType == Node.ELEMENT_NODE:
+                if text: children.append(text)
+                children.append(self.walk(c))
+                text = ''
+        if text: children.append(text)
+        return (node.nodeType, node.nodeName, getattr(node, 'namespaceURI', None),
+            getattr(node, 'localName', None), attrs, children)
+
+    def check_same_tree(self):
+        dom = Reader().fromString(text)
+        self.assertEqual(self.walk(dom), self.walk(minidom.parseString(text)))
+        dom = Reader().fromStream(BytesIO(text.encode('utf-8')))
+        self.assertEqual(self.walk(dom), self.walk(minidom.parseString(text)))
+
+    def check_elements(self):
+        dom = Reader().fromString(text)
+        a = dom.documentElement.childNodes[1].childNodes[0]
+        self.assertEqual((a.prefix, a.localName, a.namespaceURI), ('p', 'a', 'urn:p'))
+        self.assertEqual(a.getAttributeNS(None, 'id'), 'i1')
+        self.assertEqual(a.getAttributeNS('urn:p', 'id'), '')
+        self.assertEqual(a.getAttributeNodeNS('urn:p', 'x').nodeName, 'p:x')
+        self.assertEqual(a.nsscope.get('p'), 'urn:p')
+        clone = a.cloneNode(1)
+        self.assertEqual(self.walk(clone), self.walk(a))
+        self.assertTrue(clone.parentNode is None)
+
+    def check_parse(self):
+        ps = ParsedSoap(text)
+        self.assertTrue(isinstance(ps.reader, Reader))
+        self.assertEqual(ps.Parse(TC.String(('urn:p', 'a'))), 'x & y')
+        self.assertRaises(ParseException, ParsedSoap,
+            text.replace('<p:a', '<?pi?><p:a'))
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t16TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+text = '''<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"><!-- c -->
+<SOAP-ENV:Body><p:a xmlns:p="urn:p" id="i1" p:x="1" xsi:type="xsd:string"
+ xmlns:xsd="http://www.w3.org/2001/XMLSchema">x &amp; <![CDATA[y]]></p:a>
+</SOAP-ENV:Body>
+</SOAP-ENV:Envelope>'''
+
+
+if __name__ == "__main__" : main()
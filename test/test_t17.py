@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+import unittest, sys, pickle
+from ZSI import *
+from ZSI.TCcompound import ComplexType, LazyObject, LazyList
+
+
+class Item:
+    pass
+
+class Meta(type):
+    pass
+
+class MetaItem(metaclass=Meta):
+    pass
+
+class t17TestCase(unittest.TestCase):
+    "Test lazy ComplexType and Array parsing"
+
+    def setUp(self):
+        self.item = ComplexType(Item, [ TC.String('name'),
+            TC.Integer('count', maxOccurs=10) ], 'item')
+        self.array = TC.Array(('', 'int'), TC.Integer(), 'arr')
+        self.typecode = ComplexType(Item, [ TC.String('name'), self.item,
+            self.array ], 'req')
+        self.typecode.lazy = self.item.lazy = self.array.lazy = True
+
+    def parse(self, text):
+        return ParsedSoap(wrapper %text).Parse(self.typecode)
+
+    def check_lazy_fields(self):
+        pyobj = self.parse(good)
+        self.assertTrue(isinstance(pyobj, Item) and isinstance(pyobj, LazyObject))
+        self.assertFalse('item' in pyobj.__dict__)
+        self.assertEqual(pyobj.name, 'top')
+        self.assertEqual(pyobj.item.count, [1, 2])
+        self.assertTrue('item' in pyobj.__dict__)
+        self.assertRaises(AttributeError, getattr, pyobj, 'missing')
+        copy = pickle.loads(pickle.dumps(pyobj))
+        self.assertEqual(type(copy), Item)
+        self.assertEqual(copy.item.name, 'inner')
+
+    def check_lazy_errors(self):
+        pyobj = self.parse(good.replace('<count>2', '<count>two'))
+        self.assertEqual(pyobj.item.name, 'inner')
+        self.assertRaises(EvaluateException, getattr, pyobj.item, 'count')
+        pyobj = self.parse(good.replace('<count>2', '<count>two'))
+        self.assertRaises(EvaluateException, pyobj.validate)
+        self.assertRaises(EvaluateException, self.parse,
+            good.replace('<name>top</name>', ''))
+
+    def check_lazy_array(self):
+        pyobj = self.parse(good)
+        arr = pyobj.arr
+        self.assertTrue(isinstance(arr, LazyList))
+        self.assertEqual(len(arr), 3)
+        self.assertEqual(arr[-1], 5)
+        self.assertEqual(list(arr), [3, 4, 5])
+        self.assertEqual(arr, [3, 4, 5])
+        arr = self.parse(good.replace('<i>4', '<i>x')).arr
+        self.assertEqual(arr[0], 3)
+        self.assertRaises(EvaluateException, arr.validate)
+
+    def check_lazy_serialize(self):
+        # a metaclass pyclass (as wsdl2py generates) is serialized from
+        # its __dict__, the fields not read must be parsed first
+        self.typecode.pyclass = self.item.pyclass = MetaItem
+        pyobj = self.parse(good)
+        self.assertFalse('item' in pyobj.__dict__)
+        sw = SoapWriter()
+        sw.serialize(pyobj, self.typecode)
+        for text in [ 'top</name>', 'inner</name><count>1</count><count>2',
+                      '<element>3</element><element>4</element>' ]:
+            self.assertTrue(text in str(sw), text)
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t17TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+wrapper = '''<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+<SOAP-ENV:Body>%s</SOAP-ENV:Body>
+</SOAP-ENV:Envelope>'''
+
+good = '''<req><name>top</name>
+<item><name>inner</name><count>1</count><count>2</count></item>
+<arr SOAP-ENC:arrayType="xsd:int[3]"><i>3</i><i>4</i><i>5</i></arr>
+</req>'''
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+import unittest, sys
+from array import array
+from ZSI import *
+from ZSI import TCnumbers
+
+
+class t18TestCase(unittest.TestCase):
+    "Test packed numeric arrays"
+
+    def parse(self, typecode, items, atype='xsd:double'):
+        typecode.packed = True
+        return ParsedSoap(wrapper %(atype, items)).Parse(typecode)
+
+    def check_packed_double(self):
+        typecode = TC.Array('double', TCnumbers.FPdouble(), 'arr')
+        v = self.parse(typecode, '<i>1.5</i><i>-2</i><i xsi:type="xsd:double">0</i>'
+            '<i>INF</i>')
+        self.assertEqual(v, array('d', [1.5, -2, 0, float('INF')]))
+        self.assertRaises(EvaluateException, self.parse, typecode, 
+            '<i>1</i><i>1e-400</i>')
+        self.assertRaises(EvaluateException, self.parse, typecode, 
+            '<i>1</i><i>NaN</i>')
+        self.assertRaises(EvaluateException, self.parse, typecode, 
+            '<i>1</i><i xsi:type="xsd:int">2</i>')
+
+    def check_packed_int(self):
+        typecode = TC.Array('int', TCnumbers.Iint(), 'arr')
+        v = self.parse(typecode, '<i>1</i><i> 2 </i><i>-3</i>', 'xsd:int')
+        self.assertEqual(v, array('i', [1, 2, -3]))
+        self.assertRaises(EvaluateException, self.parse, typecode, 
+            '<i>1</i><i>2147483648</i>', 'xsd:int')
+        self.assertRaises(EvaluateException, self.parse, typecode, 
+            '<i>1</i><i>x</i>', 'xsd:int')
+        typecode = TC.Array('int', TC.Integer(), 'arr')
+        self.assertEqual(self.parse(typecode, '<i xsi:type="xsd:byte">5</i>',
+            'xsd:int').typecode, 'b')
+        self.assertRaises(EvaluateException, self.parse, typecode, 
+            '<i xsi:type="xsd:byte">500</i>', 'xsd:int')
+
+    def check_packed_big_int(self):
+        typecode = TC.Array('integer', TC.Integer(), 'arr')
+        v = self.parse(typecode, '<i>1</i><i>%d</i>' %2**70, 'xsd:integer')
+        self.assertEqual(v, [1, 2**70])
+        self.assertRaises(EvaluateException, self.parse, typecode,
+            '<i>1</i><i xsi:type="xsd:long">%d</i>' %2**70, 'xsd:integer')
+        v = self.parse(typecode, '<i xsi:type="xsd:int">1</i>'
+            '<i xsi:type="xsd:integer">%d</i>' %2**70, 'xsd:integer')
+        self.assertEqual(v, [1, 2**70])
+
+    def check_serialize(self):
+        typecode = TC.Array('double', TCnumbers.FPdouble(format='%g'), 'arr')
+        values = array('d', [1.5, float('-INF'), 3])
+        sw = SoapWriter()
+        sw.serialize(values, typecode)
+        ps = ParsedSoap(str(sw))
+        self.assertEqual(ps.Parse(typecode), list(values))
+        typecode.packed = True
+        self.assertEqual(ps.Parse(typecode), values)
+        sw2 = SoapWriter()
+        sw2.serialize(list(values), typecode)
+        self.assertEqual(str(sw), str(sw2))
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t18TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+wrapper = '''<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+<SOAP-ENV:Body><arr SOAP-ENC:arrayType="%s[]">%s</arr></SOAP-ENV:Body>
+</SOAP-ENV:Envelope>'''
+
+
+if __name__ == "__main__" : main()
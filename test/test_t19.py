@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+import unittest, sys, os, tempfile
+from io import BytesIO
+from ZSI import *
+from ZSI.binary import Base64Decoder, HexDecoder, Base64Encode, HexEncode
+
+
+class t19TestCase(unittest.TestCase):
+    "Test the incremental binary codecs"
+
+    def setUp(self):
+        self.data = os.urandom(100000)
+
+    def check_codecs(self):
+        text = ''.join(Base64Encode(BytesIO(self.data), chunksize=570))
+        self.assertEqual(text, ''.join(Base64Encode(self.data)))
+        decoder = Base64Decoder()
+        for i in range(0, len(text), 333): decoder.write(text[i:i+333])
+        self.assertEqual(decoder.close(), self.data)
+        text = ''.join(HexEncode(memoryview(self.data)))
+        decoder = HexDecoder(memoryview(bytearray(len(self.data) + 10)))
+        decoder.write(text[:101])
+        decoder.write(' \n' + text[101:])
+        self.assertEqual(decoder.close().tobytes(), self.data)
+        decoder = HexDecoder(memoryview(bytearray(10)))
+        self.assertRaises(ValueError, decoder.write, text)
+
+    def check_sinks(self):
+        for typecode in [ TC.Base64String('b'), TC.Base64Binary('b'),
+        TC.HexBinaryString('b') ]:
+            sw = SoapWriter()
+            sw.serialize(BytesIO(self.data), typecode)
+            text = str(sw)
+            for sink in [ bytearray, tempfile.TemporaryFile ]:
+                typecode.sink = sink
+                for streaming in [ False, True ]:
+                    v = ParsedSoap(text, streaming=streaming).Parse(typecode)
+                    if sink is not bytearray: v = v.read()
+                    self.assertEqual(v, self.data)
+            self.assertRaises(EvaluateException, ParsedSoap(
+                text.replace('</b>', 'A</b>')).Parse, typecode)
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t19TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
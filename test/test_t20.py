@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+import unittest, sys, tempfile
+from io import BytesIO
+from ZSI import *
+from ZSI.mtom import IsXOP, Package, XOPMessage
+from ZSI.resolvers import MIMEResolver
+
+
+class Sink(TC.Base64Binary):
+    sink = bytearray
+
+class t20TestCase(unittest.TestCase):
+    "Test MTOM/XOP packaging and resolving"
+
+    def setUp(self):
+        self.data = bytes(range(256)) * 40
+
+    def package(self, pyobj, mtom=0):
+        sw = SoapWriter(mtom=mtom)
+        sw.serialize(pyobj, TC.Base64Binary('data'))
+        return Package(sw)
+
+    def parse(self, msg, typecode=None, **kw):
+        body = bytes(msg)
+        self.assertEqual(len(body), len(msg))
+        self.assertTrue(IsXOP(msg.content_type))
+        cid = MIMEResolver(msg.content_type, BytesIO(body))
+        ps = ParsedSoap(cid.GetSOAPPart(), resolver=cid.Resolve, **kw)
+        return ps.Parse(typecode or TC.Base64Binary('data'))
+
+    def check_memoryview(self):
+        msg = self.package(self.data)
+        self.assertTrue(isinstance(msg, XOPMessage))
+        self.assertTrue('www.w3.org/2004/08/xop/include' in msg.soapdata)
+        self.assertTrue(self.data.decode('latin-1') not in str(msg))
+        v = self.parse(msg)
+        self.assertTrue(isinstance(v, memoryview) and v.readonly)
+        self.assertEqual(bytes(v), self.data)
+
+    def check_threshold(self):
+        msg = self.package(self.data, mtom=len(self.data) + 1)
+        self.assertEqual(type(msg), str)
+        self.assertTrue('www.w3.org/2004/08/xop/include' not in msg)
+
+    def check_file_and_sink(self):
+        f = tempfile.TemporaryFile()
+        f.write(self.data)
+        msg = self.package(f, mtom=1 << 30)
+        self.assertTrue(isinstance(msg, XOPMessage))
+        v = self.parse(msg, Sink('data'))
+        self.assertEqual(type(v), bytearray)
+        self.assertEqual(v, self.data)
+        v = self.parse(msg, Sink('data'), streaming=True)
+        self.assertEqual(v, self.data)
+
+    def check_resolver(self):
+        cid = MIMEResolver('multipart/related; boundary=b; start="<x>"',
+            BytesIO(text))
+        self.assertEqual(len(cid.parts), 1)
+        self.assertEqual(cid.GetSOAPPart().read(), b'<a/>')
+        self.assertEqual(bytes(cid.GetContent('cid:y%40z')), b'hello\r\n')
+        self.assertEqual(cid['y@z'].read(), b'hello\r\n')
+        self.assertEqual(cid.GetContent('nothere'), None)
+        self.assertEqual(len(cid.parts), 2)
+        self.assertRaises(KeyError, cid.GetContent, 'cid:nothere')
+
+    def check_incremental(self):
+        msg = self.package(self.data)
+        body = bytes(msg) + b'next request'
+        f = Trickle(body)
+        resolver = type('R', (MIMEResolver,), {'spoolsize': 1000})
+        cid = resolver(msg.content_type, f, length=len(body) - 12)
+        self.assertTrue(f.tell() < len(self.data))
+        self.assertEqual(len(cid.parts), 1)
+        ps = ParsedSoap(cid.GetSOAPPart(), resolver=cid.Resolve)
+        v = ps.Parse(TC.Base64Binary('data'))
+        self.assertEqual(v.obj.__class__.__name__, 'mmap')
+        self.assertEqual(bytes(v), self.data)
+        self.assertEqual(cid.ReadParts(), cid.parts)
+        self.assertEqual(f.read(), b'next request')
+        cid = MIMEResolver(msg.content_type, BytesIO(bytes(msg)[:-100]))
+        self.assertRaises(ValueError, cid.ReadParts)
+
+class Trickle(BytesIO):
+    def read1(self, size=-1):
+        return BytesIO.read1(self, min(size, 100))
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t20TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+text = b'''preamble\r
+--b\r
+Content-Type: text/xml\r
+Content-ID: <x>\r
+\r
+<a/>\r
+--b\r
+Content-ID: <y@z>\r
+Content-Transfer-Encoding: base64\r
+\r
+aGVsbG8NCg==\r
+--b--\r
+'''
+
+
+if __name__ == "__main__" : main()
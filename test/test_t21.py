@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+import unittest, threading, http.server, zlib
+from io import BytesIO
+from ZSI import ParsedSoap, SoapWriter, TC
+from ZSI import compress
+from ZSI.client import Binding
+from ZSI.dispatch import SOAPRequestHandler
+from ZSI.streamwriter import StreamElementProxy
+
+
+class SOAPHandler(SOAPRequestHandler):
+    seen = []
+
+    def do_POST(self):
+        self.seen.append(self.headers.get('content-encoding'))
+        ps = ParsedSoap(self.read_body().decode('utf-8'))
+        sw = SoapWriter(outputclass=StreamElementProxy)
+        sw.serialize(ps.Parse(TC.String('echo')) * 2, TC.String('echo'))
+        if self.path == '/stream':
+            self.send_xml(sw)
+        else:
+            self.send_xml(str(sw))
+
+    def log_message(self, *args):
+        pass
+
+class LimitHandler(SOAPRequestHandler):
+    decompresslimit = 10000
+
+    def log_message(self, *args):
+        pass
+
+
+class t21TestCase(unittest.TestCase):
+    "Test gzip and deflate Content-Encoding"
+
+    def check_negotiate(self):
+        self.assertEqual(compress.Negotiate('deflate, gzip'), 'gzip')
+        self.assertEqual(compress.Negotiate('gzip;q=0.5, deflate'), 'deflate')
+        self.assertEqual(compress.Negotiate('gzip;q=0, *'), 'gzip')
+        self.assertEqual(compress.Negotiate('identity'), None)
+        self.assertEqual(compress.Negotiate(None), None)
+
+    def check_reader(self):
+        data = b'<a>%s</a>' % (b'x' * 100000)
+        for encoding, coded in [ ('gzip', compress.Compress(data, 'gzip')),
+            ('deflate', compress.Compress(data, 'deflate')),
+            ('deflate', zlib.compress(data)[2:-4]) ]:
+            stats = compress.stats.decompressed
+            r = compress.DecompressReader(BytesIO(coded), encoding)
+            r.bufsize = 100
+            self.assertEqual(len(r.read1(1000)), 100)
+            self.assertEqual(r.read(), data[100:])
+            self.assertEqual(r.read(), b'')
+            self.assertEqual(compress.stats.decompressed, stats + 1)
+        self.assertTrue(compress.stats.compress_ratio() > 100)
+        self.assertRaises(ValueError, compress.Decompress, coded[:-10],
+            'deflate')
+        self.assertRaises(ValueError, compress.Decompress, coded, 'br')
+        self.assertEqual(compress.Decompress(coded, 'deflate', len(data)), data)
+        self.assertRaises(compress.DecompressLimitError, compress.Decompress,
+            coded, 'deflate', len(data) - 1)
+
+    def check_loopback(self):
+        server = http.server.HTTPServer(('127.0.0.1', 0), SOAPHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        url = 'http://127.0.0.1:%d/' %server.server_port
+        text = 'hello' * 1000
+        try:
+            b = Binding(url=url, compression='gzip', pool=None)
+            b.Send(None, 'echo', text, requesttypecode=TC.String('echo'))
+            self.assertTrue(b.ReceiveRaw().find(text.encode() * 2) > 0)
+            self.assertEqual(b.reply_headers['content-encoding'], 'gzip')
+            b = Binding(url=url + 'stream', compression='deflate', pool=None)
+            b.Send(None, 'echo', text, requesttypecode=TC.String('echo'))
+            ps = b.ReceiveSOAP(streaming=True)
+            self.assertEqual(b.reply_headers['content-encoding'], 'gzip')
+            self.assertEqual(ps.Parse(TC.String('echo')), text * 2)
+            self.assertEqual(SOAPHandler.seen, ['gzip', 'deflate'])
+            b = Binding(url=url, acceptencoding=None, pool=None)
+            b.Send(None, 'echo', 'x', requesttypecode=TC.String('echo'))
+            self.assertTrue(b.ReceiveRaw().find(b'>xx<') > 0)
+            self.assertEqual(b.reply_headers['content-encoding'], None)
+            self.assertEqual(SOAPHandler.seen[-1], None)
+            # not compressed, the length is that of the utf-8 bytes
+            b = Binding(url=url, pool=None)
+            b.Send(None, 'echo', '\u00e9t\u00e9', requesttypecode=TC.String('echo'))
+            self.assertTrue(b.ReceiveRaw().decode('utf-8').find(
+                '>\u00e9t\u00e9\u00e9t\u00e9<') > 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def check_limit(self):
+        server = http.server.HTTPServer(('127.0.0.1', 0), LimitHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        url = 'http://127.0.0.1:%d/' %server.server_port
+        try:
+            b = Binding(url=url, compression='gzip', pool=None)
+            b.Send(None, 'echo', 'x' * 100000, requesttypecode=TC.String('echo'))
+            data = b.ReceiveRaw()
+            self.assertEqual(b.reply_code, 413)
+            self.assertTrue(data.find(b'larger than 10000 bytes') > 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t21TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+import unittest, threading, http.server
+from ZSI import ParsedSoap
+from ZSI.dispatch import SOAPRequestHandler
+from ZSI.ServiceProxy import ServiceProxy
+from ZSI.wstools import WSDLTools
+
+
+class SOAPHandler(SOAPRequestHandler):
+    actions = []
+    timeout = 5
+
+    def do_POST(self):
+        ps = ParsedSoap(self.read_body().decode('utf-8'))
+        self.actions.append(self.headers['soapaction'])
+        text = ps.body_root.childNodes[0].childNodes[0].nodeValue
+        self.send_xml(reply %text)
+
+    def log_message(self, *args):
+        pass
+
+
+class t22TestCase(unittest.TestCase):
+    "Test the operation cache of ServiceProxy"
+
+    def check_operation_cache(self):
+        server = http.server.HTTPServer(('127.0.0.1', 0), SOAPHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            wsdl = WSDLTools.WSDLReader().loadFromString(
+                text.replace('PORT', str(server.server_port)))
+            # a failed request must not wait for a reply forever
+            proxy = ServiceProxy(wsdl, transdict={'timeout': 10})
+            compiled = []
+            getTypeCodes = proxy._getTypeCodes
+            proxy._getTypeCodes = lambda callinfo: \
+                compiled.append(callinfo) or getTypeCodes(callinfo)
+            self.assertEqual(proxy.warmup(), 1)
+            for i in range(3):
+                self.assertEqual(proxy.echo(text='hi%d' %i), {'text':'hi%d!' %i})
+            self.assertEqual(len(compiled), 1)
+            self.assertEqual(SOAPHandler.actions, ['"urn:echo#echo"'] * 3)
+            self.assertEqual(len(proxy._local.bindings), 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t22TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+reply = '''<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/">
+<SOAP-ENV:Body><echoResponse><text>%s!</text></echoResponse></SOAP-ENV:Body>
+</SOAP-ENV:Envelope>'''
+
+text = '''<definitions xmlns="http://schemas.xmlsoap.org/wsdl/"
+ xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+ xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+ xmlns:tns="urn:echo" targetNamespace="urn:echo" name="Echo">
+ <message name="EchoRequest"><part name="text" type="xsd:string"/></message>
+ <message name="EchoResponse"><part name="text" type="xsd:string"/></message>
+ <portType name="EchoPort">
+  <operation name="echo">
+   <input message="tns:EchoRequest"/><output message="tns:EchoResponse"/>
+  </operation>
+ </portType>
+ <binding name="EchoBinding" type="tns:EchoPort">
+  <soap:binding style="rpc" transport="http://schemas.xmlsoap.org/soap/http"/>
+  <operation name="echo"><soap:operation soapAction="urn:echo#echo"/>
+   <input><soap:body use="literal" namespace="urn:echo"/></input>
+   <output><soap:body use="literal" namespace="urn:echo"/></output>
+  </operation>
+ </binding>
+ <service name="EchoService">
+  <port name="EchoPort" binding="tns:EchoBinding">
+   <soap:address location="http://127.0.0.1:PORT/echo"/>
+  </port>
+ </service>
+</definitions>'''
+
+
+if __name__ == "__main__" : main()
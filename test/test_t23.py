@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+import unittest, os, shutil, tempfile, threading, http.server
+from ZSI.wstools.WSDLTools import WSDLReader
+from ZSI.wstools.ModelCache import ModelCache, CacheError
+
+
+class WSDLHandler(http.server.BaseHTTPRequestHandler):
+    codes = []
+
+    def do_GET(self):
+        if self.headers['if-none-match'] == '"v1"':
+            self.codes.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = wsdl.replace('types.xsd', 'http://127.0.0.1:%d/types.xsd'
+            %self.server.server_port)
+        if self.path.endswith('.xsd'): data = xsd %''
+        data = data.encode('utf-8')
+        self.codes.append(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class t23TestCase(unittest.TestCase):
+    "Test the disk cache of loaded WSDL and schemas"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.dir, 'cache')
+        self.wsdl = os.path.join(self.dir, 'interface.wsdl')
+        self.xsd = os.path.join(self.dir, 'types.xsd')
+        self.write(self.wsdl, wsdl)
+        self.write(self.xsd, xsd %'')
+
+    def write(self, name, data):
+        f = open(name, 'w')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def types(self, w):
+        return [ t.getAttribute('name') for t in
+                 w.types['http://pycon.org/types'].types.values() ]
+
+    def check_file_cache(self):
+        cache = ModelCache(self.cachedir)
+        reader = WSDLReader(cache=cache)
+        w1 = reader.loadFromURL(self.wsdl)
+        w2 = reader.loadFromURL(self.wsdl)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertTrue(w1 is not w2)
+        self.assertEqual(w2.portTypes['Registration'].operations[0].name, 'GetUser')
+        self.assertEqual(self.types(w2), ['User'])
+
+        # same content, new mtime: revalidated by hash
+        st = os.stat(self.xsd)
+        os.utime(self.xsd, (st.st_atime, st.st_mtime + 10))
+        reader.loadFromURL(self.wsdl)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        self.write(self.xsd, xsd %'<complexType name="Group"/>')
+        self.assertEqual(self.types(reader.loadFromURL(self.wsdl)),
+            ['User', 'Group'])
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def check_offline(self):
+        offline = WSDLReader(cache=ModelCache(self.cachedir, offline=True))
+        self.assertRaises(CacheError, offline.loadFromURL, self.wsdl)
+        WSDLReader(cache=ModelCache(self.cachedir)).loadFromURL(self.wsdl)
+        os.remove(self.xsd)
+        self.assertEqual(self.types(offline.loadFromURL(self.wsdl)), ['User'])
+
+    def check_http_revalidation(self):
+        server = http.server.HTTPServer(('127.0.0.1', 0), WSDLHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = 'http://127.0.0.1:%d/interface.wsdl' %server.server_port
+            cache = ModelCache(self.cachedir)
+            WSDLReader(cache=cache).loadFromURL(url)
+            w = WSDLReader(cache=cache).loadFromURL(url)
+            self.assertEqual(self.types(w), ['User'])
+            self.assertEqual(WSDLHandler.codes, [200, 200, 304, 304])
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t23TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+xsd = '''<?xml version="1.0"?>
+<schema targetNamespace="http://pycon.org/types"
+  xmlns="http://www.w3.org/2001/XMLSchema"
+  xmlns:tns="http://pycon.org/types">
+  <complexType name="User">
+    <sequence>
+      <element name="UserId" type="string"/>
+      <element name="Name" type="string"/>
+    </sequence>
+  </complexType>%s
+</schema>'''
+
+wsdl = '''<?xml version="1.0"?>
+<definitions name="Registration"
+  targetNamespace="http://pycon.org/"
+  xmlns="http://schemas.xmlsoap.org/wsdl/"
+  xmlns:tns="http://pycon.org/"
+  xmlns:types="http://pycon.org/types"
+  xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <import namespace="http://pycon.org/types" location="types.xsd"/>
+  <message name="GetUserResponse"><part name="User" type="types:User"/></message>
+  <message name="GetUserRequest"><part name="UserId" type="xsd:string"/></message>
+  <portType name="Registration">
+    <operation name="GetUser">
+      <input message="tns:GetUserRequest"/>
+      <output message="tns:GetUserResponse"/>
+    </operation>
+  </portType>
+</definitions>'''
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+import unittest, os, shutil, tempfile, threading, time, http.server, socketserver
+from ZSI.wstools.WSDLTools import WSDLReader
+from ZSI.wstools.XMLSchema import SchemaReader
+from ZSI.wstools.Catalog import Catalog, Resolver
+
+
+class SchemaHandler(http.server.BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    active = peak = 0
+    paths = []
+
+    def do_GET(self):
+        cls = self.__class__
+        cls.lock.acquire()
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        cls.paths.append(self.path)
+        cls.lock.release()
+        if self.path.endswith('.xsd'):
+            time.sleep(0.2)
+            n = self.path[-5]
+            data = xsd %(n, n)
+        else:
+            data = wsdl %(''.join([ imports %(n, self.server.server_port, n)
+                                    for n in '123' ]))
+        data = data.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        cls.lock.acquire()
+        cls.active -= 1
+        cls.lock.release()
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class t24TestCase(unittest.TestCase):
+    "Test the catalog resolver of WSDL and schema imports"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        name = os.path.join(self.dir, name)
+        f = open(name, 'w')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        return name
+
+    def types(self, w, n):
+        schema = w.types['urn:t24:%s' %n]
+        return [ t.getAttribute('name') for t in schema.types.values() ]
+
+    def check_catalog_file(self):
+        os.mkdir(os.path.join(self.dir, 'schemas'))
+        self.write(os.path.join('schemas', 'types1.xsd'), xsd %('1', '1'))
+        name = self.write('catalog.xml', catalog)
+        url = self.write('service.wsdl', wsdl
+            %(imports %('1', 0, '1')).replace(':0/', '/'))
+        resolver = Resolver(Catalog(name))
+        self.assertEqual(resolver.resolve('http://127.0.0.1/types1.xsd'),
+            'file://' + os.path.join(self.dir, 'schemas', 'types1.xsd'))
+        w = WSDLReader(resolver=resolver).loadFromURL(url)
+        self.assertEqual(self.types(w, '1'), ['T1'])
+        self.assertEqual(resolver.fetches, 2)
+
+    def check_namespace_and_bundle(self):
+        catalog = Catalog()
+        catalog.addURI('urn:t24:ns', 'http://bundle.invalid/ns.xsd')
+        catalog.addDocument('http://bundle.invalid/ns.xsd',
+            xsd.replace('urn:t24:%s', 'urn:t24:ns') %'N')
+        reader = SchemaReader(resolver=Resolver(catalog))
+        name = self.write('s.xsd', importer)
+        schema = reader.loadFromURL(name)
+        imported = schema.getImportSchemas()['urn:t24:ns']
+        self.assertEqual(list(imported.types.keys()), ['TN'])
+
+    def check_parallel_fetch(self):
+        server = Server(('127.0.0.1', 0), SchemaHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            resolver = Resolver(workers=3)
+            url = 'http://127.0.0.1:%d/service.wsdl' %server.server_port
+            w = WSDLReader(resolver=resolver).loadFromURL(url)
+            self.assertEqual([ self.types(w, n) for n in '123' ],
+                [['T1'], ['T2'], ['T3']])
+            self.assertEqual(len(SchemaHandler.paths), 4)
+            self.assertTrue(SchemaHandler.peak > 1)
+            self.assertEqual(resolver.fetches, 4)
+            resolver.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t24TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+catalog = '''<?xml version="1.0"?>
+<catalog xmlns="urn:oasis:names:tc:entity:xmlns:xml:catalog">
+  <group xml:base="schemas/">
+    <rewriteURI uriStartString="http://127.0.0.1/" rewritePrefix="./"/>
+  </group>
+</catalog>'''
+
+xsd = '''<?xml version="1.0"?>
+<schema targetNamespace="urn:t24:%s" xmlns="http://www.w3.org/2001/XMLSchema">
+  <complexType name="T%s">
+    <sequence><element name="a" type="string"/></sequence>
+  </complexType>
+</schema>'''
+
+importer = '''<?xml version="1.0"?>
+<schema targetNamespace="urn:t24:s" xmlns="http://www.w3.org/2001/XMLSchema">
+  <import namespace="urn:t24:ns"/>
+</schema>'''
+
+imports = '''
+  <import namespace="urn:t24:%s" location="http://127.0.0.1:%d/types%s.xsd"/>'''
+
+wsdl = '''<?xml version="1.0"?>
+<definitions targetNamespace="urn:t24"
+  xmlns="http://schemas.xmlsoap.org/wsdl/"
+  xmlns:xsd="http://www.w3.org/2001/XMLSchema">%s
+  <message name="Request"><part name="a" type="xsd:string"/></message>
+</definitions>'''
+
+
+if __name__ == "__main__" : main()
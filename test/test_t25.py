@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+import unittest, sys, os, shutil, tempfile, importlib
+from ZSI import SoapWriter, ParsedSoap
+from ZSI.schema import SchemaInstanceType, GTD, GED
+from ZSI.wstools.WSDLTools import WSDLReader
+from ZSI.generate.wsdl2python import WriteServiceModule
+from ZSI.generate.utility import NamespaceAliasDict as NAD
+
+
+class t25TestCase(unittest.TestCase):
+    "Test types packages generated with one module per type (wsdl2py --split)"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        name = os.path.join(self.dir, 'lazy.wsdl')
+        f = open(name, 'w')
+        try:
+            f.write(wsdl)
+        finally:
+            f.close()
+        WriteServiceModule(WSDLReader().loadFromFile(name)).writeTypesPackage(self.dir)
+        sys.path.insert(0, self.dir)
+        self.package = importlib.import_module('Lazy_services_types')
+
+    def tearDown(self):
+        for name in [ m for m in sys.modules if m.startswith('Lazy_services_types') ]:
+            del sys.modules[name]
+        sys.path.remove(self.dir)
+        shutil.rmtree(self.dir)
+
+    def loaded(self):
+        return sorted([ m.split('.')[-1] for m in sys.modules
+                        if m.startswith('Lazy_services_types._') ])
+
+    def namespace(self, ns):
+        return getattr(self.package, NAD.getAlias(ns))
+
+    def check_lookup(self):
+        self.assertEqual(self.loaded(), [])
+        self.assertFalse(('urn:t25:b', 'Derived') in SchemaInstanceType.types)
+
+        tc = GED('urn:t25:b', 'Holder')
+        self.assertEqual(self.loaded(), ['Base_Def', 'Derived_Def',
+            'Holder_Dec', 'Leaf_Def', '_ns0', '_ns1'])
+        obj = tc.pyclass()
+        obj._part = GTD('urn:t25:a', 'Base')(None).pyclass()
+        obj._part._leaf = self.namespace('urn:t25:a').Leaf_Def(None).pyclass()
+        sw = SoapWriter()
+        sw.serialize(obj, tc)
+        pyobj = ParsedSoap(str(sw)).Parse(tc)
+        self.assertTrue(pyobj._part._leaf is not None)
+        self.assertFalse('Item_Dec' in self.loaded())
+
+    def check_namespace(self):
+        ns0 = self.namespace('urn:t25:a')
+        self.assertEqual(ns0.targetNamespace, 'urn:t25:a')
+        self.assertTrue(ns0.Item_Dec is GED('urn:t25:a', 'Item', isref=True))
+        self.assertTrue(GTD('urn:t25:a', 'Leaf') is ns0.Leaf_Def)
+        self.assertRaises(AttributeError, getattr, ns0, 'Missing_Def')
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t25TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+wsdl = '''<?xml version="1.0"?>
+<definitions name="Lazy" targetNamespace="urn:t25"
+  xmlns="http://schemas.xmlsoap.org/wsdl/"
+  xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <types>
+    <xsd:schema targetNamespace="urn:t25:a" xmlns:a="urn:t25:a">
+      <xsd:complexType name="Base">
+        <xsd:sequence>
+          <xsd:element name="leaf" type="a:Leaf" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Leaf"/>
+      <xsd:element name="Item" type="a:Base"/>
+    </xsd:schema>
+    <xsd:schema targetNamespace="urn:t25:b" xmlns:a="urn:t25:a" xmlns:b="urn:t25:b">
+      <xsd:import namespace="urn:t25:a"/>
+      <xsd:complexType name="Derived">
+        <xsd:complexContent><xsd:extension base="a:Base">
+          <xsd:sequence><xsd:element name="part" type="a:Base"/></xsd:sequence>
+        </xsd:extension></xsd:complexContent>
+      </xsd:complexType>
+      <xsd:element name="Holder" type="b:Derived"/>
+    </xsd:schema>
+  </types>
+  <message name="Request"><part name="a" type="xsd:string"/></message>
+</definitions>'''
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+import unittest, sys, subprocess
+
+
+class t26TestCase(unittest.TestCase):
+    "Test that import ZSI leaves the rarely used modules to their first use"
+
+    def modules(self, statements):
+        '''Return the modules imported by statements in a new interpreter.
+        '''
+        p = subprocess.run([ sys.executable, '-W', 'ignore', '-c',
+            statements + '\nimport sys\nprint("\\n".join(sys.modules))' ],
+            stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        return p.stdout.split()
+
+    def check_import(self):
+        modules = self.modules('import ZSI')
+        for name in [ 'ZSI.TC', 'ZSI.wstools.Utility' ]:
+            self.assertTrue(name in modules, name)
+        for name in [ 'ZSI.wstools.WSDLTools', 'ZSI.wstools.XMLSchema',
+                      'ZSI.wstools.c14n', 'ZSI.wstools.TimeoutHTTP',
+                      'ZSI.twisted', 'ZSI.generate', 'http.client' ]:
+            self.assertFalse(name in modules, name)
+
+    def check_first_use(self):
+        modules = self.modules('import ZSI.wstools\n'
+            'ZSI.wstools.WSDLTools.WSDLReader\n'
+            'from ZSI.wstools.Utility import TimeoutHTTP\n'
+            'from ZSI import SoapWriter\n'
+            'from xml.dom import minidom\n'
+            'ZSI.wstools.Utility.Canonicalize(minidom.parseString("<a/>"))')
+        for name in [ 'ZSI.wstools.WSDLTools', 'ZSI.wstools.TimeoutHTTP',
+                      'ZSI.wstools.c14n' ]:
+            self.assertTrue(name in modules, name)
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t26TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+import unittest, threading, time, http.client, http.server, socket
+from ZSI import ParsedSoap, SoapWriter, TC
+from ZSI.client import Binding
+from ZSI.dispatch import SOAPRequestHandler
+from ZSI.pool import ConnectionPool
+from ZSI.streamwriter import StreamElementProxy
+from ZSI.workers import ThreadPoolMixIn
+
+
+class Connection:
+    '''Transport connected to one end of a socket pair.
+    '''
+    def __init__(self, netloc, strict=None, **kw):
+        self.netloc, self.kw, self.sock = netloc, kw, None
+
+    def connect(self):
+        self.sock, self.peer = socket.socketpair()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.peer.close()
+        self.sock = None
+
+
+class Server(ThreadPoolMixIn, http.server.HTTPServer):
+    pass
+
+class SOAPHandler(SOAPRequestHandler):
+    timeout = 0.5
+    clients = []
+
+    def do_POST(self):
+        self.clients.append(self.client_address)
+        ps = ParsedSoap(self.read_body().decode('utf-8'))
+        sw = SoapWriter(outputclass=StreamElementProxy)
+        sw.serialize(ps.Parse(TC.String('echo')), TC.String('echo'))
+        self.send_xml(sw)
+        if self.path == '/close':
+            # without a Connection: close header
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+class FreshPool(ConnectionPool):
+    '''Does not see that the server closed a connection.
+    '''
+    def _is_stale(self, conn):
+        return False
+
+
+class t27TestCase(unittest.TestCase):
+    "Test the keep-alive connection pool of the client bindings"
+
+    def check_hits(self):
+        pool = ConnectionPool()
+        key, conn, reused = pool.get(Connection, 'Host:80')
+        self.assertEqual((reused, pool.misses, pool.hits), (False, 1, 0))
+        pool.put(key, conn)
+        key2, conn2, reused = pool.get(Connection, 'host:80')
+        self.assertTrue(conn2 is conn)
+        self.assertEqual((key2, reused, pool.misses, pool.hits),
+            (key, True, 1, 1))
+        pool.put(key, conn)
+        key3, conn3, reused = pool.get(Connection, 'host:80', {'timeout': 5})
+        self.assertFalse(conn3 is conn)
+        self.assertEqual(conn3.kw, {'timeout': 5})
+        self.assertEqual((reused, pool.misses, pool.hits), (False, 2, 1))
+        pool.clear()
+        self.assertEqual(conn.sock, None)
+
+    def check_maxsize(self):
+        pool = ConnectionPool(maxsize=2)
+        conns = [ pool.get(Connection, 'host:80') for i in range(3) ]
+        for key, conn, reused in conns:
+            pool.put(key, conn)
+        self.assertEqual([ c.sock is None for k,c,r in conns ],
+            [False, False, True])
+        self.assertEqual(len(pool._idle[conns[0][0]]), 2)
+
+    def check_timeout(self):
+        pool = ConnectionPool(timeout=60)
+        key, conn, reused = pool.get(Connection, 'host:80')
+        pool.put(key, conn)
+        pool._idle[key] = [ (conn, time.time() - 61) ]
+        key, conn2, reused = pool.get(Connection, 'host:80')
+        self.assertFalse(reused)
+        self.assertFalse(conn2 is conn)
+        self.assertEqual(conn.sock, None)
+        self.assertEqual((pool.misses, pool.hits), (2, 0))
+
+    def check_stale(self):
+        pool = ConnectionPool()
+        key, conn, reused = pool.get(Connection, 'host:80')
+        self.assertFalse(pool._is_stale(conn))
+        conn.peer.sendall(b'x')
+        self.assertTrue(pool._is_stale(conn))
+        key, conn, reused = pool.get(Connection, 'host:80')
+        conn.peer.close()
+        self.assertTrue(pool._is_stale(conn))
+        pool.put(key, conn)
+        key, conn2, reused = pool.get(Connection, 'host:80')
+        self.assertFalse(reused)
+        self.assertEqual((pool.stale, conn.sock), (1, None))
+        conn2.close()
+        self.assertTrue(pool._is_stale(conn2))
+
+    def check_loopback(self):
+        server = Server(('127.0.0.1', 0), SOAPHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        url = 'http://127.0.0.1:%d/' %server.server_port
+        echo = TC.String('echo')
+        # a failed request must not wait for a reply forever
+        kw = dict(transdict={'timeout': 10})
+        try:
+            # a streamed reply returns the connection when it is parsed
+            pool = ConnectionPool()
+            b = Binding(url=url, pool=pool, **kw)
+            for text in [ 'one', 'two' ]:
+                b.Send(None, 'echo', text, requesttypecode=echo)
+                self.assertEqual(b.ReceiveSOAP(streaming=True).Parse(echo),
+                    text)
+            b.Send(None, 'echo', 'three', requesttypecode=echo)
+            self.assertTrue(b.ReceiveRaw().find(b'>three<') > 0)
+            self.assertEqual((pool.misses, pool.hits), (1, 2))
+            self.assertEqual(len(set(SOAPHandler.clients)), 1)
+
+            # the server closes a pooled connection
+            pool = FreshPool()
+            b = Binding(url=url + 'close', pool=pool, idempotent=True, **kw)
+            for text in [ 'one', 'two' ]:
+                b.Send(None, 'echo', text, requesttypecode=echo)
+                self.assertTrue(b.ReceiveRaw().find(text.encode()) > 0)
+            self.assertEqual((pool.misses, pool.hits), (1, 1))
+            b = Binding(url=url + 'close', pool=pool, **kw)
+            def send():
+                b.Send(None, 'echo', 'three', requesttypecode=echo)
+                b.ReceiveRaw()
+            self.assertRaises((socket.error, http.client.HTTPException), send)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t27TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+import unittest, sys
+from ZSI import *
+from ZSI.TC import UNBOUNDED
+from ZSI.TCcompound import ComplexType
+
+
+class Item:
+    pass
+
+class t28TestCase(unittest.TestCase):
+    "Test dispatching ComplexType children to their fields"
+
+    def setUp(self):
+        self.wrapper = '<SOAP-ENV:Envelope '\
+            'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '\
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '\
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '\
+            'xmlns:x="urn:x" xmlns:y="urn:y"><SOAP-ENV:Body>'\
+            '<item>%s</item></SOAP-ENV:Body></SOAP-ENV:Envelope>'
+
+    def tearDown(self):
+        ComplexType.compiled = ComplexType.lazy = False
+
+    def parse(self, typecode, content):
+        '''Parse content from a DOM and from the stream, the values must
+        be the same.
+        '''
+        values = []
+        for streaming in [ False, True ]:
+            ps = ParsedSoap(self.wrapper %content, streaming=streaming)
+            values.append(vars(ps.Parse(typecode)))
+        self.assertEqual(values[0], values[1])
+        return values[0]
+
+    def check_inorder(self):
+        typecode = ComplexType(Item, [ TC.String('a'), TC.String('b'),
+            TC.String('c', minOccurs=0, maxOccurs=UNBOUNDED) ], 'item',
+            inorder=True)
+        self.assertEqual(self.parse(typecode, '<a>1</a><b>2</b><c>3</c><c>4</c>'),
+            dict(a='1', b='2', c=['3', '4']))
+        self.assertEqual(self.parse(typecode, '<a>1</a><b>2</b>'),
+            dict(a='1', b='2'))
+        for content in [ '<b>2</b><a>1</a>', '<a>1</a><c>3</c><b>2</b>' ]:
+            self.assertRaises(EvaluateException, self.parse, typecode, content)
+
+    def check_occurs(self):
+        typecode = ComplexType(Item, [ TC.String('a', maxOccurs=3),
+            TC.String('b', minOccurs=0, maxOccurs=UNBOUNDED),
+            TC.String('c', minOccurs=0) ], 'item')
+        self.assertEqual(self.parse(typecode,
+            '<a>1</a><b>x</b><a>2</a><c>z</c><b>y</b><a>3</a>'),
+            dict(a=['1', '2', '3'], b=['x', 'y'], c='z'))
+        self.assertEqual(self.parse(typecode, '<a>1</a>' + '<b>x</b>' * 100)['b'],
+            ['x'] * 100)
+        self.assertEqual(self.parse(typecode, '<a>1</a>'), dict(a=['1']))
+        self.assertRaises(EvaluateException, self.parse, typecode, '<b>x</b>')
+
+    def check_any(self):
+        typecode = ComplexType(Item, [ TC.String('a'),
+            TC.AnyElement(aname='any', minOccurs=0, maxOccurs=UNBOUNDED,
+            processContents='lax') ], 'item')
+        v = self.parse(typecode, '<a>1</a><c xsi:type="xsd:string">2</c>'
+            '<a xsi:type="xsd:string">3</a><x:d xsi:type="xsd:int">4</x:d>')
+        self.assertEqual(v, dict(a='1', any=['2', '3', 4]))
+        self.assertEqual(self.parse(typecode, '<a>1</a>'), dict(a='1', any=[]))
+
+    def check_namespaces(self):
+        typecode = ComplexType(Item, [ TC.String(('urn:x', 'a'), aname='q'),
+            TC.String('a', aname='p', minOccurs=0),
+            TC.String(('urn:x', 'b'), minOccurs=0) ], 'item')
+        self.assertEqual(self.parse(typecode, '<a>2</a><x:a>1</x:a>'),
+            dict(p='2', q='1'))
+        self.assertEqual(self.parse(typecode, '<x:a>1</x:a><y:a>2</y:a>'),
+            dict(p='2', q='1'))
+        # a namespaced child goes to the first field of its name
+        self.assertEqual(self.parse(typecode, '<x:a>1</x:a><x:a>2</x:a>'),
+            dict(p='2', q='1'))
+        # names in another namespace are not the field
+        self.assertEqual(self.parse(typecode, '<x:a>1</x:a><b>3</b><y:b>4</y:b>'),
+            dict(q='1'))
+        self.assertEqual(self.parse(typecode, '<x:a>1</x:a><x:b>3</x:b>'),
+            dict(q='1', b='3'))
+        self.assertRaises(EvaluateException, self.parse, typecode, '<a>1</a>')
+
+    def check_duplicate(self):
+        typecode = ComplexType(Item, [ TC.String('a'),
+            TC.String(('urn:x', 'b'), minOccurs=0) ], 'item')
+        for content in [ '<a>1</a><a>2</a>', '<a>1</a><x:b/><x:b/>' ]:
+            for flag in [ None, 'compiled', 'lazy' ]:
+                if flag: setattr(ComplexType, flag, True)
+                self.assertRaises(EvaluateException, self.parse, typecode,
+                    content)
+                self.tearDown()
+        # unless an <any> takes it
+        typecode.ofwhat = typecode.ofwhat + (TC.AnyElement(aname='any',
+            processContents='lax'),)
+        self.assertEqual(self.parse(typecode,
+            '<a>1</a><a xsi:type="xsd:string">2</a>'), dict(a='1', any='2'))
+
+def makeTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(t28TestCase, "check"))
+    return suite
+
+def main():
+    unittest.main(defaultTest="makeTestSuite")
+
+
+if __name__ == "__main__" : main()
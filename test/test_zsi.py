@@ -8,6 +8,25 @@ import test_t6
 import test_t7
 import test_t8
 import test_t9
+import test_t10
+import test_t11
+import test_t12
+import test_t13
+import test_t14
+import test_t15
+import test_t16
+import test_t17
+import test_t18
+import test_t19
+import test_t20
+import test_t21
+import test_t22
+import test_t23
+import test_t24
+import test_t25
+import test_t26
+import test_t27
+import test_t28
 
 def makeTestSuite():
     suite1 = test_t1.makeTestSuite()
@@ -18,7 +37,29 @@ def makeTestSuite():
     suite7 = test_t7.makeTestSuite()
     suite8 = test_t8.makeTestSuite()
     suite9 = test_t9.makeTestSuite()
-    t = (suite1, suite2, suite3, suite5, suite6, suite7, suite8, suite9)
+    suite10 = test_t10.makeTestSuite()
+    suite11 = test_t11.makeTestSuite()
+    suite12 = test_t12.makeTestSuite()
+    suite13 = test_t13.makeTestSuite()
+    suite14 = test_t14.makeTestSuite()
+    suite15 = test_t15.makeTestSuite()
+    suite16 = test_t16.makeTestSuite()
+    suite17 = test_t17.makeTestSuite()
+    suite18 = test_t18.makeTestSuite()
+    suite19 = test_t19.makeTestSuite()
+    suite20 = test_t20.makeTestSuite()
+    suite21 = test_t21.makeTestSuite()
+    suite22 = test_t22.makeTestSuite()
+    suite23 = test_t23.makeTestSuite()
+    suite24 = test_t24.makeTestSuite()
+    suite25 = test_t25.makeTestSuite()
+    suite26 = test_t26.makeTestSuite()
+    suite27 = test_t27.makeTestSuite()
+    suite28 = test_t28.makeTestSuite()
+    t = (suite1, suite2, suite3, suite5, suite6, suite7, suite8, suite9, suite10,
+        suite11, suite12, suite13, suite14, suite15, suite16,
+        suite17, suite18, suite19, suite20, suite21, suite22,
+        suite23, suite24, suite25, suite26, suite27, suite28)
     suite = unittest.TestSuite(t)
     return suite
 def main():